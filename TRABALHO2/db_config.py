@@ -1,10 +1,21 @@
 import os
+import re
+import time
+import random
+import asyncio
+import threading
+import weakref
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
 import panel as pn
 import pandas as pd
 import sqlalchemy
-import psycopg2 # Importar psycopg2 para a conexão
-from datetime import datetime, date
+from sqlalchemy.ext.asyncio import create_async_engine
+from datetime import datetime
 from dotenv import load_dotenv
+from migracoes import aplicar_migracoes
 
 pn.extension('tabulator', notifications=True)
 
@@ -15,37 +26,516 @@ DB_NAME = os.getenv('DB_NAME')
 DB_USER = os.getenv('DB_USER')
 DB_PASS = os.getenv('DB_PASS')
 
+# --- Configuração do pool de conexões
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 5))            # conexões mantidas abertas por engine (e pré-abertas na inicialização)
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 60))           # limite total de conexões simultâneas a cada banco, somando todos os processos
+DB_PROCESSOS = int(os.getenv('DB_PROCESSOS', 1))          # processos que dividem DB_POOL_MAX (o N de panel serve --num-procs N)
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10)) # segundos de espera por uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800)) # segundos até uma conexão ser reciclada
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+DB_MIGRAR = os.getenv('DB_MIGRAR', '1') == '1'   # aplica migracoes/*.sql pendentes na inicialização
+DB_RECONEXAO_INICIAL = float(os.getenv('DB_RECONEXAO_INICIAL', 1))  # segundos até a 2ª tentativa de conexão; dobra a cada falha
+DB_RECONEXAO_MAXIMA = float(os.getenv('DB_RECONEXAO_MAXIMA', 60))   # teto da espera entre tentativas
+
+# --- Configuração da réplica de leitura
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')          # sem valor, todas as leituras vão ao primário
+DB_REPLICA_PORT = os.getenv('DB_REPLICA_PORT', DB_PORT)
+DB_REPLICA_ATRASO_MAX = float(os.getenv('DB_REPLICA_ATRASO_MAX', 5))    # segundos de atraso aceitos nas leituras da réplica
+DB_REPLICA_VERIFICACAO = float(os.getenv('DB_REPLICA_VERIFICACAO', 2))  # segundos entre medições do atraso
+
+DB_PARALELISMO = int(os.getenv('DB_PARALELISMO', 8))     # consultas independentes executadas ao mesmo tempo
+DB_BLOCO_LEITURA = int(os.getenv('DB_BLOCO_LEITURA', 20000))  # linhas por bloco nas leituras grandes (fetch_data)
+BUSCA_LIMITE = int(os.getenv('BUSCA_LIMITE', 10))                 # sugestões por busca nos campos de busca
+BUSCA_MIN_CARACTERES = int(os.getenv('BUSCA_MIN_CARACTERES', 3))  # letras digitadas antes de buscar sugestões
+BUSCA_CIDADAOS_LIMITE = int(os.getenv('BUSCA_CIDADAOS_LIMITE', 20))  # cidadãos sugeridos por busca nos campos de CPF
+BUSCA_TRIGRAMAS_VERIFICACAO = float(os.getenv('BUSCA_TRIGRAMAS_VERIFICACAO', 300))  # segundos entre verificações do pg_trgm no banco
+
+# --- Configuração do cache de consultas
+DB_CACHE_MAX = int(os.getenv('DB_CACHE_MAX', 256))    # máximo de resultados guardados (LRU)
+DB_CACHE_TTL = float(os.getenv('DB_CACHE_TTL', 300))  # segundos; cobre escritas feitas fora desta aplicação
+
+# --- Cache de consultas
+# Resultados de fetch_data marcados com as tabelas que leem; uma escrita confirmada
+# em uma tabela descarta apenas os resultados marcados com ela.
+_cache_consultas = OrderedDict()  # (query, params) -> (instante, tabelas, DataFrame)
+_lock_cache = threading.Lock()
+_estatisticas_cache = {'acertos': 0, 'falhas': 0, 'invalidacoes': 0, 'descartes_lru': 0}
+
+# O SET de ON CONFLICT ... DO UPDATE SET não é uma tabela.
+_RE_TABELA_ESCRITA = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|COPY)\s+(?:ONLY\s+)?(?!SET\b)([A-Za-z_][A-Za-z0-9_]*)",
+    re.IGNORECASE
+)
+
+def _tabelas_escritas(query):
+    return {t.lower() for t in _RE_TABELA_ESCRITA.findall(query)}
+
+def _cache_buscar(chave):
+    with _lock_cache:
+        item = _cache_consultas.get(chave)
+        if item is not None and time.monotonic() - item[0] < DB_CACHE_TTL:
+            _cache_consultas.move_to_end(chave)
+            _estatisticas_cache['acertos'] += 1
+            return item[2]
+        if item is not None:
+            del _cache_consultas[chave]
+        _estatisticas_cache['falhas'] += 1
+        return None
+
+def _cache_guardar(chave, tabelas, df):
+    with _lock_cache:
+        _cache_consultas[chave] = (time.monotonic(), tabelas, df)
+        _cache_consultas.move_to_end(chave)
+        while len(_cache_consultas) > DB_CACHE_MAX:
+            _cache_consultas.popitem(last=False)
+            _estatisticas_cache['descartes_lru'] += 1
+
+def invalidar_cache(*tabelas):
+    """
+    Descarta do cache os resultados que leem alguma das tabelas informadas e as marca
+    como escritas agora, para o roteamento de leituras. Sem argumentos, vale para todas.
+    Args:
+        *tabelas (str): Nomes das tabelas alteradas.
+    """
+    alvo = {t.lower() for t in tabelas}
+    _registrar_escrita(alvo)
+    with _lock_cache:
+        for chave, (_, tabelas_lidas, _) in list(_cache_consultas.items()):
+            if not alvo or alvo & tabelas_lidas:
+                del _cache_consultas[chave]
+                _estatisticas_cache['invalidacoes'] += 1
+
+def estatisticas_cache():
+    """
+    Retorna os contadores do cache de consultas.
+    Returns:
+        dict: Acertos, falhas, invalidações, descartes por LRU, tamanho atual e limite.
+    """
+    with _lock_cache:
+        return {**_estatisticas_cache, 'tamanho': len(_cache_consultas), 'maximo': DB_CACHE_MAX}
+
+def _registrar_eventos_cache(eng):
+    # Transações abertas pelas páginas (engine.connect() + begin/commit): as tabelas
+    # escritas são anotadas na conexão e invalidadas no commit e de novo quando a
+    # conexão volta ao pool, fechando a janela entre a invalidação e o commit efetivo.
+    def ao_executar(conn, cursor, statement, parameters, context, executemany):
+        tabelas = _tabelas_escritas(statement)
+        if tabelas:
+            conn.info.setdefault('tabelas_pendentes', set()).update(tabelas)
+
+    def ao_confirmar(conn):
+        tabelas = conn.info.pop('tabelas_pendentes', set())
+        if tabelas:
+            invalidar_cache(*tabelas)
+            conn.info.setdefault('tabelas_confirmadas', set()).update(tabelas)
+
+    def ao_desfazer(conn):
+        conn.info.pop('tabelas_pendentes', None)
+
+    def ao_devolver(dbapi_conn, registro):
+        tabelas = registro.info.pop('tabelas_confirmadas', set())
+        registro.info.pop('tabelas_pendentes', None)
+        if tabelas:
+            invalidar_cache(*tabelas)
+
+    sqlalchemy.event.listen(eng, 'before_cursor_execute', ao_executar)
+    sqlalchemy.event.listen(eng, 'commit', ao_confirmar)
+    sqlalchemy.event.listen(eng, 'rollback', ao_desfazer)
+    sqlalchemy.event.listen(eng, 'checkin', ao_devolver)
+
 # --- Conexão Banco
-con = None  
 engine = None
+async_engine = None  # mesmo banco via asyncpg, para os callbacks assíncronos das páginas
+
+_lock_estatisticas = threading.Lock()
+_estatisticas_pool = {'conexoes_criadas': 0, 'checkouts': 0, 'checkins': 0, 'invalidadas': 0, 'timeouts': 0}
+
+def _contar(evento):
+    with _lock_estatisticas:
+        _estatisticas_pool[evento] += 1
+
+def _registrar_eventos_pool(eng):
+    sqlalchemy.event.listen(eng, 'connect', lambda *args: _contar('conexoes_criadas'))
+    sqlalchemy.event.listen(eng, 'checkout', lambda *args: _contar('checkouts'))
+    sqlalchemy.event.listen(eng, 'checkin', lambda *args: _contar('checkins'))
+    sqlalchemy.event.listen(eng, 'invalidate', lambda *args: _contar('invalidadas'))
+
+def _aquecer_pool(eng, quantidade):
+    conexoes = [eng.raw_connection() for _ in range(quantidade)]
+    for c in conexoes:
+        c.close()
+
+# Os engines são criados na importação, mas as conexões são abertas por processo: cada
+# conexão guarda o PID que a abriu e é descartada no checkout se estiver em outro processo, e
+# os processos filhos de `panel serve --num-procs N` (fork) recriam pools, travas e threads
+# herdados do pai. A conexão inicial, as migrações e o aquecimento do pool rodam numa thread
+# por processo, com novas tentativas em intervalos crescentes enquanto o banco não responde.
+def _registrar_eventos_processo(eng):
+    def ao_conectar(dbapi_conn, registro):
+        registro.info['pid'] = os.getpid()
+
+    def ao_emprestar(dbapi_conn, registro, proxy):
+        if registro.info['pid'] != os.getpid():
+            registro.dbapi_connection = proxy.dbapi_connection = None
+            raise sqlalchemy.exc.DisconnectionError(
+                f"Conexão aberta pelo processo {registro.info['pid']}, usada pelo processo {os.getpid()}")
+
+    sqlalchemy.event.listen(eng, 'connect', ao_conectar)
+    sqlalchemy.event.listen(eng, 'checkout', ao_emprestar)
+
+# Cada processo abre dois engines por banco (psycopg2 e asyncpg), cada um com seu pool, então
+# DB_POOL_MAX é dividido entre 2 × DB_PROCESSOS pools. A réplica, quando configurada, recebe
+# o mesmo limite à parte. O ouvinte de alterações (notificacoes.py) usa mais uma conexão
+# por processo, fora dos pools.
+DB_POOL_MAX_ENGINE = max(DB_POOL_MAX // (2 * DB_PROCESSOS), 1)
+DB_POOL_MIN_ENGINE = min(DB_POOL_MIN, DB_POOL_MAX_ENGINE)
+
+_OPCOES_POOL = dict(
+    pool_size=DB_POOL_MIN_ENGINE,
+    max_overflow=DB_POOL_MAX_ENGINE - DB_POOL_MIN_ENGINE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
 
 try:
-    con = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS 
-    )
-    engine = sqlalchemy.create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-    print("Conexão com o banco de dados estabelecida com sucesso!")
-    if pn.state:
-        pn.state.notifications.success("Conexão com o banco de dados estabelecida!")
+    engine = sqlalchemy.create_engine(
+        f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}", **_OPCOES_POOL)
+    _registrar_eventos_pool(engine)
+    _registrar_eventos_cache(engine)
+    _registrar_eventos_processo(engine)
+    async_engine = create_async_engine(
+        f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}", **_OPCOES_POOL)
+    _registrar_eventos_cache(async_engine.sync_engine)
+    _registrar_eventos_processo(async_engine.sync_engine)
 except Exception as e:
-    con = None
-    engine = None
-    print(f"Erro ao conectar com o banco de dados: {e}")
-    if pn.state:
-        pn.state.notifications.error(f"Erro: Conexão com o banco de dados não estabelecida. Detalhes: {e}")
+    engine = async_engine = None
+    print(f"Erro ao configurar a conexão com o banco de dados: {e}")
+
+# Réplica de leitura (hot standby): mesmos usuário, senha e banco do primário. Sem
+# DB_REPLICA_HOST, os engines de leitura são os próprios engines do primário.
+engine_leitura, async_engine_leitura = engine, async_engine
+if DB_REPLICA_HOST and engine is not None:
+    try:
+        engine_leitura = sqlalchemy.create_engine(
+            f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}", **_OPCOES_POOL)
+        _registrar_eventos_processo(engine_leitura)
+        async_engine_leitura = create_async_engine(
+            f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}", **_OPCOES_POOL)
+        _registrar_eventos_processo(async_engine_leitura.sync_engine)
+    except Exception as e:
+        engine_leitura, async_engine_leitura = engine, async_engine
+        print(f"Erro ao configurar a réplica de leitura; leituras usarão o primário: {e}")
+
+# --- Roteamento das leituras
+# Escritas e transações das páginas (engine.connect(), conexao(), execute_query) vão sempre
+# ao primário. fetch_data e fetch_data_async leem da réplica, exceto quando:
+#   - a réplica está fora do ar ou atrasada mais que DB_REPLICA_ATRASO_MAX (medido a cada
+#     DB_REPLICA_VERIFICACAO segundos por uma thread do processo);
+#   - a sessão atual escreveu há menos que esse prazo (lê as próprias escritas);
+#   - a consulta usa o cache e alguma das tabelas dela foi escrita nesse prazo, por esta ou
+#     outra sessão/processo (avisado por invalidar_cache), para o cache não guardar dados
+#     que a réplica ainda não recebeu;
+#   - a leitura pede primario=True, como as releituras de linhas avisadas pelas notificações
+#     (o NOTIFY chega no commit do primário, antes de a réplica aplicar a escrita).
+# Uma leitura que falha por conexão na réplica é repetida no primário.
+SQL_ATRASO_REPLICA = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+         AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+def replica_configurada():
+    """Indica se as leituras podem ir para uma réplica (DB_REPLICA_HOST definido)."""
+    return engine_leitura is not engine
+
+_ERROS_CONEXAO = (sqlalchemy.exc.OperationalError, sqlalchemy.exc.InterfaceError, OSError)
+
+_replica = {'estado': 'conectando' if replica_configurada() else 'desativada', 'atraso': None, 'ultimo_erro': None, 'desde': None,
+            'leituras_replica': 0, 'leituras_primario': 0}
+_lock_replica = threading.Lock()
+_escritas_sessao = weakref.WeakKeyDictionary()  # documento da sessão -> instante da última escrita
+_escritas_tabela = {}                           # tabela ('*' = todas) -> instante da última escrita
+
+def _registrar_escrita(tabelas):
+    if not replica_configurada():
+        return
+    agora = time.monotonic()
+    documento = pn.state.curdoc
+    with _lock_replica:
+        for tabela in tabelas or ('*',):
+            _escritas_tabela[tabela] = agora
+        if documento is not None:
+            _escritas_sessao[documento] = agora
+
+def _marcar_replica(estado, **campos):
+    with _lock_replica:
+        if _replica['estado'] != estado:
+            campos['desde'] = datetime.now()
+        _replica.update(estado=estado, **campos)
+
+def _monitorar_replica():
+    while True:
+        try:
+            with engine_leitura.connect() as conn:
+                atraso = conn.execute(sqlalchemy.text(SQL_ATRASO_REPLICA)).scalar()
+            atraso = None if atraso is None else float(atraso)
+            ok = atraso is not None and atraso <= DB_REPLICA_ATRASO_MAX
+            _marcar_replica('ok' if ok else 'atrasada', atraso=atraso, ultimo_erro=None)
+        except Exception as e:
+            _marcar_replica('indisponivel', atraso=None, ultimo_erro=str(getattr(e, 'orig', None) or e).strip().splitlines()[0])
+        time.sleep(DB_REPLICA_VERIFICACAO)
+
+def _usar_replica(tabelas=None, primario=False):
+    if not replica_configurada():
+        return False
+    if primario:
+        with _lock_replica:
+            _replica['leituras_primario'] += 1
+        return False
+    limite = time.monotonic() - (DB_REPLICA_ATRASO_MAX + DB_REPLICA_VERIFICACAO)
+    documento = pn.state.curdoc
+    with _lock_replica:
+        usar = (_replica['estado'] == 'ok'
+                and (documento is None or _escritas_sessao.get(documento, 0) <= limite)
+                and not (tabelas and any(_escritas_tabela.get(t, 0) > limite
+                                         for t in ['*', *(t.lower() for t in tabelas)])))
+        _replica['leituras_replica' if usar else 'leituras_primario'] += 1
+    return usar
+
+def _ler_roteado(ler, tabelas=None, primario=False):
+    if _usar_replica(tabelas, primario):
+        try:
+            return ler(engine_leitura)
+        except _ERROS_CONEXAO as e:
+            _marcar_replica('indisponivel', ultimo_erro=str(getattr(e, 'orig', None) or e).strip().splitlines()[0])
+    return ler(engine)
+
+async def _ler_roteado_async(ler, tabelas=None, primario=False):
+    if _usar_replica(tabelas, primario):
+        try:
+            return await ler(async_engine_leitura)
+        except _ERROS_CONEXAO as e:
+            _marcar_replica('indisponivel', ultimo_erro=str(getattr(e, 'orig', None) or e).strip().splitlines()[0])
+    return await ler(async_engine)
+
+# --- Estado da conexão por processo
+_saude = {'pid': None, 'estado': 'parado', 'tentativas': 0, 'ultimo_erro': None, 'desde': None}
+_lock_saude = threading.Lock()
+_banco_pronto = threading.Event()
+
+def _marcar_estado(estado, **campos):
+    with _lock_saude:
+        _saude.update(estado=estado, desde=datetime.now(), **campos)
+
+def _conectar_com_retentativas():
+    # Só falhas de conexão são repetidas. aplicar_migracoes usa o driver diretamente, então os
+    # erros de conexão dele chegam sem o invólucro do SQLAlchemy. Um erro no SQL de uma
+    # migração não se resolve tentando de novo: o processo fica em 'migracao_falhou' até ser
+    # reiniciado com a migração corrigida.
+    erros_conexao = _ERROS_CONEXAO + (engine.dialect.dbapi.OperationalError, engine.dialect.dbapi.InterfaceError)
+    espera = DB_RECONEXAO_INICIAL
+    while True:
+        try:
+            with engine.connect() as conn:
+                conn.execute(sqlalchemy.text("SELECT 1"))
+            if DB_MIGRAR:
+                versoes = aplicar_migracoes(engine)
+                if versoes:
+                    print(f"Migrações aplicadas: {versoes}")
+                    _esquecer_trigramas()
+            _aquecer_pool(engine, DB_POOL_MIN_ENGINE)
+        except erros_conexao as e:
+            erro = str(getattr(e, 'orig', None) or e).strip().splitlines()[0]
+            with _lock_saude:
+                tentativas = _saude['tentativas'] + 1
+            _marcar_estado('indisponivel', tentativas=tentativas, ultimo_erro=erro)
+            print(f"Erro ao conectar com o banco de dados (processo {os.getpid()}, tentativa {tentativas}; "
+                  f"nova tentativa em {espera:g}s): {erro}")
+            time.sleep(espera * random.uniform(0.8, 1.2))
+            espera = min(espera * 2, DB_RECONEXAO_MAXIMA)
+            continue
+        except Exception as e:
+            erro = str(getattr(e, 'orig', None) or e).strip().splitlines()[0]
+            _marcar_estado('migracao_falhou', ultimo_erro=erro)
+            print(f"Erro ao aplicar as migrações (processo {os.getpid()}; sem nova tentativa até a "
+                  f"aplicação ser reiniciada): {erro}")
+            return
+        _marcar_estado('ok', ultimo_erro=None)
+        _banco_pronto.set()
+        print(f"Conexão com o banco de dados estabelecida com sucesso! (processo {os.getpid()})")
+        return
+
+def iniciar_banco(aguardar=None):
+    """
+    Inicia, uma vez por processo, a conexão com o banco em segundo plano: testa a conexão,
+    aplica as migrações pendentes e aquece o pool, repetindo com espera crescente
+    (DB_RECONEXAO_INICIAL até DB_RECONEXAO_MAXIMA) enquanto o banco estiver indisponível.
+    Uma migração com erro não é repetida (estado 'migracao_falhou').
+    Args:
+        aguardar (float, optional): Segundos a esperar pela conexão. Defaults to None (não espera).
+    Returns:
+        bool: True se o banco já está pronto neste processo.
+    """
+    if engine is None:
+        return False
+    with _lock_saude:
+        if _saude['pid'] != os.getpid():
+            _saude.update(pid=os.getpid(), estado='conectando', tentativas=0, ultimo_erro=None, desde=datetime.now())
+            threading.Thread(target=_conectar_com_retentativas, name='conexao-banco', daemon=True).start()
+            if replica_configurada():
+                threading.Thread(target=_monitorar_replica, name='monitor-replica', daemon=True).start()
+    if aguardar:
+        _banco_pronto.wait(aguardar)
+    return _banco_pronto.is_set()
+
+def saude_banco():
+    """
+    Estado da conexão com o banco no processo atual.
+    Returns:
+        dict: PID, estado ('conectando', 'ok', 'indisponivel', 'migracao_falhou' ou 'parado'), tentativas
+              falhas, último erro, instante da última mudança de estado, pool, cache e
+              réplica de leitura (estado, atraso em segundos e leituras por destino).
+    """
+    with _lock_saude:
+        saude = dict(_saude)
+    if saude['pid'] != os.getpid():
+        saude.update(pid=os.getpid(), estado='parado', tentativas=0, ultimo_erro=None, desde=None)
+    saude['desde'] = saude['desde'].isoformat(timespec='seconds') if saude['desde'] else None
+    with _lock_replica:
+        replica = dict(_replica)
+    replica['desde'] = replica['desde'].isoformat(timespec='seconds') if replica['desde'] else None
+    return {**saude, 'pool': estatisticas_pool(), 'cache': estatisticas_cache(), 'replica': replica}
+
+def _reiniciar_no_filho():
+    # O filho herda do pai conexões abertas, travas possivelmente ocupadas por outras threads
+    # e um pool de threads cujas threads não existem mais; tudo é recriado antes do uso.
+    global _lock_cache, _lock_estatisticas, _lock_saude, _lock_replica, _banco_pronto, _executor_consultas
+    _lock_cache, _lock_estatisticas, _lock_saude = threading.Lock(), threading.Lock(), threading.Lock()
+    _lock_replica = threading.Lock()
+    _banco_pronto = threading.Event()
+    _executor_consultas = ThreadPoolExecutor(max_workers=DB_PARALELISMO, thread_name_prefix='consulta')
+    _cache_consultas.clear()
+    _estatisticas_pool.update(dict.fromkeys(_estatisticas_pool, 0))
+    _estatisticas_cache.update(dict.fromkeys(_estatisticas_cache, 0))
+    _replica.update(estado='conectando' if replica_configurada() else 'desativada', atraso=None,
+                    ultimo_erro=None, desde=None, leituras_replica=0, leituras_primario=0)
+    _escritas_sessao.clear()
+    _escritas_tabela.clear()
+    if engine is not None:
+        engine.dispose(close=False)
+        async_engine.sync_engine.dispose(close=False)
+    if replica_configurada():
+        engine_leitura.dispose(close=False)
+        async_engine_leitura.sync_engine.dispose(close=False)
+    iniciar_banco()
+
+os.register_at_fork(after_in_child=_reiniciar_no_filho)
+iniciar_banco()
+
+# --- Tipos das colunas nos DataFrames
+# Sem um mapa de tipos, o pandas guarda cada texto como um objeto Python e as datas como
+# datetime.date. Com o mapa: nomes que se repetem muito (vacina, local, campanha, cidade)
+# viram categorias, os demais textos usam strings do Arrow e as datas viram datetime64.
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = 'string[pyarrow]'
+except ImportError:
+    TIPO_TEXTO = 'string'
+TIPO_CATEGORIA = 'category'
+TIPO_DATA = 'datetime64[ns]'
+
+def _chave_tipos(tipos):
+    return tuple(sorted(tipos.items())) if tipos else None
+
+def _aplicar_tipos(df, tipos, categorias=True):
+    convertidas = {}
+    for coluna, tipo in (tipos or {}).items():
+        if coluna not in df.columns or (tipo == TIPO_CATEGORIA and not categorias):
+            continue
+        convertidas[coluna] = pd.to_datetime(df[coluna]) if tipo == TIPO_DATA else df[coluna].astype(tipo)
+    return df.assign(**convertidas) if convertidas else df
+
+def _ler_em_blocos(eng, query, params, tipos, tamanho_bloco):
+    # Cursor no servidor (stream_results): só um bloco de linhas fica em objetos Python por
+    # vez. As categorias são aplicadas depois da junção, para todos os blocos terem as
+    # mesmas categorias.
+    with eng.connect().execution_options(stream_results=True, max_row_buffer=tamanho_bloco) as conn:
+        blocos = [_aplicar_tipos(bloco, tipos, categorias=False)
+                  for bloco in pd.read_sql(query, conn, params=params, chunksize=tamanho_bloco)]
+    if not blocos:
+        return pd.DataFrame()
+    return _aplicar_tipos(pd.concat(blocos, ignore_index=True), tipos)
 
 
 # --- Funções auxiliares para interação com o BD
-def fetch_data(query, params=None):
+@contextmanager
+def conexao(somente_leitura=False):
+    """
+    Empresta uma conexão do pool com uma transação própria.
+    Faz commit ao sair do bloco sem erros, rollback se houver exceção, e sempre
+    devolve a conexão ao pool, de modo que uma transação com falha não afeta
+    as demais sessões.
+    Args:
+        somente_leitura (bool, optional): Se True, a conexão pode vir da réplica de
+                                          leitura. Defaults to False (primário).
+    Yields:
+        Conexão DBAPI (psycopg2) emprestada do pool.
+    """
+    try:
+        conn = _ler_roteado(lambda eng: eng.raw_connection()) if somente_leitura else engine.raw_connection()
+    except sqlalchemy.exc.TimeoutError:
+        _contar('timeouts')
+        raise
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def estatisticas_pool():
+    """
+    Retorna o estado atual do pool de conexões.
+    Returns:
+        dict: Tamanho configurado, conexões em uso, ociosas e em overflow, além dos
+              contadores acumulados de conexões criadas, checkouts, checkins,
+              invalidações e timeouts de checkout.
+    """
+    if engine is None:
+        return {}
+    pool = engine.pool
+    with _lock_estatisticas:
+        contadores = dict(_estatisticas_pool)
+    return {
+        'minimo': DB_POOL_MIN_ENGINE,
+        'maximo': DB_POOL_MAX_ENGINE,
+        'em_uso': pool.checkedout(),
+        'ociosas': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        **contadores,
+    }
+
+def fetch_data(query, params=None, tabelas=None, tipos=None, tamanho_bloco=None, primario=False):
     """
-    Busca dados do banco de dados e retorna um DataFrame do Pandas.
+    Busca dados do banco de dados e retorna um DataFrame do Pandas. Lê da réplica de
+    leitura quando possível (ver "Roteamento das leituras").
     Args:
         query (str): A query SQL para executar.
         params (tuple, optional): Parâmetros para a query. Defaults to None.
+        tabelas (iterable, optional): Tabelas lidas pela query. Se informadas, o resultado
+                                      fica em cache até uma escrita em alguma delas. Defaults to None.
+        tipos (dict, optional): Coluna (minúsculas) -> dtype, ex: TIPO_TEXTO, TIPO_CATEGORIA,
+                                TIPO_DATA ou 'int32'. Defaults to None (tipos inferidos pelo pandas).
+        tamanho_bloco (int, optional): Se informado, lê o resultado em blocos desse tamanho por
+                                       um cursor no servidor. Defaults to None (leitura única).
+        primario (bool, optional): Se True, lê sempre do primário, mesmo com réplica disponível.
+                                   Defaults to False.
     Returns:
         pd.DataFrame: DataFrame contendo os resultados da query, ou um DataFrame vazio em caso de erro.
     """
@@ -53,8 +543,21 @@ def fetch_data(query, params=None):
         if pn.state:
             pn.state.notifications.error("Erro: Conexão com o banco de dados não estabelecida para buscar dados.")
         return pd.DataFrame()
+    if isinstance(params, list):
+        params = tuple(params)  # listas seriam interpretadas como executemany pelo pandas/SQLAlchemy
+    chave = (query, params, _chave_tipos(tipos)) if tabelas else None
+    if chave is not None:
+        df = _cache_buscar(chave)
+        if df is not None:
+            return df.copy(deep=False)
     try:
-        df = pd.read_sql(query, engine, params=params)
+        if tamanho_bloco:
+            df = _ler_roteado(lambda eng: _ler_em_blocos(eng, query, params, tipos, tamanho_bloco), tabelas, primario)
+        else:
+            df = _aplicar_tipos(_ler_roteado(lambda eng: pd.read_sql(query, eng, params=params), tabelas, primario), tipos)
+        if chave is not None:
+            _cache_guardar(chave, {t.lower() for t in tabelas}, df)
+            return df.copy(deep=False)
         return df
     except Exception as e:
         if pn.state:
@@ -66,6 +569,7 @@ def execute_query(query, params=None, fetch_result=False):
     """
     Executa uma query no banco de dados (INSERT, UPDATE, DELETE, CREATE TABLE).
     Permite opcionalmente retornar resultados (e.g., para RETURNING Id).
+    Cada chamada usa uma conexão própria do pool e uma transação própria.
     Args:
         query (str): A query SQL para executar.
         params (tuple, optional): Parâmetros para a query. Defaults to None.
@@ -75,29 +579,142 @@ def execute_query(query, params=None, fetch_result=False):
         Any: True em caso de sucesso (para queries sem retorno), False em caso de erro,
              ou o resultado de cur.fetchall() se fetch_result for True.
     """
-    if con is None:
+    if engine is None:
         if pn.state:
             pn.state.notifications.error("Erro: Conexão com o banco de dados não estabelecida para executar query.")
         return False
     try:
-        cur = con.cursor()
-        cur.execute(query, params)
-        if fetch_result:
-            result = cur.fetchall()
-            con.commit()
-            cur.close()
-            return result
-        else:
-            con.commit()
+        with conexao() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            result = cur.fetchall() if fetch_result else True
             cur.close()
-            return True
+        tabelas = _tabelas_escritas(query)
+        if tabelas:
+            invalidar_cache(*tabelas)
+        return result
     except Exception as e:
-        con.rollback()
         if pn.state:
             pn.state.notifications.error(f"Erro ao executar query: {e}")
         print(f"DEBUG: Erro ao executar query: {e} - Query: {query}")
         return False
 
+# --- Versões assíncronas (asyncpg)
+# Usadas pelos callbacks async das páginas: enquanto uma consulta espera o banco, o event
+# loop do servidor continua atendendo as demais sessões. Aceitam as mesmas queries de
+# fetch_data/execute_query, com placeholders %s ou %(nome)s, e compartilham o mesmo cache.
+_RE_PARAM_NOMEADO = re.compile(r'%\((\w+)\)s')
+
+def _para_text(query, params):
+    """Converte os placeholders do psycopg2 (%s / %(nome)s) em binds do SQLAlchemy (:p0 / :nome)."""
+    if params is None:
+        return sqlalchemy.text(query.replace('%%', '%')), {}
+    if isinstance(params, dict):
+        return sqlalchemy.text(_RE_PARAM_NOMEADO.sub(r':\1', query).replace('%%', '%')), dict(params)
+    partes = query.split('%s')
+    sql = partes[0] + ''.join(f":p{i}{parte}" for i, parte in enumerate(partes[1:]))
+    return sqlalchemy.text(sql.replace('%%', '%')), {f"p{i}": _valor_python(v) for i, v in enumerate(params)}
+
+async def fetch_data_async(query, params=None, tabelas=None, tipos=None, primario=False):
+    """
+    Versão assíncrona de fetch_data.
+    Args:
+        query (str): A query SQL para executar.
+        params (tuple | dict, optional): Parâmetros para a query. Defaults to None.
+        tabelas (iterable, optional): Tabelas lidas pela query, para o cache. Defaults to None.
+        tipos (dict, optional): Coluna -> dtype, como em fetch_data. Defaults to None.
+        primario (bool, optional): Se True, lê sempre do primário. Defaults to False.
+    Returns:
+        pd.DataFrame: DataFrame contendo os resultados da query, ou um DataFrame vazio em caso de erro.
+    """
+    if async_engine is None:
+        if pn.state:
+            pn.state.notifications.error("Erro: Conexão com o banco de dados não estabelecida para buscar dados.")
+        return pd.DataFrame()
+    if isinstance(params, list):
+        params = tuple(params)
+    chave = (query, params, _chave_tipos(tipos)) if tabelas else None
+    if chave is not None:
+        df = _cache_buscar(chave)
+        if df is not None:
+            return df.copy(deep=False)
+    try:
+        sql, valores = _para_text(query, params)
+
+        async def ler(eng):
+            async with eng.connect() as conn:
+                resultado = await conn.execute(sql, valores)
+                return pd.DataFrame(resultado.fetchall(), columns=list(resultado.keys()))
+
+        df = _aplicar_tipos(await _ler_roteado_async(ler, tabelas, primario), tipos)
+        if chave is not None:
+            _cache_guardar(chave, {t.lower() for t in tabelas}, df)
+            return df.copy(deep=False)
+        return df
+    except Exception as e:
+        if pn.state:
+            pn.state.notifications.error(f"Erro ao buscar dados: {e}")
+        print(f"DEBUG: Erro ao buscar dados: {e} - Query: {query}")
+        return pd.DataFrame()
+
+async def execute_query_async(query, params=None, fetch_result=False):
+    """
+    Versão assíncrona de execute_query. Cada chamada usa uma transação própria.
+    Comandos múltiplos separados por ';' não são aceitos pelo asyncpg.
+    Returns:
+        Any: True em caso de sucesso, False em caso de erro, ou a lista de linhas
+             (tuplas) se fetch_result for True.
+    """
+    if async_engine is None:
+        if pn.state:
+            pn.state.notifications.error("Erro: Conexão com o banco de dados não estabelecida para executar query.")
+        return False
+    try:
+        sql, valores = _para_text(query, params)
+        async with async_engine.begin() as conn:
+            resultado = await conn.execute(sql, valores)
+            result = [tuple(linha) for linha in resultado.fetchall()] if fetch_result else True
+        tabelas = _tabelas_escritas(query)
+        if tabelas:
+            invalidar_cache(*tabelas)
+        return result
+    except Exception as e:
+        if pn.state:
+            pn.state.notifications.error(f"Erro ao executar query: {e}")
+        print(f"DEBUG: Erro ao executar query: {e} - Query: {query}")
+        return False
+
+# --- Consultas independentes em paralelo
+# Uma página que precisa de várias consultas independentes (ex: menus de vacinas, locais
+# e campanhas) as dispara ao mesmo tempo, cada uma com sua conexão do pool; o tempo de
+# carregamento passa a ser o da consulta mais lenta, não a soma de todas.
+_executor_consultas = ThreadPoolExecutor(max_workers=DB_PARALELISMO, thread_name_prefix='consulta')
+
+def buscar_em_paralelo(*consultas):
+    """
+    Executa funções de consulta independentes ao mesmo tempo.
+    Args:
+        *consultas (callable): Funções sem argumentos (ex: get_vacinas, get_locais).
+    Returns:
+        list: Os resultados, na mesma ordem das funções.
+    """
+    futuros = [_executor_consultas.submit(contextvars.copy_context().run, c) for c in consultas]
+    return [f.result() for f in futuros]
+
+async def buscar_em_paralelo_async(*consultas):
+    """
+    Versão assíncrona de buscar_em_paralelo, para os callbacks async das páginas.
+    Funções síncronas vão para o pool de threads e corrotinas (ex: paginacao.carregar)
+    rodam no próprio event loop, todas ao mesmo tempo.
+    Returns:
+        list: Os resultados, na mesma ordem das funções.
+    """
+    loop = asyncio.get_running_loop()
+    tarefas = [c() if asyncio.iscoroutinefunction(c)
+               else loop.run_in_executor(_executor_consultas, contextvars.copy_context().run, c)
+               for c in consultas]
+    return list(await asyncio.gather(*tarefas))
+
 def table_exists(table_name):
     """
     Verifica se uma tabela específica existe no banco de dados.
@@ -106,15 +723,16 @@ def table_exists(table_name):
     Returns:
         bool: True se a tabela existir, False caso contrário ou em caso de erro.
     """
-    if con is None:
+    if engine is None:
         if pn.state:
             pn.state.notifications.error("Erro: Conexão com o banco de dados não estabelecida para verificar tabela.")
         return False
     try:
-        cur = con.cursor()
-        cur.execute(f"SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = '{table_name.lower()}');")
-        exists = cur.fetchone()[0]
-        cur.close()
+        with conexao() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = %s);", (table_name.lower(),))
+            exists = cur.fetchone()[0]
+            cur.close()
         return exists
     except Exception as e:
         if pn.state:
@@ -122,6 +740,268 @@ def table_exists(table_name):
         print(f"DEBUG: Erro ao verificar existência da tabela '{table_name}': {e}")
         return False
 
+def _valor_python(valor):
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    return valor.item() if hasattr(valor, 'item') else valor
+
+def _condicao_seek(ordem, apos):
+    colunas = [coluna for coluna, _ in ordem]
+    direcoes = {direcao.upper() for _, direcao in ordem}
+    valores = [_valor_python(v) for v in apos]
+    if len(direcoes) == 1:
+        operador = '<' if direcoes == {'DESC'} else '>'
+        marcadores = ', '.join(['%s'] * len(colunas))
+        return f"({', '.join(colunas)}) {operador} ({marcadores})", valores
+    # Direções mistas: (a > x) OR (a = x AND b < y) OR ...
+    partes, params = [], []
+    for i, (coluna, direcao) in enumerate(ordem):
+        iguais = [f"{c} = %s" for c in colunas[:i]]
+        operador = '<' if direcao.upper() == 'DESC' else '>'
+        partes.append("(" + " AND ".join(iguais + [f"{coluna} {operador} %s"]) + ")")
+        params += valores[:i] + [valores[i]]
+    return " OR ".join(partes), params
+
+def fetch_pagina(sql_base, ordem, limite, apos=None, where='', params=None, tipos=None, primario=False):
+    """
+    Busca uma única página de resultados usando paginação por chave (keyset).
+    A consulta base é envolvida em uma subconsulta, e a página seguinte é obtida
+    com uma condição de busca sobre a chave de ordenação em vez de OFFSET, de modo
+    que o custo de cada página não depende do tamanho da tabela.
+    Args:
+        sql_base (str): Consulta SELECT sem ORDER BY.
+        ordem (list): Lista de (coluna, 'ASC'|'DESC'). A última coluna deve ser única.
+        limite (int): Quantidade máxima de linhas retornadas.
+        apos (tuple, optional): Valores das colunas de `ordem` na última linha da página anterior.
+        where (str, optional): Condição adicional sobre as colunas da consulta base.
+        params (tuple, optional): Parâmetros da condição `where`.
+        tipos (dict, optional): Coluna -> dtype, como em fetch_data.
+        primario (bool, optional): Se True, lê sempre do primário (ver fetch_data).
+    Returns:
+        pd.DataFrame: DataFrame com no máximo `limite` linhas.
+    """
+    return fetch_data(*_sql_pagina(sql_base, ordem, limite, apos, where, params), tipos=tipos, primario=primario)
+
+async def fetch_pagina_async(sql_base, ordem, limite, apos=None, where='', params=None, tipos=None, primario=False):
+    """Versão assíncrona de fetch_pagina, executada pelo async_engine."""
+    return await fetch_data_async(*_sql_pagina(sql_base, ordem, limite, apos, where, params),
+                                  tipos=tipos, primario=primario)
+
+def _sql_pagina(sql_base, ordem, limite, apos, where, params):
+    condicoes, valores = ([where] if where else []), list(params or [])
+    if apos is not None:
+        condicao, valores_seek = _condicao_seek(ordem, apos)
+        condicoes.append(condicao)
+        valores += valores_seek
+    query = f"SELECT * FROM ({sql_base}) AS pagina"
+    if condicoes:
+        query += " WHERE " + " AND ".join(f"({c})" for c in condicoes)
+    query += " ORDER BY " + ", ".join(f"{coluna} {direcao}" for coluna, direcao in ordem) + " LIMIT %s"
+    valores.append(limite)
+    return query, valores
+
+# --- Compilação dos filtros de consulta
+_OPERADORES_FILTRO = {'contem': 'ILIKE', 'igual': '=', '>=': '>=', '<=': '<='}
+
+def compilar_filtros(condicoes):
+    """
+    Converte os valores dos cards de filtro em uma condição WHERE parametrizada.
+    Args:
+        condicoes (list): Lista de (colunas, operador, valor). `colunas` é o nome de uma coluna
+                          ou uma tupla de colunas combinadas com OR. Operadores: 'contem' (ILIKE),
+                          'igual', '>=' e '<='. Condições com valor vazio ou None são ignoradas.
+    Returns:
+        tuple: (where, params) - condição sem a palavra WHERE (string vazia se não houver
+               filtros) e a tupla de parâmetros no estilo %s.
+    """
+    partes, params = [], []
+    for colunas, operador, valor in condicoes:
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor is None or valor == '':
+            continue
+        if operador == 'contem':
+            valor = f"%{valor}%"
+        colunas = (colunas,) if isinstance(colunas, str) else colunas
+        sql_op = _OPERADORES_FILTRO[operador]
+        alternativas = [f"{coluna} {sql_op} %s" for coluna in colunas]
+        partes.append(alternativas[0] if len(alternativas) == 1 else "(" + " OR ".join(alternativas) + ")")
+        params += [valor] * len(colunas)
+    return " AND ".join(partes), tuple(params)
+
+def filtros_vacinacoes(nome_cidadao=None, nome_vacina=None, data_inicio=None, data_fim=None):
+    return compilar_filtros([
+        ('nome_cidadao', 'contem', nome_cidadao),
+        ('nome_vacina', 'contem', nome_vacina),
+        ('data_aplicacao', '>=', data_inicio),
+        ('data_aplicacao', '<=', data_fim),
+    ])
+
+def filtros_agendamentos(cpf=None, nome=None, data_inicio=None, data_fim=None):
+    return compilar_filtros([
+        ('cpf', 'contem', cpf),
+        ('nome_cidadao', 'contem', nome),
+        ('data_agendamento', '>=', data_inicio),
+        ('data_agendamento', '<=', data_fim),
+    ])
+
+def filtros_usuarios(cpf=None, nome=None):
+    return compilar_filtros([
+        ('cpf', 'contem', cpf),
+        ('nome', 'contem', nome),
+    ])
+
+def filtros_parentescos(cpf=None, nome=None):
+    return compilar_filtros([
+        (('cpf_responsavel', 'cpf_parente'), 'contem', cpf),
+        (('nome_responsavel', 'nome_parente'), 'contem', nome),
+    ])
+
+def filtros_vacinas(nome=None, doenca=None):
+    return compilar_filtros([
+        ('Nome', 'contem', nome),
+        ('Doenca_Alvo', 'contem', doenca),
+    ])
+
+def filtros_locais(nome=None, cidade=None, bairro=None):
+    return compilar_filtros([
+        ('Nome', 'contem', nome),
+        ('Cidade', 'contem', cidade),
+        ('Bairro', 'contem', bairro),
+    ])
+
+def filtros_campanhas(nome=None, doenca=None, publico=None):
+    return compilar_filtros([
+        ('Nome', 'contem', nome),
+        ('Doenca_Alvo', 'contem', doenca),
+        ('Publico_Alvo', 'contem', publico),
+    ])
+
+# --- Busca por nome (sugestões dos campos de busca)
+# Os valores de uma coluna que contêm o termo digitado, do mais parecido para o menos
+# parecido. Com o pg_trgm (migração 0003), o filtro ILIKE e a ordenação por semelhança
+# (<->) saem do índice GiST de trigramas e só as primeiras linhas são lidas; sem ele, a
+# ordem é pela posição do termo no texto.
+# busca -> (tabela, coluna)
+BUSCAS_NOME = {
+    'usuarios': ('Usuario', 'Nome'),
+    'vacinas': ('Vacina', 'Nome'),
+    'locais': ('Local', 'Nome'),
+    'cidades': ('Local', 'Cidade'),
+    'bairros': ('Local', 'Bairro'),
+    'campanhas': ('Campanha', 'Nome'),
+    'publicos': ('Campanha', 'Publico_alvo'),
+}
+
+# pg_trgm instalado no banco; consultado de novo a cada BUSCA_TRIGRAMAS_VERIFICACAO segundos
+# e depois de aplicar migrações (a 0003 cria a extensão).
+_trigramas = {'instalada': None, 'verificada_em': 0.0}
+
+# SQLSTATE undefined_function: função ou operador do pg_trgm removido depois da verificação.
+_ERRO_FUNCAO_INEXISTENTE = '42883'
+
+def _esquecer_trigramas(instalada=None):
+    _trigramas.update(instalada=instalada, verificada_em=time.monotonic())
+
+async def busca_por_trigramas_async():
+    """Indica se a extensão pg_trgm está instalada no banco."""
+    if (_trigramas['instalada'] is None
+            or time.monotonic() - _trigramas['verificada_em'] >= BUSCA_TRIGRAMAS_VERIFICACAO):
+        df = await fetch_data_async("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS instalada")
+        if df.empty:
+            return False
+        _esquecer_trigramas(bool(df['instalada'].iloc[0]))
+    return _trigramas['instalada']
+
+async def _buscar_por_semelhanca_async(query, params, ordem_trigramas, ordem_texto):
+    """
+    Executa uma busca ordenada por semelhança (pg_trgm) ou, sem a extensão, pela posição do
+    termo no texto. Se a extensão sumiu desde a última verificação, a consulta por
+    semelhança falha com UndefinedFunction e a busca é repetida pela posição do termo.
+    Args:
+        query (str): Consulta com {ordem} no lugar da expressão do ORDER BY.
+        params (dict): Parâmetros da consulta.
+        ordem_trigramas (str): Ordenação usada com o pg_trgm.
+        ordem_texto (str): Ordenação usada sem o pg_trgm.
+    Returns:
+        pd.DataFrame: Resultado da busca, ou um DataFrame vazio em caso de erro.
+    """
+    if await busca_por_trigramas_async():
+        sql, valores = _para_text(query.format(ordem=ordem_trigramas), params)
+
+        async def ler(eng):
+            async with eng.connect() as conn:
+                resultado = await conn.execute(sql, valores)
+                return pd.DataFrame(resultado.fetchall(), columns=list(resultado.keys()))
+
+        try:
+            return await _ler_roteado_async(ler)
+        except sqlalchemy.exc.DBAPIError as e:
+            if getattr(e.orig, 'sqlstate', None) != _ERRO_FUNCAO_INEXISTENTE:
+                if pn.state:
+                    pn.state.notifications.error(f"Erro ao buscar dados: {e}")
+                print(f"DEBUG: Erro ao buscar dados: {e} - Query: {query}")
+                return pd.DataFrame()
+            print("DEBUG: pg_trgm indisponível; busca pela posição do termo.")
+            _esquecer_trigramas(False)
+    return await fetch_data_async(query.format(ordem=ordem_texto), params)
+
+async def buscar_nomes_async(busca, termo, limite=None):
+    """
+    Sugestões para um campo de busca, sem repetições.
+    Args:
+        busca (str): Chave de BUSCAS_NOME (ex: 'usuarios').
+        termo (str): Texto digitado; com menos de BUSCA_MIN_CARACTERES letras não há busca.
+        limite (int, optional): Quantidade máxima de sugestões. Defaults to BUSCA_LIMITE.
+    Returns:
+        list: Valores da coluna que contêm o termo, do mais parecido para o menos parecido.
+    """
+    termo = (termo or '').strip()
+    limite = limite or BUSCA_LIMITE
+    if len(termo) < BUSCA_MIN_CARACTERES:
+        return []
+    tabela, coluna = BUSCAS_NOME[busca]
+    # Algumas linhas a mais, para completar o limite depois de tirar os valores repetidos
+    df = await _buscar_por_semelhanca_async(
+        f"SELECT {coluna} AS valor FROM {tabela} WHERE {coluna} ILIKE %(padrao)s ORDER BY {{ordem}} LIMIT %(linhas)s",
+        {'termo': termo, 'padrao': f"%{termo}%", 'linhas': limite * 3},
+        f"{coluna} <-> %(termo)s", f"position(lower(%(termo)s) in lower({coluna})), {coluna}")
+    if df.empty:
+        return []
+    return list(dict.fromkeys(df['valor']))[:limite]
+
+SQL_BUSCA_CIDADAOS = """
+    SELECT C.CPF, U.Nome
+    FROM Cidadao C
+    JOIN Usuario U ON U.CPF = C.CPF
+"""
+
+async def buscar_cidadaos_async(termo, limite=None):
+    """
+    Cidadãos para os campos de CPF das páginas: pelo prefixo do CPF, se o termo só tem
+    dígitos (pontos, traço e espaços são ignorados; índice da migração 0004), ou pelo nome,
+    do mais parecido para o menos parecido, como em buscar_nomes_async.
+    Args:
+        termo (str): CPF ou nome digitado; com menos de BUSCA_MIN_CARACTERES não há busca.
+        limite (int, optional): Quantidade máxima de cidadãos. Defaults to BUSCA_CIDADAOS_LIMITE.
+    Returns:
+        list: Tuplas (cpf, nome).
+    """
+    termo = (termo or '').strip()
+    limite = limite or BUSCA_CIDADAOS_LIMITE
+    digitos = re.sub(r'[.\-\s]', '', termo)
+    if len(digitos) < BUSCA_MIN_CARACTERES:
+        return []
+    if digitos.isdigit():
+        query = SQL_BUSCA_CIDADAOS + " WHERE C.CPF LIKE %(prefixo)s ORDER BY C.CPF USING ~<~ LIMIT %(limite)s"
+        df = await fetch_data_async(query, {'prefixo': f"{digitos}%", 'limite': limite})
+    else:
+        df = await _buscar_por_semelhanca_async(
+            SQL_BUSCA_CIDADAOS + " WHERE U.Nome ILIKE %(padrao)s ORDER BY {ordem} LIMIT %(limite)s",
+            {'termo': termo, 'padrao': f"%{termo}%", 'limite': limite},
+            "U.Nome <-> %(termo)s", "position(lower(%(termo)s) in lower(U.Nome)), U.Nome")
+    return list(df.itertuples(index=False, name=None))
+
 # --- Funções para pegar dados
 
 def get_campanhas_ativas():
@@ -131,16 +1011,16 @@ def get_campanhas_ativas():
     WHERE (Data_Fim IS NULL OR Data_Fim >= CURRENT_DATE) AND Data_Inicio <= CURRENT_DATE
     ORDER BY Data_Inicio DESC;
     """
-    return fetch_data(query)
+    return fetch_data(query, tabelas=['campanha'])
 
 def get_vacinas():
     query = """
     SELECT Id_Vacina, Nome, Doenca_Alvo, Codigo_Lote, Qtd_Doses, Data_Validade, Data_Chegada
-    FROM Vacina
+    FROM Vacina_Estoque
     WHERE Data_Validade >= CURRENT_DATE
     ORDER BY Nome;
     """
-    return fetch_data(query)
+    return fetch_data(query, tabelas=['vacina', 'estoque_fatia'])
 
 def get_locais(): 
     query = """
@@ -148,33 +1028,43 @@ def get_locais():
     FROM Local
     ORDER BY Nome;
     """
-    return fetch_data(query)
+    return fetch_data(query, tabelas=['local'])
+
+# Campanha exibida de cada agendamento: a da doença da vacina cujo período cobre a data
+# agendada ou, sem nenhuma, a mais recente. É ela que o formulário de reagendamento envia a
+# validar_agendamento.
+SQL_AGENDAMENTOS = """
+    SELECT 
+        a.id_agendamento, a.cpf, u.nome AS nome_cidadao,
+        a.id_vacina, v.nome AS nome_vacina,
+        c.id_campanha, c.nome AS nome_campanha,
+        a.id_local, l.nome AS nome_local,
+        a.data_agendamento
+    FROM Agendamento a
+    LEFT JOIN Usuario u ON a.cpf = u.cpf
+    LEFT JOIN Vacina v ON a.id_vacina = v.id_vacina
+    LEFT JOIN Local l ON a.id_local = l.id_local
+    LEFT JOIN LATERAL (
+        SELECT id_campanha, nome FROM Campanha
+        WHERE doenca_alvo = v.doenca_alvo
+        ORDER BY (data_inicio <= a.data_agendamento
+                  AND (data_fim IS NULL OR data_fim >= a.data_agendamento)) DESC,
+                 data_inicio DESC
+        LIMIT 1
+    ) c ON TRUE
+"""
 
 def get_agendamentos():
-    query = """
-        SELECT 
-            a.id_agendamento, a.cpf, u.nome AS nome_cidadao,
-            a.id_vacina, v.nome AS nome_vacina,
-            c.id_campanha, c.nome AS nome_campanha,
-            a.id_local, l.nome AS nome_local,
-            a.data_agendamento
-        FROM Agendamento a
-        LEFT JOIN Usuario u ON a.cpf = u.cpf
-        LEFT JOIN Vacina v ON a.id_vacina = v.id_vacina
-        LEFT JOIN Local l ON a.id_local = l.id_local
-        LEFT JOIN Campanha c ON v.doenca_alvo = c.doenca_alvo 
-        ORDER BY a.data_agendamento DESC, u.nome ASC;
-    """
+    query = SQL_AGENDAMENTOS + " ORDER BY a.data_agendamento DESC, u.nome ASC;"
     try:
-        df = pd.read_sql(query, engine)
+        df = _ler_roteado(lambda eng: pd.read_sql(query, eng))
         df.columns = [x.lower() for x in df.columns]
         return df
     except Exception as e:
         print(f"ERRO em get_agendamentos: {e}")
         return pd.DataFrame()
 
-def get_usuarios_completo():
-    query = """
+SQL_USUARIOS = """
     SELECT
         U.CPF,
         U.Nome,
@@ -192,9 +1082,17 @@ def get_usuarios_completo():
     LEFT JOIN Cidadao C ON U.CPF = C.CPF
     LEFT JOIN Administrador A ON U.CPF = A.CPF
     LEFT JOIN Agente_Saude S ON U.CPF = S.CPF
-    ORDER BY U.Nome;
-    """
-    return fetch_data(query)
+"""
+
+TIPOS_USUARIOS = {
+    'cpf': TIPO_TEXTO, 'nome': TIPO_TEXTO, 'telefone': TIPO_TEXTO, 'tipo_usuario': TIPO_CATEGORIA,
+    'cartao_sus': TIPO_TEXTO, 'rua': TIPO_TEXTO, 'bairro': TIPO_CATEGORIA, 'numero': 'Int32',
+    'cidade': TIPO_CATEGORIA, 'estado': TIPO_CATEGORIA, 'admin_local_trabalho': TIPO_CATEGORIA,
+    'agente_email': TIPO_TEXTO, 'agente_posto_trabalho': TIPO_CATEGORIA,
+}
+
+def get_usuarios_completo():
+    return fetch_data(SQL_USUARIOS + " ORDER BY U.Nome;", tipos=TIPOS_USUARIOS, tamanho_bloco=DB_BLOCO_LEITURA)
 
 def get_cidadaos():
     query = """
@@ -203,10 +1101,9 @@ def get_cidadaos():
     JOIN Usuario U ON C.CPF = U.CPF
     ORDER BY U.Nome;
     """
-    return fetch_data(query)
+    return fetch_data(query, tabelas=['cidadao', 'usuario'])
 
-def get_vacinacoes():
-    query = """
+SQL_VACINACOES = """
     SELECT
         V_APLIC.Id_Vacinacao,
         V_APLIC.Contagem,
@@ -224,12 +1121,20 @@ def get_vacinacoes():
     JOIN Vacina V ON V_APLIC.Id_Vacina = V.Id_Vacina
     JOIN Local L ON V_APLIC.Id_Local = L.Id_Local
     JOIN Campanha C ON V_APLIC.Id_Campanha = C.Id_Campanha
-    ORDER BY V_APLIC.Data_aplicacao DESC, U.Nome, V.Nome;
-    """
-    return fetch_data(query)
+"""
 
-def get_parentescos():
-    query = """
+TIPOS_VACINACOES = {
+    'id_vacinacao': 'int32', 'contagem': 'int32', 'data_aplicacao': TIPO_DATA,
+    'nome_cidadao': TIPO_TEXTO, 'nome_vacina': TIPO_CATEGORIA, 'nome_local': TIPO_CATEGORIA,
+    'nome_campanha': TIPO_CATEGORIA, 'cpf': TIPO_TEXTO,
+    'id_vacina': 'int32', 'id_local': 'int32', 'id_campanha': 'int32',
+}
+
+def get_vacinacoes():
+    return fetch_data(SQL_VACINACOES + " ORDER BY V_APLIC.Data_aplicacao DESC, U.Nome, V.Nome;",
+                      tipos=TIPOS_VACINACOES, tamanho_bloco=DB_BLOCO_LEITURA)
+
+SQL_PARENTESCOS = """
     SELECT
         P.Id_Parentesco,
         P.CPF_Responsavel,
@@ -241,82 +1146,397 @@ def get_parentescos():
     JOIN Usuario UR ON CR.CPF = UR.CPF
     JOIN Cidadao CP ON P.CPF_Parente = CP.CPF
     JOIN Usuario UP ON CP.CPF = UP.CPF
-    ORDER BY UR.Nome, UP.Nome;
+"""
+
+def get_parentescos():
+    return fetch_data(SQL_PARENTESCOS + " ORDER BY UR.Nome, UP.Nome;")
+
+# --- Registro de vacinações com reserva atômica de doses
+# Cada operação é um único comando: a verificação do cidadão, a baixa condicional do
+# estoque e a escrita em Vacinacao acontecem em uma ida ao banco. O saldo de cada lote
+# fica dividido em fatias (Estoque_Fatia): a reserva baixa uma fatia com saldo escolhida
+# ao acaso e pula as que estão bloqueadas por outra aplicação, então aplicações
+# simultâneas do mesmo lote não fazem fila na mesma linha. Cada baixa ou devolução
+# também é anotada em Movimento_Estoque.
+MOTIVOS_RESERVA = {
+    'ok': "",
+    'cidadao_inexistente': "CPF não encontrado ou não pertence a um cidadão.",
+    'vacina_inexistente': "Vacina inválida.",
+    'sem_estoque': "Estoque insuficiente para a vacina selecionada.",
+    'vacinacao_inexistente': "Registro de vacinação não encontrado.",
+    'erro': "Erro ao executar a operação no banco de dados.",
+}
+
+# {bloqueio} é 'FOR UPDATE SKIP LOCKED' na primeira tentativa e 'FOR UPDATE' na nova
+# tentativa, feita só quando todas as fatias com saldo estavam bloqueadas.
+SQL_REGISTRAR_VACINACAO = """
+WITH cidadao AS (
+    SELECT CPF FROM Cidadao WHERE CPF = %(cpf)s
+), fatia AS (
+    SELECT Id_Vacina, Fatia FROM Estoque_Fatia
+    WHERE Id_Vacina = %(id_vacina)s AND Doses > 0 AND EXISTS (SELECT 1 FROM cidadao)
+    ORDER BY random() LIMIT 1
+    {bloqueio}
+), reserva AS (
+    UPDATE Estoque_Fatia e SET Doses = e.Doses - 1
+    FROM fatia WHERE e.Id_Vacina = fatia.Id_Vacina AND e.Fatia = fatia.Fatia
+    RETURNING e.Id_Vacina
+), registro AS (
+    INSERT INTO Vacinacao (Contagem, Data_aplicacao, Id_Vacina, CPF, Id_Local, Id_Campanha)
+    SELECT %(contagem)s, %(data_aplicacao)s, r.Id_Vacina, c.CPF, %(id_local)s, %(id_campanha)s
+    FROM reserva r CROSS JOIN cidadao c
+    RETURNING Id_Vacinacao, Id_Vacina
+), movimento AS (
+    INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo, Id_Vacinacao)
+    SELECT Id_Vacina, -1, 'aplicacao', Id_Vacinacao FROM registro
+)
+SELECT
+    (SELECT Id_Vacinacao FROM registro),
+    EXISTS (SELECT 1 FROM cidadao),
+    EXISTS (SELECT 1 FROM Vacina WHERE Id_Vacina = %(id_vacina)s),
+    EXISTS (SELECT 1 FROM Estoque_Fatia WHERE Id_Vacina = %(id_vacina)s AND Doses > 0);
+"""
+
+SQL_ATUALIZAR_VACINACAO = """
+WITH cidadao AS (
+    SELECT CPF FROM Cidadao WHERE CPF = %(cpf)s
+), atual AS (
+    SELECT Id_Vacina FROM Vacinacao WHERE Id_Vacinacao = %(id_vacinacao)s FOR UPDATE
+), fatia AS (
+    SELECT Id_Vacina, Fatia FROM Estoque_Fatia
+    WHERE Id_Vacina = %(id_vacina)s AND Doses > 0
+      AND EXISTS (SELECT 1 FROM cidadao)
+      AND EXISTS (SELECT 1 FROM atual WHERE Id_Vacina <> %(id_vacina)s)
+    ORDER BY random() LIMIT 1
+    {bloqueio}
+), reserva AS (
+    UPDATE Estoque_Fatia e SET Doses = e.Doses - 1
+    FROM fatia WHERE e.Id_Vacina = fatia.Id_Vacina AND e.Fatia = fatia.Fatia
+    RETURNING e.Id_Vacina
+), fatia_devolucao AS (
+    SELECT Id_Vacina, Fatia FROM Estoque_Fatia
+    WHERE Id_Vacina = (SELECT Id_Vacina FROM atual) AND EXISTS (SELECT 1 FROM reserva)
+    ORDER BY random() LIMIT 1
+    FOR UPDATE
+), devolucao AS (
+    UPDATE Estoque_Fatia e SET Doses = e.Doses + 1
+    FROM fatia_devolucao d WHERE e.Id_Vacina = d.Id_Vacina AND e.Fatia = d.Fatia
+    RETURNING e.Id_Vacina
+), registro AS (
+    UPDATE Vacinacao
+    SET Contagem = %(contagem)s, Data_aplicacao = %(data_aplicacao)s, Id_Vacina = %(id_vacina)s,
+        CPF = %(cpf)s, Id_Local = %(id_local)s, Id_Campanha = %(id_campanha)s
+    WHERE Id_Vacinacao = %(id_vacinacao)s
+      AND EXISTS (SELECT 1 FROM cidadao)
+      AND (EXISTS (SELECT 1 FROM reserva) OR EXISTS (SELECT 1 FROM atual WHERE Id_Vacina = %(id_vacina)s))
+    RETURNING Id_Vacinacao
+), movimento AS (
+    INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo, Id_Vacinacao)
+    SELECT Id_Vacina, -1, 'aplicacao', %(id_vacinacao)s FROM reserva
+    UNION ALL
+    SELECT Id_Vacina, 1, 'estorno', %(id_vacinacao)s FROM devolucao
+)
+SELECT
+    (SELECT Id_Vacinacao FROM registro),
+    EXISTS (SELECT 1 FROM cidadao),
+    EXISTS (SELECT 1 FROM Vacina WHERE Id_Vacina = %(id_vacina)s),
+    EXISTS (SELECT 1 FROM Estoque_Fatia WHERE Id_Vacina = %(id_vacina)s AND Doses > 0),
+    EXISTS (SELECT 1 FROM atual);
+"""
+
+SQL_EXCLUIR_VACINACAO = """
+WITH removido AS (
+    DELETE FROM Vacinacao WHERE Id_Vacinacao = %(id_vacinacao)s RETURNING Id_Vacina
+), fatia_devolucao AS (
+    SELECT Id_Vacina, Fatia FROM Estoque_Fatia
+    WHERE Id_Vacina IN (SELECT Id_Vacina FROM removido)
+    ORDER BY random() LIMIT 1
+    FOR UPDATE
+), devolucao AS (
+    UPDATE Estoque_Fatia e SET Doses = e.Doses + 1
+    FROM fatia_devolucao d WHERE e.Id_Vacina = d.Id_Vacina AND e.Fatia = d.Fatia
+    RETURNING e.Id_Vacina
+), movimento AS (
+    INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo, Id_Vacinacao)
+    SELECT Id_Vacina, 1, 'estorno', %(id_vacinacao)s FROM devolucao
+)
+SELECT EXISTS (SELECT 1 FROM removido);
+"""
+
+SQL_CONSOLIDAR_ESTOQUE = """
+SET LOCAL estoque.consolidando = 'on';
+UPDATE Vacina v SET Qtd_Doses = s.total
+FROM (SELECT Id_Vacina, SUM(Doses)::INT AS total FROM Estoque_Fatia GROUP BY Id_Vacina) s
+WHERE v.Id_Vacina = s.Id_Vacina AND v.Qtd_Doses IS DISTINCT FROM s.total;
+"""
+CHAVE_LOCK_CONSOLIDACAO = 7302026  # advisory lock: uma consolidação por vez entre os processos
+
+def _motivo_falha_reserva(cidadao_existe, vacina_existe, vacinacao_existe=True):
+    if not vacinacao_existe: return 'vacinacao_inexistente'
+    if not cidadao_existe: return 'cidadao_inexistente'
+    if not vacina_existe: return 'vacina_inexistente'
+    return 'sem_estoque'
+
+def _executar_reserva(sql, params):
+    """
+    Executa um comando de reserva pulando fatias bloqueadas. Se nenhuma fatia livre tinha
+    saldo mas o lote ainda tem doses (todas as fatias ocupadas no momento), repete a
+    tentativa aguardando o bloqueio.
+    Returns:
+        tuple | None: A linha de resultado do comando, ou None em caso de erro.
     """
-    return fetch_data(query)
+    linha = None
+    for bloqueio in ('FOR UPDATE SKIP LOCKED', 'FOR UPDATE'):
+        resultado = execute_query(sql.replace('{bloqueio}', bloqueio), params, fetch_result=True)
+        if resultado is False: return None
+        linha = resultado[0]
+        tem_saldo = linha[3]
+        if linha[0] is not None or not tem_saldo: break
+    return linha
 
-# --- Funções de Validação
+def registrar_vacinacao(cpf, id_vacina, id_local, id_campanha, contagem, data_aplicacao):
+    """
+    Registra uma vacinação reservando uma dose do estoque em um único comando.
+    Returns:
+        tuple: (id_vacinacao, motivo). id_vacinacao é None em caso de falha e motivo é uma
+               das chaves de MOTIVOS_RESERVA.
+    """
+    params = {"cpf": cpf, "id_vacina": id_vacina, "id_local": id_local, "id_campanha": id_campanha,
+              "contagem": contagem, "data_aplicacao": data_aplicacao}
+    linha = _executar_reserva(SQL_REGISTRAR_VACINACAO, params)
+    if linha is None: return None, 'erro'
+    id_vacinacao, cidadao_existe, vacina_existe, _ = linha
+    if id_vacinacao is not None: return id_vacinacao, 'ok'
+    return None, _motivo_falha_reserva(cidadao_existe, vacina_existe)
 
-def validar_cidadao_aptidao(cpf, campanha_id):
-    if engine is None: return False, "Erro: Conexão com o banco de dados não estabelecida."
+def atualizar_vacinacao(id_vacinacao, cpf, id_vacina, id_local, id_campanha, contagem, data_aplicacao):
+    """
+    Atualiza uma vacinação em um único comando. Se a vacina mudou, devolve a dose ao lote
+    original e reserva uma dose do novo lote; sem estoque no novo lote, nada é alterado.
+    Returns:
+        tuple: (id_vacinacao, motivo), como em registrar_vacinacao.
+    """
+    params = {"id_vacinacao": id_vacinacao, "cpf": cpf, "id_vacina": id_vacina, "id_local": id_local,
+              "id_campanha": id_campanha, "contagem": contagem, "data_aplicacao": data_aplicacao}
+    linha = _executar_reserva(SQL_ATUALIZAR_VACINACAO, params)
+    if linha is None: return None, 'erro'
+    id_atualizado, cidadao_existe, vacina_existe, _, vacinacao_existe = linha
+    if id_atualizado is not None: return id_atualizado, 'ok'
+    return None, _motivo_falha_reserva(cidadao_existe, vacina_existe, vacinacao_existe)
+
+def excluir_vacinacao(id_vacinacao):
+    """
+    Exclui uma vacinação e devolve a dose ao lote em um único comando.
+    Returns:
+        tuple: (id_vacinacao, motivo), como em registrar_vacinacao.
+    """
+    resultado = execute_query(SQL_EXCLUIR_VACINACAO, {"id_vacinacao": id_vacinacao}, fetch_result=True)
+    if resultado is False: return None, 'erro'
+    return (id_vacinacao, 'ok') if resultado[0][0] else (None, 'vacinacao_inexistente')
+
+def consolidar_estoque():
+    """
+    Grava em Vacina.Qtd_Doses a soma das fatias de cada lote. As telas leem o saldo direto
+    das fatias (view Vacina_Estoque); a coluna consolidada serve a relatórios e consultas
+    externas e é atualizada periodicamente pelo main_app. Todos os processos agendam a
+    consolidação; quem encontra o advisory lock ocupado pula a rodada, e só lotes com saldo
+    diferente são gravados (sem lotes alterados, nada é notificado nem invalidado no cache).
+    Returns:
+        bool: True em caso de sucesso (inclusive rodada pulada), False em caso de erro.
+    """
+    if engine is None: return False
     try:
-        query_campanha = "SELECT Publico_Alvo FROM Campanha WHERE Id_Campanha = %s"
-        campanha_info = fetch_data(query_campanha, params=[campanha_id])
-        if campanha_info.empty: return False, "Campanha inválida."
-        publico_alvo_campanha = campanha_info.iloc[0]['publico_alvo'].lower()
-
-        query_cidadao = "SELECT U.Nome, C.Cidade FROM Cidadao C JOIN Usuario U ON C.CPF = U.CPF WHERE C.CPF = %s"
-        cidadao_info = fetch_data(query_cidadao, params=[cpf])
-        if cidadao_info.empty: return False, "CPF não cadastrado como cidadão."
-
-        cidadao_cidade = cidadao_info.iloc[0]['cidade'].lower()
-        if cidadao_cidade not in publico_alvo_campanha and "geral" not in publico_alvo_campanha:
-            return False, f"Cidadão de {cidadao_cidade.capitalize()} não se encaixa no público alvo da campanha ({publico_alvo_campanha})."
-        return True, ""
+        with conexao() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (CHAVE_LOCK_CONSOLIDACAO,))
+            if not cur.fetchone()[0]:
+                return True
+            cur.execute(SQL_CONSOLIDAR_ESTOQUE)
+            alterados = cur.rowcount
+        if alterados:
+            invalidar_cache('vacina')
+        return True
     except Exception as e:
-        return False, f"Erro na validação do cidadão: {e}"
+        print(f"Erro ao consolidar o estoque: {e}")
+        return False
 
-def validar_estoque_vacina(id_vacina):
-    if engine is None: return False, "Erro: Conexão com o banco de dados não estabelecida."
-    query = "SELECT Qtd_Doses FROM Vacina WHERE Id_Vacina = %s"
-    df = fetch_data(query, params=[id_vacina])
-    if df.empty: return False, "Vacina inválida."
-    return (df.iloc[0]['qtd_doses'] > 0), "Vacina sem estoque disponível."
+# --- Agendamentos com controle de vagas por local e dia
+# Vaga_Local guarda quantas vagas de cada (Id_Local, Data_Agendamento) estão ocupadas. Cada
+# operação toma ou devolve a vaga no mesmo comando que escreve em Agendamento; a vaga só é
+# tomada se Ocupadas < Capacidade na linha bloqueada, então dois agendamentos simultâneos
+# não conseguem ocupar a última vaga ao mesmo tempo. Capacidade NULL significa sem limite.
+MOTIVOS_AGENDAMENTO = {
+    'ok': "",
+    'local_inexistente': "Local inválido.",
+    'sem_vaga': "Local sem vagas na data selecionada.",
+    'agendamento_inexistente': "Agendamento não encontrado.",
+    'erro': "Erro ao executar a operação no banco de dados.",
+}
 
-def contar_agendamentos_no_local(local_id, data_agendamento):
-    if engine is None: return 0
-    query = """
-    SELECT COUNT(*) as contagem
-    FROM Agendamento
-    WHERE Id_Local = %s AND Data_Agendamento = %s;
+_SQL_TOMAR_VAGA = """
+    INSERT INTO Vaga_Local AS v (Id_Local, Data_Agendamento, Ocupadas)
+    SELECT Id_Local, %(data)s, 1 FROM Local
+    WHERE Id_Local = %(id_local)s AND (Capacidade IS NULL OR Capacidade > 0) {condicao}
+    ON CONFLICT (Id_Local, Data_Agendamento) DO UPDATE SET Ocupadas = v.Ocupadas + 1
+    WHERE v.Ocupadas < (SELECT COALESCE(Capacidade, 2147483647) FROM Local WHERE Id_Local = v.Id_Local)
+    RETURNING Id_Local
+"""
+
+SQL_AGENDAR = """
+WITH vaga AS (""" + _SQL_TOMAR_VAGA.replace('{condicao}', '') + """), registro AS (
+    INSERT INTO Agendamento (CPF, Id_Vacina, Id_Local, Data_Agendamento)
+    SELECT %(cpf)s, %(id_vacina)s, Id_Local, %(data)s FROM vaga
+    RETURNING Id_Agendamento
+)
+SELECT
+    (SELECT Id_Agendamento FROM registro),
+    EXISTS (SELECT 1 FROM Local WHERE Id_Local = %(id_local)s);
+"""
+
+SQL_REAGENDAR = """
+WITH atual AS (
+    SELECT Id_Local, Data_Agendamento FROM Agendamento WHERE Id_Agendamento = %(id_agendamento)s FOR UPDATE
+), mesma_vaga AS (
+    SELECT 1 FROM atual WHERE Id_Local = %(id_local)s AND Data_Agendamento = %(data)s
+), vaga AS (""" + _SQL_TOMAR_VAGA.replace(
+    '{condicao}', 'AND EXISTS (SELECT 1 FROM atual) AND NOT EXISTS (SELECT 1 FROM mesma_vaga)') + """), liberada AS (
+    UPDATE Vaga_Local v SET Ocupadas = GREATEST(v.Ocupadas - 1, 0)
+    FROM atual a
+    WHERE v.Id_Local = a.Id_Local AND v.Data_Agendamento = a.Data_Agendamento AND EXISTS (SELECT 1 FROM vaga)
+    RETURNING v.Id_Local
+), registro AS (
+    UPDATE Agendamento
+    SET CPF = %(cpf)s, Id_Vacina = %(id_vacina)s, Id_Local = %(id_local)s, Data_Agendamento = %(data)s
+    WHERE Id_Agendamento = %(id_agendamento)s
+      AND (EXISTS (SELECT 1 FROM vaga) OR EXISTS (SELECT 1 FROM mesma_vaga))
+    RETURNING Id_Agendamento
+)
+SELECT
+    (SELECT Id_Agendamento FROM registro),
+    EXISTS (SELECT 1 FROM Local WHERE Id_Local = %(id_local)s),
+    EXISTS (SELECT 1 FROM atual);
+"""
+
+SQL_CANCELAR_AGENDAMENTO = """
+WITH removido AS (
+    DELETE FROM Agendamento WHERE Id_Agendamento = %(id_agendamento)s RETURNING Id_Local, Data_Agendamento
+), liberada AS (
+    UPDATE Vaga_Local v SET Ocupadas = GREATEST(v.Ocupadas - 1, 0)
+    FROM removido r
+    WHERE v.Id_Local = r.Id_Local AND v.Data_Agendamento = r.Data_Agendamento
+    RETURNING v.Id_Local
+)
+SELECT EXISTS (SELECT 1 FROM removido);
+"""
+
+def _motivo_falha_agendamento(local_existe, agendamento_existe=True):
+    if not agendamento_existe: return 'agendamento_inexistente'
+    if not local_existe: return 'local_inexistente'
+    return 'sem_vaga'
+
+def agendar(cpf, id_vacina, id_local, data_agendamento):
     """
-    df = fetch_data(query, params=[local_id, data_agendamento])
-    return df.iloc[0]['contagem'] if not df.empty else 0
+    Cria um agendamento tomando uma vaga do local na data em um único comando.
+    Returns:
+        tuple: (id_agendamento, motivo). id_agendamento é None em caso de falha e motivo é
+               uma das chaves de MOTIVOS_AGENDAMENTO.
+    """
+    params = {"cpf": cpf, "id_vacina": id_vacina, "id_local": id_local, "data": data_agendamento}
+    resultado = execute_query(SQL_AGENDAR, params, fetch_result=True)
+    if resultado is False: return None, 'erro'
+    id_agendamento, local_existe = resultado[0]
+    if id_agendamento is not None: return id_agendamento, 'ok'
+    return None, _motivo_falha_agendamento(local_existe)
 
-def capacidade_local(local_id):
-    if engine is None: return 0
-    query = "SELECT Capacidade FROM Local WHERE Id_Local = %s"
-    df = fetch_data(query, params=[local_id])
-    if df.empty or df.iloc[0]['capacidade'] is None: return 0
-    return df.iloc[0]['capacidade']
+def reagendar(id_agendamento, cpf, id_vacina, id_local, data_agendamento):
+    """
+    Altera um agendamento. Se o local ou a data mudaram, toma a nova vaga e libera a antiga
+    no mesmo comando; sem vaga no novo local/data, nada é alterado.
+    Returns:
+        tuple: (id_agendamento, motivo), como em agendar.
+    """
+    params = {"id_agendamento": id_agendamento, "cpf": cpf, "id_vacina": id_vacina,
+              "id_local": id_local, "data": data_agendamento}
+    resultado = execute_query(SQL_REAGENDAR, params, fetch_result=True)
+    if resultado is False: return None, 'erro'
+    id_atualizado, local_existe, agendamento_existe = resultado[0]
+    if id_atualizado is not None: return id_atualizado, 'ok'
+    return None, _motivo_falha_agendamento(local_existe, agendamento_existe)
 
-def validar_periodo_campanha(id_campanha, data_agendamento):
-    if engine is None: return False, "Erro: Conexão com o banco de dados não estabelecida."
-    query = """
-    SELECT Data_Inicio, Data_Fim
-    FROM Campanha
-    WHERE Id_Campanha = %s;
-    """
-    df = fetch_data(query, params=[id_campanha])
-    if df.empty: return False, "Campanha inválida."
-    data_inicio = df.iloc[0]['data_inicio']
-    data_fim = df.iloc[0]['data_fim'] if pd.notna(df.iloc[0]['data_fim']) else date.max
-    if not (data_inicio <= data_agendamento <= data_fim):
-        return False, "Data agendada fora do período da campanha."
-    return True, ""
+def cancelar_agendamento(id_agendamento):
+    """
+    Exclui um agendamento e libera a vaga em um único comando.
+    Returns:
+        tuple: (id_agendamento, motivo), como em agendar.
+    """
+    resultado = execute_query(SQL_CANCELAR_AGENDAMENTO, {"id_agendamento": id_agendamento}, fetch_result=True)
+    if resultado is False: return None, 'erro'
+    return (id_agendamento, 'ok') if resultado[0][0] else (None, 'agendamento_inexistente')
 
-def validar_agendamento_duplicado(cpf, id_vacina, data_agendamento):
-    if engine is None: return False, "Erro: Conexão com o banco de dados não estabelecida."
-    query = """
-    SELECT COUNT(*) as contagem
-    FROM Agendamento
-    WHERE CPF = %s AND Id_Vacina = %s AND Data_Agendamento = %s;
+# --- Validação de agendamentos em um único comando
+# Aptidão do cidadão, período da campanha, estoque, agendamento duplicado e capacidade do
+# local são conferidos em uma consulta que devolve uma linha de vereditos. Capacidade NULL
+# significa sem limite, como em _SQL_TOMAR_VAGA.
+SQL_VALIDAR_AGENDAMENTO = """
+WITH campanha AS (
+    SELECT Publico_Alvo, Data_Inicio, Data_Fim FROM Campanha WHERE Id_Campanha = %(id_campanha)s
+), cidadao AS (
+    SELECT C.Cidade FROM Cidadao C JOIN Usuario U ON C.CPF = U.CPF WHERE C.CPF = %(cpf)s
+)
+SELECT
+    (SELECT Publico_Alvo FROM campanha),
+    EXISTS (SELECT 1 FROM cidadao),
+    (SELECT Cidade FROM cidadao),
+    (SELECT %(data)s BETWEEN Data_Inicio AND COALESCE(Data_Fim, 'infinity'::DATE) FROM campanha),
+    (SELECT Qtd_Doses FROM Vacina_Estoque WHERE Id_Vacina = %(id_vacina)s),
+    EXISTS (SELECT 1 FROM Agendamento
+            WHERE CPF = %(cpf)s AND Id_Vacina = %(id_vacina)s AND Data_Agendamento = %(data)s
+              AND Id_Agendamento IS DISTINCT FROM %(id_agendamento)s),
+    EXISTS (SELECT 1 FROM Local WHERE Id_Local = %(id_local)s),
+    (SELECT Capacidade FROM Local WHERE Id_Local = %(id_local)s),
+    COALESCE((SELECT Ocupadas FROM Vaga_Local WHERE Id_Local = %(id_local)s AND Data_Agendamento = %(data)s), 0)
+    - (SELECT COUNT(*) FROM Agendamento
+       WHERE Id_Agendamento = %(id_agendamento)s AND Id_Local = %(id_local)s AND Data_Agendamento = %(data)s);
+"""
+
+def validar_agendamento(cpf, id_campanha, id_vacina, id_local, data_agendamento, id_agendamento=None):
     """
-    df = fetch_data(query, params=[cpf, id_vacina, data_agendamento])
-    return (df.iloc[0]['contagem'] == 0), ""
+    Valida um agendamento (ou reagendamento) com uma única ida ao banco.
+    Args:
+        cpf (str): CPF do cidadão.
+        id_campanha (int): Campanha à qual o agendamento pertence.
+        id_vacina (int): Vacina agendada.
+        id_local (int): Local de aplicação.
+        data_agendamento (date): Data agendada.
+        id_agendamento (int, optional): Agendamento sendo alterado, que não conta como
+                                        duplicado nem ocupa vaga. Defaults to None.
+    Returns:
+        tuple: (bool, str) indicando se o agendamento é válido e, se não for, o motivo.
+    """
+    if engine is None: return False, "Erro: Conexão com o banco de dados não estabelecida."
+    params = {"cpf": cpf, "id_campanha": id_campanha, "id_vacina": id_vacina, "id_local": id_local,
+              "data": data_agendamento, "id_agendamento": id_agendamento}
+    # Leitura pura, mas no primário: o veredito precisa ver os agendamentos e vagas recém-gravados
+    try:
+        with conexao() as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_VALIDAR_AGENDAMENTO, params)
+            (publico_alvo, cidadao_existe, cidade, periodo_ok, doses, duplicado,
+             local_existe, capacidade, ocupacao) = cur.fetchone()
+    except Exception as e:
+        print(f"Erro ao validar o agendamento: {e}")
+        return False, "Erro ao validar o agendamento."
 
-def verificar_cidadao_existe(cpf):
-    if engine is None: return False
-    query = "SELECT CPF FROM Cidadao WHERE CPF = %s;"
-    df = fetch_data(query, params=[cpf])
-    return not df.empty
+    if publico_alvo is None: return False, "Campanha inválida."
+    if not cidadao_existe: return False, "CPF não cadastrado como cidadão."
+    publico_alvo, cidade = publico_alvo.lower(), (cidade or '').lower()
+    if cidade not in publico_alvo and "geral" not in publico_alvo:
+        return False, f"Cidadão de {cidade.capitalize()} não se encaixa no público alvo da campanha ({publico_alvo})."
+    if not periodo_ok: return False, "Data agendada fora do período da campanha."
+    if doses is None: return False, "Vacina inválida."
+    if doses <= 0: return False, "Vacina sem estoque disponível."
+    if duplicado: return False, "Já existe um agendamento desta vacina para este cidadão nesta data."
+    if not local_existe: return False, "Local inválido."
+    if capacidade is not None and ocupacao >= capacidade:
+        return False, f"Local sem vagas na data selecionada (capacidade: {capacidade})."
+    return True, ""
@@ -0,0 +1,196 @@
+import os
+import io
+import csv
+import sys
+import asyncio
+from datetime import date
+
+import tornado.web
+import tornado.iostream
+
+from db_config import (conexao, SQL_VACINACOES, SQL_AGENDAMENTOS, SQL_USUARIOS,
+                       filtros_vacinacoes, filtros_agendamentos, filtros_usuarios)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet é opcional; sem pyarrow só o CSV fica disponível
+    pa = pq = None
+
+# --- Exportação das consultas em CSV e Parquet
+# As linhas são lidas de um cursor nomeado (server-side) em blocos de EXPORTACAO_BLOCO e
+# cada bloco é escrito na resposta assim que fica pronto, então a memória usada não
+# depende do tamanho do resultado. Os filtros chegam pela query string com os mesmos
+# nomes dos argumentos de db_config.filtros_*.
+# A leitura usa a réplica de leitura quando houver uma disponível (db_config.conexao).
+# Rota registrada com: panel serve main_app.py --plugins exportacao
+EXPORTACAO_BLOCO = int(os.getenv('EXPORTACAO_BLOCO', 10000))
+
+_TEXTO = str
+_DATA = date.fromisoformat
+
+# nome -> (consulta base, função de filtros, {argumento: conversor}, ordem)
+EXPORTACOES = {
+    'vacinacoes': (SQL_VACINACOES, filtros_vacinacoes,
+                   {'nome_cidadao': _TEXTO, 'nome_vacina': _TEXTO, 'data_inicio': _DATA, 'data_fim': _DATA},
+                   'data_aplicacao DESC, id_vacinacao DESC'),
+    'agendamentos': (SQL_AGENDAMENTOS, filtros_agendamentos,
+                     {'cpf': _TEXTO, 'nome': _TEXTO, 'data_inicio': _DATA, 'data_fim': _DATA},
+                     'data_agendamento DESC, id_agendamento DESC'),
+    'usuarios': (SQL_USUARIOS, filtros_usuarios,
+                 {'cpf': _TEXTO, 'nome': _TEXTO},
+                 'nome ASC, cpf ASC'),
+}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def sql_exportacao(nome, filtros=None):
+    """
+    Monta a consulta de exportação de uma das EXPORTACOES.
+    Args:
+        nome (str): Chave de EXPORTACOES ('vacinacoes', 'agendamentos' ou 'usuarios').
+        filtros (dict, optional): Argumentos para a função filtros_* da exportação.
+    Returns:
+        tuple: (query, params) no estilo %s.
+    """
+    sql_base, filtrar, _, ordem = EXPORTACOES[nome]
+    where, params = filtrar(**(filtros or {}))
+    query = f"SELECT * FROM ({sql_base}) AS exportacao"
+    if where:
+        query += f" WHERE {where}"
+    return query + f" ORDER BY {ordem}", params
+
+def _bloco_csv(linhas, colunas=None):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    if colunas:
+        escritor.writerow(colunas)
+    escritor.writerows(linhas)
+    return buffer.getvalue().encode('utf-8')
+
+# Tipos do Postgres (OID em cursor.description) -> tipos Arrow; os demais viram texto.
+def _tipo_parquet(oid):
+    return {
+        16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+        700: pa.float32(), 701: pa.float64(),
+        1082: pa.date32(), 1114: pa.timestamp('us'), 1184: pa.timestamp('us', tz='UTC'),
+    }.get(oid, pa.string())
+
+def _coluna_parquet(valores, tipo):
+    if tipo == pa.string():
+        valores = [None if v is None else str(v) for v in valores]
+    return pa.array(valores, type=tipo)
+
+class _SaidaEmBlocos:
+    """Destino do ParquetWriter que acumula os bytes escritos até serem retirados com esvaziar()."""
+
+    def __init__(self):
+        self._partes, self._posicao, self.closed = [], 0, False
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def esvaziar(self):
+        dados, self._partes = b''.join(self._partes), []
+        return dados
+
+def blocos_exportacao(nome, formato, filtros=None, tamanho_bloco=None):
+    """
+    Gera o arquivo de exportação em blocos de bytes, lendo o resultado por um cursor
+    nomeado. Cada bloco corresponde a até `tamanho_bloco` linhas (no Parquet, um row group).
+    Args:
+        nome (str): Chave de EXPORTACOES.
+        formato (str): 'csv' ou 'parquet'.
+        filtros (dict, optional): Argumentos para a função filtros_* da exportação.
+        tamanho_bloco (int, optional): Linhas por bloco. Defaults to EXPORTACAO_BLOCO.
+    Yields:
+        bytes: Próximo trecho do arquivo.
+    """
+    if formato == 'parquet' and pa is None:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow.")
+    tamanho_bloco = tamanho_bloco or EXPORTACAO_BLOCO
+    query, params = sql_exportacao(nome, filtros)
+    with conexao(somente_leitura=True) as conn:
+        cur = conn.cursor(name=f'exportacao_{nome}')
+        cur.itersize = tamanho_bloco
+        cur.execute(query, params)
+        linhas = cur.fetchmany(tamanho_bloco)
+        colunas = [c.name for c in cur.description]
+        if formato == 'csv':
+            yield _bloco_csv(linhas, colunas)
+            while linhas := cur.fetchmany(tamanho_bloco):
+                yield _bloco_csv(linhas)
+        else:
+            esquema = pa.schema([(c.name, _tipo_parquet(c.type_code)) for c in cur.description])
+            saida = _SaidaEmBlocos()
+            with pq.ParquetWriter(saida, esquema) as escritor:
+                while linhas:
+                    escritor.write_table(pa.table(
+                        [_coluna_parquet(valores, campo.type) for valores, campo in zip(zip(*linhas), esquema)],
+                        schema=esquema))
+                    yield saida.esvaziar()
+                    linhas = cur.fetchmany(tamanho_bloco)
+            yield saida.esvaziar()
+        cur.close()
+
+# --- Rota HTTP (tornado)
+class ExportacaoHandler(tornado.web.RequestHandler):
+    """GET /exportar/<nome>.<formato>?<filtros>: envia a exportação em streaming."""
+
+    def _filtros(self, nome):
+        filtros = {}
+        for argumento, converter in EXPORTACOES[nome][2].items():
+            valor = self.get_argument(argumento, '').strip()
+            if valor:
+                try:
+                    filtros[argumento] = converter(valor)
+                except ValueError:
+                    raise tornado.web.HTTPError(400, reason=f"Filtro inválido: {argumento}")
+        return filtros
+
+    async def get(self, nome, formato):
+        if formato == 'parquet' and pa is None:
+            raise tornado.web.HTTPError(501, reason="Exportação em Parquet requer o pacote pyarrow.")
+        blocos = blocos_exportacao(nome, formato, self._filtros(nome))
+        loop = asyncio.get_running_loop()
+        self.set_header('Content-Type', FORMATOS[formato])
+        self.set_header('Content-Disposition', f'attachment; filename="{nome}_{date.today():%Y%m%d}.{formato}"')
+        try:
+            # A leitura do banco roda fora do event loop; o flush espera o cliente
+            # consumir o bloco antes de o próximo ser buscado.
+            while (bloco := await loop.run_in_executor(None, next, blocos, None)) is not None:
+                self.write(bloco)
+                await self.flush()
+        except tornado.iostream.StreamClosedError:
+            pass
+        finally:
+            await loop.run_in_executor(None, blocos.close)
+
+ROUTES = [
+    (r'/exportar/(' + '|'.join(EXPORTACOES) + r')\.(' + '|'.join(FORMATOS) + r')', ExportacaoHandler),
+]
+
+# Uso: python exportacao.py vacinacoes|agendamentos|usuarios destino.csv|destino.parquet
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in EXPORTACOES:
+        print(f"Uso: python exportacao.py <{'|'.join(EXPORTACOES)}> <destino.csv|destino.parquet>")
+        sys.exit(2)
+    formato = 'parquet' if sys.argv[2].endswith('.parquet') else 'csv'
+    with open(sys.argv[2], 'wb') as f:
+        for bloco in blocos_exportacao(sys.argv[1], formato):
+            f.write(bloco)
+    print(f"Exportação gravada em {sys.argv[2]}")
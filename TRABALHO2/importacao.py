@@ -0,0 +1,400 @@
+import io
+import re
+import csv
+import sys
+import tempfile
+from datetime import datetime, date
+
+import pandas as pd
+
+from db_config import conexao, invalidar_cache
+
+# --- Importação em massa de vacinações (CSV)
+# O arquivo é normalizado linha a linha e enviado com COPY para uma tabela temporária; a
+# validação (cidadão, lote, local, campanha e estoque) e a gravação são feitas por
+# conjunto, em uma única transação. As linhas recusadas voltam em um relatório de erros.
+COLUNAS_IMPORTACAO = ('cpf', 'id_vacina', 'id_local', 'id_campanha', 'contagem', 'data_aplicacao')
+
+MOTIVOS_IMPORTACAO = {
+    'formato_invalido': "Campo ausente ou em formato inválido.",
+    'cidadao_inexistente': "CPF não encontrado ou não pertence a um cidadão.",
+    'vacina_inexistente': "Vacina inválida.",
+    'local_inexistente': "Local inválido.",
+    'campanha_inexistente': "Campanha inválida.",
+    'sem_estoque': "Estoque insuficiente no lote para esta linha.",
+}
+
+SQL_CRIAR_STAGING = """
+CREATE TEMP TABLE importacao_vacinacao (
+    Linha INTEGER NOT NULL,
+    CPF VARCHAR(20) NOT NULL,
+    Id_Vacina INTEGER NOT NULL,
+    Id_Local INTEGER NOT NULL,
+    Id_Campanha INTEGER NOT NULL,
+    Contagem INTEGER NOT NULL,
+    Data_aplicacao DATE NOT NULL,
+    Motivo VARCHAR(30),
+    PRIMARY KEY (Linha)
+) ON COMMIT DROP;
+"""
+
+SQL_VALIDAR_REFERENCIAS = """
+UPDATE importacao_vacinacao s SET Motivo = r.Motivo
+FROM (
+    SELECT i.Linha,
+           CASE WHEN c.CPF IS NULL THEN 'cidadao_inexistente'
+                WHEN v.Id_Vacina IS NULL THEN 'vacina_inexistente'
+                WHEN l.Id_Local IS NULL THEN 'local_inexistente'
+                WHEN k.Id_Campanha IS NULL THEN 'campanha_inexistente'
+           END AS Motivo
+    FROM importacao_vacinacao i
+    LEFT JOIN Cidadao c ON c.CPF = i.CPF
+    LEFT JOIN Vacina v ON v.Id_Vacina = i.Id_Vacina
+    LEFT JOIN Local l ON l.Id_Local = i.Id_Local
+    LEFT JOIN Campanha k ON k.Id_Campanha = i.Id_Campanha
+) r
+WHERE s.Linha = r.Linha AND r.Motivo IS NOT NULL;
+"""
+
+# Trava as fatias dos lotes envolvidos até o fim da transação, para o saldo não mudar
+# entre a conferência e a baixa.
+SQL_TRAVAR_FATIAS = """
+SELECT 1 FROM Estoque_Fatia
+WHERE Id_Vacina IN (SELECT DISTINCT Id_Vacina FROM importacao_vacinacao WHERE Motivo IS NULL)
+ORDER BY Id_Vacina, Fatia
+FOR UPDATE;
+"""
+
+# Dentro de cada lote, as linhas são atendidas na ordem do arquivo até o saldo acabar.
+SQL_VALIDAR_ESTOQUE = """
+UPDATE importacao_vacinacao s SET Motivo = 'sem_estoque'
+FROM (
+    SELECT i.Linha,
+           ROW_NUMBER() OVER (PARTITION BY i.Id_Vacina ORDER BY i.Linha) AS ordem,
+           COALESCE(e.saldo, 0) AS saldo
+    FROM importacao_vacinacao i
+    LEFT JOIN (SELECT Id_Vacina, SUM(Doses) AS saldo FROM Estoque_Fatia GROUP BY Id_Vacina) e
+           ON e.Id_Vacina = i.Id_Vacina
+    WHERE i.Motivo IS NULL
+) r
+WHERE s.Linha = r.Linha AND r.ordem > r.saldo;
+"""
+
+# Baixa agrupada: cada lote perde tantas doses quantas linhas válidas tiver, consumidas
+# das fatias em sequência.
+SQL_BAIXAR_ESTOQUE = """
+WITH pedido AS (
+    SELECT Id_Vacina, COUNT(*) AS doses FROM importacao_vacinacao WHERE Motivo IS NULL GROUP BY Id_Vacina
+), fatias AS (
+    SELECT f.Id_Vacina, f.Fatia, f.Doses,
+           SUM(f.Doses) OVER (PARTITION BY f.Id_Vacina ORDER BY f.Fatia) - f.Doses AS antes
+    FROM Estoque_Fatia f JOIN pedido p ON p.Id_Vacina = f.Id_Vacina
+)
+UPDATE Estoque_Fatia e SET Doses = e.Doses - LEAST(fa.Doses, p.doses - fa.antes)
+FROM fatias fa JOIN pedido p ON p.Id_Vacina = fa.Id_Vacina
+WHERE e.Id_Vacina = fa.Id_Vacina AND e.Fatia = fa.Fatia AND p.doses > fa.antes;
+"""
+
+SQL_GRAVAR_VACINACOES = """
+WITH novas AS (
+    INSERT INTO Vacinacao (Contagem, Data_aplicacao, Id_Vacina, CPF, Id_Local, Id_Campanha)
+    SELECT Contagem, Data_aplicacao, Id_Vacina, CPF, Id_Local, Id_Campanha
+    FROM importacao_vacinacao WHERE Motivo IS NULL ORDER BY Linha
+    RETURNING Id_Vacinacao, Id_Vacina
+)
+INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo, Id_Vacinacao)
+SELECT Id_Vacina, -1, 'aplicacao', Id_Vacinacao FROM novas;
+"""
+
+SQL_LINHAS_RECUSADAS = """
+SELECT Linha, CPF, Id_Vacina, Id_Local, Id_Campanha, Contagem, Data_aplicacao, Motivo
+FROM importacao_vacinacao WHERE Motivo IS NOT NULL ORDER BY Linha;
+"""
+
+# --- Importação em massa de usuários (CSV)
+# Mesmo fluxo das vacinações: COPY para a staging e, por conjunto, deduplicação por CPF,
+# upsert em Usuario e upsert no subtipo (Cidadao, Administrador ou Agente_saude) indicado
+# na linha; os demais subtipos que o CPF já tenha são mantidos. Apenas cpf, nome e
+# telefone são obrigatórios; o tipo, se omitido, é cidadão.
+COLUNAS_IMPORTACAO_USUARIOS = ('cpf', 'nome', 'telefone', 'tipo', 'cartao_sus', 'rua', 'bairro', 'numero',
+                               'cidade', 'estado', 'local_trabalho', 'email', 'posto_trabalho')
+COLUNAS_OBRIGATORIAS_USUARIOS = ('cpf', 'nome', 'telefone')
+
+TIPOS_USUARIO = {
+    '': 'cidadao', 'cidadao': 'cidadao', 'cidadão': 'cidadao',
+    'administrador': 'administrador', 'admin': 'administrador',
+    'agente': 'agente', 'agente de saude': 'agente', 'agente de saúde': 'agente', 'agente_saude': 'agente',
+}
+
+MOTIVOS_IMPORTACAO_USUARIOS = {
+    'formato_invalido': "Campo obrigatório ausente, tipo desconhecido ou valor longo demais.",
+    'cpf_repetido': "CPF repetido no arquivo; vale a última ocorrência.",
+}
+
+SQL_CRIAR_STAGING_USUARIOS = """
+CREATE TEMP TABLE importacao_usuario (
+    Linha INTEGER NOT NULL,
+    CPF VARCHAR(20) NOT NULL,
+    Nome VARCHAR(100) NOT NULL,
+    Telefone VARCHAR(100) NOT NULL,
+    Tipo VARCHAR(20) NOT NULL,
+    Cartao_Sus VARCHAR(100),
+    Rua VARCHAR(100),
+    Bairro VARCHAR(100),
+    Numero INT,
+    Cidade VARCHAR(100),
+    Estado VARCHAR(50),
+    Local_Trabalho VARCHAR(100),
+    Email VARCHAR(100),
+    Posto_Trabalho VARCHAR(100),
+    Motivo VARCHAR(30),
+    PRIMARY KEY (Linha)
+) ON COMMIT DROP;
+"""
+
+SQL_DEDUPLICAR_USUARIOS = """
+UPDATE importacao_usuario s SET Motivo = 'cpf_repetido'
+FROM (
+    SELECT Linha, ROW_NUMBER() OVER (PARTITION BY CPF ORDER BY Linha DESC) AS ordem
+    FROM importacao_usuario
+) r
+WHERE s.Linha = r.Linha AND r.ordem > 1;
+"""
+
+# xmax = 0 identifica as linhas inseridas; as demais vieram do ON CONFLICT DO UPDATE.
+SQL_GRAVAR_USUARIOS = """
+WITH gravados AS (
+    INSERT INTO Usuario (CPF, Nome, Telefone)
+    SELECT CPF, Nome, Telefone FROM importacao_usuario WHERE Motivo IS NULL ORDER BY CPF
+    ON CONFLICT (CPF) DO UPDATE SET Nome = EXCLUDED.Nome, Telefone = EXCLUDED.Telefone
+    RETURNING (xmax = 0) AS inserido
+)
+SELECT COUNT(*) FILTER (WHERE inserido), COUNT(*) FILTER (WHERE NOT inserido) FROM gravados;
+"""
+
+# Campos opcionais em branco no arquivo não apagam o que já está cadastrado.
+SQL_GRAVAR_CIDADAOS = """
+INSERT INTO Cidadao (CPF, Cartao_Sus, Rua, Bairro, Numero, Cidade, Estado)
+SELECT CPF, Cartao_Sus, Rua, Bairro, Numero, Cidade, Estado
+FROM importacao_usuario WHERE Motivo IS NULL AND Tipo = 'cidadao' ORDER BY CPF
+ON CONFLICT (CPF) DO UPDATE SET
+    Cartao_Sus = COALESCE(EXCLUDED.Cartao_Sus, Cidadao.Cartao_Sus),
+    Rua = COALESCE(EXCLUDED.Rua, Cidadao.Rua),
+    Bairro = COALESCE(EXCLUDED.Bairro, Cidadao.Bairro),
+    Numero = COALESCE(EXCLUDED.Numero, Cidadao.Numero),
+    Cidade = COALESCE(EXCLUDED.Cidade, Cidadao.Cidade),
+    Estado = COALESCE(EXCLUDED.Estado, Cidadao.Estado);
+"""
+
+SQL_GRAVAR_ADMINISTRADORES = """
+INSERT INTO Administrador (CPF, Local_Trabalho)
+SELECT CPF, Local_Trabalho FROM importacao_usuario WHERE Motivo IS NULL AND Tipo = 'administrador' ORDER BY CPF
+ON CONFLICT (CPF) DO UPDATE SET Local_Trabalho = EXCLUDED.Local_Trabalho;
+"""
+
+SQL_GRAVAR_AGENTES = """
+INSERT INTO Agente_saude (CPF, Email, Posto_Trabalho)
+SELECT CPF, Email, Posto_Trabalho FROM importacao_usuario WHERE Motivo IS NULL AND Tipo = 'agente' ORDER BY CPF
+ON CONFLICT (CPF) DO UPDATE SET Email = EXCLUDED.Email, Posto_Trabalho = EXCLUDED.Posto_Trabalho;
+"""
+
+SQL_USUARIOS_RECUSADOS = """
+SELECT Linha, CPF, Nome, Telefone, Tipo, Cartao_Sus, Rua, Bairro, Numero, Cidade, Estado,
+       Local_Trabalho, Email, Posto_Trabalho, Motivo
+FROM importacao_usuario WHERE Motivo IS NOT NULL ORDER BY Linha;
+"""
+
+# --- Normalização das linhas
+# Valores que não cabem na staging (texto longo demais, inteiro fora do INT) são recusados
+# aqui, pois fariam o COPY inteiro falhar.
+INT_MAXIMO = 2**31 - 1
+
+def _converter_data(texto):
+    texto = texto.strip()
+    if re.fullmatch(r'\d{2}/\d{2}/\d{4}', texto):
+        return datetime.strptime(texto, '%d/%m/%Y').date()
+    return date.fromisoformat(texto)
+
+def _texto(valor, limite, obrigatorio=False):
+    valor = (valor or '').strip()
+    if len(valor) > limite or (obrigatorio and not valor):
+        raise ValueError(valor)
+    return valor or None
+
+def _inteiro(valor, obrigatorio=True):
+    valor = (valor or '').strip()
+    if not valor and not obrigatorio:
+        return None
+    numero = int(valor)
+    if not -INT_MAXIMO - 1 <= numero <= INT_MAXIMO:
+        raise ValueError(valor)
+    return numero
+
+def _cpf(valor):
+    return _texto(re.sub(r'\D', '', valor or ''), 20, obrigatorio=True)
+
+def _normalizar_linha(campos):
+    """Converte uma linha do CSV para os tipos da staging; ValueError se algum campo for inválido."""
+    return (_cpf(campos['cpf']), _inteiro(campos['id_vacina']), _inteiro(campos['id_local']),
+            _inteiro(campos['id_campanha']), _inteiro(campos['contagem']),
+            _converter_data(campos['data_aplicacao'] or ''))
+
+def _normalizar_usuario(campos):
+    """Converte uma linha de usuário para os tipos da staging; ValueError se algum campo for inválido."""
+    tipo = TIPOS_USUARIO[(campos.get('tipo') or '').strip().lower()]
+    return (_cpf(campos['cpf']), _texto(campos['nome'], 100, True), _texto(campos['telefone'], 100, True), tipo,
+            _texto(campos.get('cartao_sus'), 100), _texto(campos.get('rua'), 100),
+            _texto(campos.get('bairro'), 100), _inteiro(campos.get('numero'), obrigatorio=False),
+            _texto(campos.get('cidade'), 100), _texto(campos.get('estado'), 50),
+            _texto(campos.get('local_trabalho'), 100, tipo == 'administrador'),
+            _texto(campos.get('email'), 100, tipo == 'agente'),
+            _texto(campos.get('posto_trabalho'), 100, tipo == 'agente'))
+
+def _preparar_copy(arquivo, colunas_arquivo, normalizar, motivo_formato, obrigatorias=None):
+    """
+    Lê o CSV de entrada e grava, em um arquivo temporário, as linhas já normalizadas no
+    formato do COPY. Aceita ',' ou ';' como separador e datas AAAA-MM-DD ou DD/MM/AAAA.
+    Args:
+        arquivo: Arquivo texto aberto com o CSV (cabeçalho na primeira linha).
+        colunas_arquivo (tuple): Colunas reconhecidas, na ordem do relatório de erros.
+        normalizar (callable): Recebe o dict da linha e devolve a tupla da staging.
+        motivo_formato (str): Mensagem das linhas recusadas por formato.
+        obrigatorias (tuple, optional): Colunas que o cabeçalho precisa ter. Defaults to colunas_arquivo.
+    Returns:
+        tuple: (arquivo temporário posicionado no início, total de linhas lidas,
+                lista de linhas recusadas por formato).
+    """
+    cabecalho = arquivo.readline()
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    colunas = [c.strip().lower() for c in next(csv.reader([cabecalho], delimiter=separador))]
+    faltando = [c for c in (obrigatorias or colunas_arquivo) if c not in colunas]
+    if faltando:
+        raise ValueError(f"Colunas ausentes no arquivo: {', '.join(faltando)}")
+
+    saida = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024, mode='w+', newline='')
+    escritor = csv.writer(saida)
+    recusadas, lidas = [], 0
+    for numero, valores in enumerate(csv.reader(arquivo, delimiter=separador), start=2):
+        if not any(v.strip() for v in valores):
+            continue
+        lidas += 1
+        campos = dict(zip(colunas, valores))
+        try:
+            escritor.writerow((numero,) + normalizar(campos))
+        except (ValueError, TypeError, KeyError):
+            recusadas.append({'linha': numero, **{c: campos.get(c) for c in colunas_arquivo},
+                              'motivo': motivo_formato})
+    saida.seek(0)
+    return saida, lidas, recusadas
+
+def importar_vacinacoes(arquivo):
+    """
+    Importa vacinações de um CSV com as colunas de COLUNAS_IMPORTACAO (cabeçalho obrigatório,
+    em qualquer ordem). As linhas válidas são gravadas e o estoque baixado em uma única
+    transação; as demais vão para o relatório de erros.
+    Args:
+        arquivo: Arquivo texto aberto (ou caminho) com o CSV.
+    Returns:
+        dict: 'lidas', 'importadas' e 'recusadas' (contagens) e 'erros' (pd.DataFrame com
+              linha, campos e motivo de cada linha recusada).
+    """
+    if isinstance(arquivo, str):
+        with open(arquivo, encoding='utf-8-sig', newline='') as f:
+            return importar_vacinacoes(f)
+
+    dados, lidas, recusadas = _preparar_copy(arquivo, COLUNAS_IMPORTACAO, _normalizar_linha,
+                                             MOTIVOS_IMPORTACAO['formato_invalido'])
+    with dados, conexao() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_CRIAR_STAGING)
+        cur.copy_expert(
+            "COPY importacao_vacinacao (Linha, CPF, Id_Vacina, Id_Local, Id_Campanha, Contagem, Data_aplicacao) "
+            "FROM STDIN WITH (FORMAT csv)", dados)
+        cur.execute("ANALYZE importacao_vacinacao")
+        cur.execute(SQL_VALIDAR_REFERENCIAS)
+        cur.execute(SQL_TRAVAR_FATIAS)
+        cur.execute(SQL_VALIDAR_ESTOQUE)
+        cur.execute(SQL_BAIXAR_ESTOQUE)
+        cur.execute(SQL_GRAVAR_VACINACOES)
+        importadas = cur.rowcount
+        cur.execute(SQL_LINHAS_RECUSADAS)
+        for linha, *valores, motivo in cur.fetchall():
+            recusadas.append({'linha': linha, **dict(zip(COLUNAS_IMPORTACAO, valores)),
+                              'motivo': MOTIVOS_IMPORTACAO[motivo]})
+        cur.close()
+    if importadas:
+        invalidar_cache('vacinacao', 'estoque_fatia', 'movimento_estoque')
+
+    erros = pd.DataFrame(recusadas, columns=['linha', *COLUNAS_IMPORTACAO, 'motivo'])
+    return {'lidas': lidas, 'importadas': importadas, 'recusadas': len(erros),
+            'erros': erros.sort_values('linha', ignore_index=True)}
+
+def importar_usuarios(arquivo):
+    """
+    Importa usuários de um CSV com as colunas de COLUNAS_IMPORTACAO_USUARIOS (cabeçalho
+    obrigatório, em qualquer ordem; só cpf, nome e telefone precisam existir). CPFs já
+    cadastrados são atualizados, os demais inseridos, tudo em uma única transação.
+    Args:
+        arquivo: Arquivo texto aberto (ou caminho) com o CSV.
+    Returns:
+        dict: 'lidas', 'inseridas', 'atualizadas' e 'recusadas' (contagens) e 'erros'
+              (pd.DataFrame com linha, campos e motivo de cada linha recusada).
+    """
+    if isinstance(arquivo, str):
+        with open(arquivo, encoding='utf-8-sig', newline='') as f:
+            return importar_usuarios(f)
+
+    dados, lidas, recusadas = _preparar_copy(arquivo, COLUNAS_IMPORTACAO_USUARIOS, _normalizar_usuario,
+                                             MOTIVOS_IMPORTACAO_USUARIOS['formato_invalido'],
+                                             obrigatorias=COLUNAS_OBRIGATORIAS_USUARIOS)
+    with dados, conexao() as conn:
+        cur = conn.cursor()
+        cur.execute(SQL_CRIAR_STAGING_USUARIOS)
+        cur.copy_expert(
+            "COPY importacao_usuario (Linha, CPF, Nome, Telefone, Tipo, Cartao_Sus, Rua, Bairro, Numero, "
+            "Cidade, Estado, Local_Trabalho, Email, Posto_Trabalho) FROM STDIN WITH (FORMAT csv)", dados)
+        cur.execute("ANALYZE importacao_usuario")
+        cur.execute(SQL_DEDUPLICAR_USUARIOS)
+        cur.execute(SQL_GRAVAR_USUARIOS)
+        inseridas, atualizadas = cur.fetchone()
+        cur.execute(SQL_GRAVAR_CIDADAOS)
+        cur.execute(SQL_GRAVAR_ADMINISTRADORES)
+        cur.execute(SQL_GRAVAR_AGENTES)
+        cur.execute(SQL_USUARIOS_RECUSADOS)
+        for linha, *valores, motivo in cur.fetchall():
+            recusadas.append({'linha': linha, **dict(zip(COLUNAS_IMPORTACAO_USUARIOS, valores)),
+                              'motivo': MOTIVOS_IMPORTACAO_USUARIOS[motivo]})
+        cur.close()
+    if inseridas or atualizadas:
+        invalidar_cache('usuario', 'cidadao', 'administrador', 'agente_saude')
+
+    erros = pd.DataFrame(recusadas, columns=['linha', *COLUNAS_IMPORTACAO_USUARIOS, 'motivo'])
+    return {'lidas': lidas, 'inseridas': inseridas, 'atualizadas': atualizadas, 'recusadas': len(erros),
+            'erros': erros.sort_values('linha', ignore_index=True)}
+
+def relatorio_erros_csv(erros):
+    """Gera o relatório de linhas recusadas em CSV (separado por ';'), pronto para download."""
+    buffer = io.StringIO()
+    erros.to_csv(buffer, sep=';', index=False)
+    buffer.seek(0)
+    return buffer
+
+# Uso: python importacao.py [--usuarios] arquivo.csv [relatorio_erros.csv]
+if __name__ == '__main__':
+    usuarios = '--usuarios' in sys.argv
+    argumentos = [a for a in sys.argv[1:] if a != '--usuarios']
+    if not argumentos:
+        print("Uso: python importacao.py [--usuarios] <arquivo.csv> [relatorio_erros.csv]")
+        sys.exit(2)
+    if usuarios:
+        resultado = importar_usuarios(argumentos[0])
+        print(f"Linhas lidas: {resultado['lidas']} | inseridas: {resultado['inseridas']} | "
+              f"atualizadas: {resultado['atualizadas']} | recusadas: {resultado['recusadas']}")
+    else:
+        resultado = importar_vacinacoes(argumentos[0])
+        print(f"Linhas lidas: {resultado['lidas']} | importadas: {resultado['importadas']} | recusadas: {resultado['recusadas']}")
+    if resultado['recusadas']:
+        destino = argumentos[1] if len(argumentos) > 1 else 'relatorio_erros.csv'
+        with open(destino, 'w', encoding='utf-8', newline='') as f:
+            f.write(relatorio_erros_csv(resultado['erros']).getvalue())
+        print(f"Relatório de erros gravado em {destino}")
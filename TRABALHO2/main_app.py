@@ -1,29 +1,88 @@
+import os
+import asyncio
+import importlib
 import panel as pn
-
-from pages.campanhas import campanhas_page_layout
-from pages.agendamentos import agendamento_page_layout
-from pages.vacinas import vacinas_page_layout
-from pages.usuarios import usuarios_page_layout
-from pages.vacinacoes import vacinacoes_page_layout
-from pages.parentescos import parentescos_page_layout
-from pages.locais import locais_page_layout
+from dotenv import load_dotenv
+from db_config import consolidar_estoque
+from notificacoes import iniciar_escuta
 
 
 pn.extension('tabulator', notifications=True)
 
+load_dotenv()
+# Com abas sob demanda, cada página só é importada e consultada quando sua aba é aberta
+ABAS_SOB_DEMANDA = os.getenv('ABAS_SOB_DEMANDA', '1') == '1'
+# Intervalo (segundos) da consolidação das fatias de estoque em Vacina.Qtd_Doses
+ESTOQUE_CONSOLIDACAO = int(os.getenv('ESTOQUE_CONSOLIDACAO', 60))
+# Os links de exportação (CSV/Parquet) usam a rota registrada por exportacao.py e o estado
+# de cada processo fica em /saude (saude.py). Com vários processos, cada um abre suas
+# próprias conexões depois do fork (ver db_config.iniciar_banco); DB_PROCESSOS divide o limite
+# de conexões DB_POOL_MAX entre os processos:
+#   DB_PROCESSOS=4 panel serve main_app.py --plugins exportacao --plugins saude --num-procs 4
+
+# --- Páginas do sistema: (título da aba, módulo)
+PAGINAS = [
+    ('Campanhas', 'pages.campanhas'),
+    ('Agendamentos', 'pages.agendamentos'),
+    ('Vacinas', 'pages.vacinas'),
+    ('Usuários', 'pages.usuarios'),
+    ('Vacinações', 'pages.vacinacoes'),
+    ('Parentescos', 'pages.parentescos'),
+    ('Locais', 'pages.locais'),
+]
+
+def montar_pagina(modulo):
+    return importlib.import_module(modulo).montar_pagina()
+
+def placeholder_carregando(titulo):
+    return pn.Column(
+        pn.indicators.LoadingSpinner(value=True, size=50, align='center'),
+        pn.pane.Markdown(f"Carregando **{titulo}**...", align='center'),
+        sizing_mode='stretch_width'
+    )
+
 # --- Montagem do Layout da Interface com Abas
-app_tabs = pn.Tabs(
-    ('Campanhas', campanhas_page_layout),
-    ('Agendamentos', agendamento_page_layout),
-    ('Vacinas', vacinas_page_layout),
-    ('Usuários', usuarios_page_layout),
-    ('Vacinações', vacinacoes_page_layout),
-    ('Parentescos', parentescos_page_layout),
-    ('Locais', locais_page_layout),
-    active=0,
-    sizing_mode='stretch_both'
-)
+if ABAS_SOB_DEMANDA:
+    app_tabs = pn.Tabs(
+        *[(titulo, placeholder_carregando(titulo)) for titulo, _ in PAGINAS],
+        active=0,
+        sizing_mode='stretch_both'
+    )
+    abas_montadas = set()
+
+    def montar_aba(indice):
+        if indice in abas_montadas:
+            return
+        abas_montadas.add(indice)
+        titulo, modulo = PAGINAS[indice]
+        try:
+            app_tabs[indice] = (titulo, montar_pagina(modulo))
+        except Exception as e:
+            abas_montadas.discard(indice)
+            pn.state.notifications.error(f"Erro ao carregar a aba {titulo}: {e}")
+
+    def on_aba_ativa(event):
+        # Agenda a montagem para o próximo ciclo, para o placeholder aparecer antes das consultas
+        pn.state.execute(lambda: montar_aba(event.new), schedule=True)
+
+    app_tabs.param.watch(on_aba_ativa, 'active')
+    pn.state.onload(lambda: montar_aba(app_tabs.active))
+else:
+    app_tabs = pn.Tabs(
+        *[(titulo, montar_pagina(modulo)) for titulo, modulo in PAGINAS],
+        active=0,
+        sizing_mode='stretch_both'
+    )
+
+async def consolidar_estoque_em_segundo_plano():
+    # A consolidação é síncrona: roda numa thread para não travar as sessões do processo
+    await asyncio.to_thread(consolidar_estoque)
 
+# Tarefa única por processo (o nome evita duplicá-la a cada sessão aberta)
+pn.state.schedule_task('consolidar_estoque', consolidar_estoque_em_segundo_plano, period=f'{ESTOQUE_CONSOLIDACAO}s')
+# Ouvinte das alterações (LISTEN/NOTIFY), também único por processo; mantém o cache em dia
+# com escritas de outros processos mesmo antes de alguma aba assinar as notificações
+iniciar_escuta()
 
 template = pn.template.FastListTemplate(
     title="Sistema de Gerenciamento de Saúde Pública",
@@ -0,0 +1,130 @@
+import os
+import re
+import sys
+import json
+
+# --- Migrações versionadas aplicadas sobre o script-vacinacao.sql
+# Cada arquivo migracoes/NNNN_nome.sql é aplicado uma única vez, em ordem de versão, e
+# registrado em Migracao_Aplicada. Um advisory lock garante que vários processos
+# iniciando ao mesmo tempo não apliquem a mesma migração duas vezes.
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migracoes')
+CHAVE_LOCK_MIGRACOES = 7302025
+
+_RE_ARQUIVO = re.compile(r'^(\d+)_(\w+)\.sql$')
+_RE_VERIFICACAO = re.compile(r'^--\s*verificar\s+(\w+):\s*(.+)$', re.MULTILINE)
+
+SQL_CRIAR_CONTROLE = """
+CREATE TABLE IF NOT EXISTS Migracao_Aplicada (
+    Versao INTEGER NOT NULL,
+    Nome VARCHAR(200) NOT NULL,
+    Aplicada_Em TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (Versao)
+);
+"""
+
+def listar_migracoes(pasta=PASTA_MIGRACOES):
+    """
+    Lista os arquivos de migração da pasta em ordem de versão.
+    Returns:
+        list: Tuplas (versao, nome, caminho).
+    """
+    migracoes = []
+    for arquivo in os.listdir(pasta):
+        encontrado = _RE_ARQUIVO.match(arquivo)
+        if encontrado:
+            migracoes.append((int(encontrado.group(1)), encontrado.group(2), os.path.join(pasta, arquivo)))
+    return sorted(migracoes)
+
+def _ler(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return f.read()
+
+def aplicar_migracoes(engine, pasta=PASTA_MIGRACOES):
+    """
+    Aplica as migrações ainda não registradas, cada uma em sua própria transação.
+    Args:
+        engine (sqlalchemy.Engine): Engine do banco (db_config.engine).
+        pasta (str, optional): Pasta com os arquivos .sql. Defaults to PASTA_MIGRACOES.
+    Returns:
+        list: Versões aplicadas nesta chamada (vazia se o banco já estava em dia).
+    """
+    aplicadas_agora = []
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (CHAVE_LOCK_MIGRACOES,))
+        try:
+            cur.execute(SQL_CRIAR_CONTROLE)
+            cur.execute("SELECT Versao FROM Migracao_Aplicada")
+            aplicadas = {linha[0] for linha in cur.fetchall()}
+            conn.commit()
+            for versao, nome, caminho in listar_migracoes(pasta):
+                if versao in aplicadas:
+                    continue
+                try:
+                    cur.execute(_ler(caminho))
+                    cur.execute("INSERT INTO Migracao_Aplicada (Versao, Nome) VALUES (%s, %s)", (versao, nome))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                aplicadas_agora.append(versao)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (CHAVE_LOCK_MIGRACOES,))
+            conn.commit()
+            cur.close()
+    finally:
+        conn.close()
+    return aplicadas_agora
+
+def _indices_no_plano(no):
+    indices = set()
+    if isinstance(no, dict):
+        if 'Index Name' in no:
+            indices.add(no['Index Name'].lower())
+        for valor in no.values():
+            indices |= _indices_no_plano(valor)
+    elif isinstance(no, list):
+        for item in no:
+            indices |= _indices_no_plano(item)
+    return indices
+
+def verificar_migracoes(engine, pasta=PASTA_MIGRACOES):
+    """
+    Confere, para cada linha "-- verificar <índice>: <consulta>" das migrações, se o
+    plano da consulta usa o índice. O EXPLAIN roda com enable_seqscan desligado, pois
+    com as poucas linhas do banco de exemplo o planejador preferiria a varredura.
+    Returns:
+        list: Tuplas (versao, indice, usado, indices_no_plano).
+    """
+    resultados = []
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        for versao, _, caminho in listar_migracoes(pasta):
+            for indice, consulta in _RE_VERIFICACAO.findall(_ler(caminho)):
+                cur.execute("SET LOCAL enable_seqscan = off")
+                cur.execute(f"EXPLAIN (FORMAT JSON) {consulta}")
+                plano = cur.fetchone()[0]
+                if isinstance(plano, str):
+                    plano = json.loads(plano)
+                indices = _indices_no_plano(plano)
+                resultados.append((versao, indice, indice.lower() in indices, sorted(indices)))
+                conn.rollback()
+        cur.close()
+    finally:
+        conn.close()
+    return resultados
+
+# Uso: python migracoes.py [--verificar]
+if __name__ == '__main__':
+    from db_config import engine
+    if engine is None:
+        sys.exit(1)
+    if '--verificar' not in sys.argv:
+        print(f"Migrações aplicadas: {aplicar_migracoes(engine) or 'nenhuma (banco em dia)'}")
+    falhas = 0
+    for versao, indice, usado, indices in verificar_migracoes(engine):
+        print(f"[{'OK' if usado else 'FALHA'}] {versao:04d} {indice}" + ("" if usado else f" (plano usa: {indices or 'nenhum índice'})"))
+        falhas += not usado
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,86 @@
+-- Estoque fracionado, livro de movimentos e vagas por local e dia.
+-- O script-vacinacao.sql atual já cria esses objetos; bancos criados antes deles só os
+-- recebem por aqui. Roda antes de 0001, cujos índices dependem de Movimento_Estoque e
+-- Vaga_Local, e é idempotente: num banco novo apenas confirma o que o script criou.
+CREATE TABLE IF NOT EXISTS Vaga_Local (
+    Id_Local INTEGER NOT NULL,
+    Data_Agendamento DATE NOT NULL,
+    Ocupadas INT NOT NULL DEFAULT 0 CHECK (Ocupadas >= 0),
+    PRIMARY KEY (Id_Local, Data_Agendamento),
+    FOREIGN KEY (Id_Local) REFERENCES Local(Id_Local) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Estoque_Fatia (
+    Id_Vacina INTEGER NOT NULL,
+    Fatia SMALLINT NOT NULL,
+    Doses INT NOT NULL CHECK (Doses >= 0),
+    PRIMARY KEY (Id_Vacina, Fatia),
+    FOREIGN KEY (Id_Vacina) REFERENCES Vacina(Id_Vacina) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Movimento_Estoque (
+    Id_Movimento BIGSERIAL NOT NULL,
+    Id_Vacina INTEGER NOT NULL,
+    Quantidade INT NOT NULL,
+    Motivo VARCHAR(30) NOT NULL,
+    Id_Vacinacao INTEGER,
+    Data_Movimento TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (Id_Movimento),
+    FOREIGN KEY (Id_Vacina) REFERENCES Vacina(Id_Vacina) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE VIEW Vacina_Estoque AS
+SELECT v.Id_Vacina, v.Nome, v.Doenca_alvo, v.Codigo_Lote, v.Data_Chegada, v.Data_Validade,
+       COALESCE((SELECT SUM(f.Doses) FROM Estoque_Fatia f WHERE f.Id_Vacina = v.Id_Vacina), 0)::INT AS Qtd_Doses
+FROM Vacina v;
+
+CREATE OR REPLACE FUNCTION distribuir_estoque(p_id_vacina INTEGER, p_total INTEGER) RETURNS VOID AS $$
+    INSERT INTO Estoque_Fatia (Id_Vacina, Fatia, Doses)
+    SELECT p_id_vacina, f, p_total / 8 + CASE WHEN f < p_total % 8 THEN 1 ELSE 0 END
+    FROM generate_series(0, 7) AS f
+    ON CONFLICT (Id_Vacina, Fatia) DO UPDATE SET Doses = EXCLUDED.Doses;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION sincronizar_estoque_vacina() RETURNS TRIGGER AS $$
+DECLARE
+    saldo_atual INTEGER;
+BEGIN
+    IF current_setting('estoque.consolidando', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    -- Trava as fatias antes de somar: uma aplicação concorrente não baixa uma fatia entre a
+    -- soma e a redistribuição, o que faria o ajuste apagar a baixa.
+    PERFORM 1 FROM Estoque_Fatia WHERE Id_Vacina = NEW.Id_Vacina ORDER BY Fatia FOR UPDATE;
+    SELECT COALESCE(SUM(Doses), 0) INTO saldo_atual FROM Estoque_Fatia WHERE Id_Vacina = NEW.Id_Vacina;
+    IF TG_OP = 'UPDATE' AND NEW.Qtd_Doses = saldo_atual THEN
+        RETURN NEW;
+    END IF;
+    PERFORM distribuir_estoque(NEW.Id_Vacina, NEW.Qtd_Doses);
+    INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo)
+    VALUES (NEW.Id_Vacina, NEW.Qtd_Doses - saldo_atual, CASE WHEN TG_OP = 'INSERT' THEN 'entrada' ELSE 'ajuste' END);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_estoque_vacina ON Vacina;
+CREATE TRIGGER trg_estoque_vacina
+AFTER INSERT OR UPDATE OF Qtd_Doses ON Vacina
+FOR EACH ROW EXECUTE FUNCTION sincronizar_estoque_vacina();
+
+-- Lotes ainda sem fatias partem do Qtd_Doses gravado, com a entrada correspondente no livro.
+INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo)
+SELECT v.Id_Vacina, v.Qtd_Doses, 'entrada'
+FROM Vacina v
+WHERE NOT EXISTS (SELECT 1 FROM Estoque_Fatia f WHERE f.Id_Vacina = v.Id_Vacina);
+
+SELECT distribuir_estoque(v.Id_Vacina, v.Qtd_Doses)
+FROM Vacina v
+WHERE NOT EXISTS (SELECT 1 FROM Estoque_Fatia f WHERE f.Id_Vacina = v.Id_Vacina);
+
+-- Vagas ocupadas a partir dos agendamentos existentes; contadores já mantidos pela
+-- aplicação não são tocados.
+INSERT INTO Vaga_Local (Id_Local, Data_Agendamento, Ocupadas)
+SELECT Id_Local, Data_Agendamento, COUNT(*)
+FROM Agendamento
+GROUP BY Id_Local, Data_Agendamento
+ON CONFLICT (Id_Local, Data_Agendamento) DO NOTHING;
@@ -0,0 +1,46 @@
+-- Índices para as consultas do db_config e das páginas.
+-- Cada linha "-- verificar <índice>: <consulta>" é conferida por migracoes.py --verificar,
+-- que roda EXPLAIN da consulta com enable_seqscan desligado e exige o índice no plano.
+
+-- Vacinacao: paginação da aba Vacinações (ORDER BY Data_aplicacao DESC, Id_Vacinacao DESC),
+-- filtro por período e verificações antes de excluir cidadão, vacina, local ou campanha.
+CREATE INDEX IF NOT EXISTS idx_vacinacao_data ON Vacinacao (Data_aplicacao, Id_Vacinacao);
+CREATE INDEX IF NOT EXISTS idx_vacinacao_cpf ON Vacinacao (CPF);
+CREATE INDEX IF NOT EXISTS idx_vacinacao_vacina ON Vacinacao (Id_Vacina);
+CREATE INDEX IF NOT EXISTS idx_vacinacao_local ON Vacinacao (Id_Local);
+CREATE INDEX IF NOT EXISTS idx_vacinacao_campanha ON Vacinacao (Id_Campanha);
+-- verificar idx_vacinacao_data: SELECT Id_Vacinacao FROM Vacinacao WHERE Data_aplicacao >= DATE '2025-03-01' ORDER BY Data_aplicacao DESC, Id_Vacinacao DESC LIMIT 11
+-- verificar idx_vacinacao_cpf: SELECT 1 FROM Vacinacao WHERE CPF = '11111111111'
+-- verificar idx_vacinacao_vacina: SELECT 1 FROM Vacinacao WHERE Id_Vacina = 1
+-- verificar idx_vacinacao_local: SELECT 1 FROM Vacinacao WHERE Id_Local = 1
+-- verificar idx_vacinacao_campanha: SELECT 1 FROM Vacinacao WHERE Id_Campanha = 1
+
+-- Agendamento: paginação da aba Agendamentos, agendamento duplicado (validar_agendamento)
+-- e agendamentos por local e dia.
+CREATE INDEX IF NOT EXISTS idx_agendamento_data ON Agendamento (Data_Agendamento, Id_Agendamento);
+CREATE INDEX IF NOT EXISTS idx_agendamento_cpf_vacina_data ON Agendamento (CPF, Id_Vacina, Data_Agendamento);
+CREATE INDEX IF NOT EXISTS idx_agendamento_local_data ON Agendamento (Id_Local, Data_Agendamento);
+-- verificar idx_agendamento_data: SELECT Id_Agendamento FROM Agendamento ORDER BY Data_Agendamento DESC, Id_Agendamento DESC LIMIT 11
+-- verificar idx_agendamento_cpf_vacina_data: SELECT 1 FROM Agendamento WHERE CPF = '11111111111' AND Id_Vacina = 1 AND Data_Agendamento = DATE '2025-03-01'
+-- verificar idx_agendamento_local_data: SELECT 1 FROM Agendamento WHERE Id_Local = 1 AND Data_Agendamento = DATE '2025-03-01'
+
+-- Parente: consultas e exclusões pelos dois lados do parentesco.
+CREATE INDEX IF NOT EXISTS idx_parente_responsavel ON Parente (CPF_Responsavel);
+CREATE INDEX IF NOT EXISTS idx_parente_parente ON Parente (CPF_Parente);
+-- verificar idx_parente_responsavel: SELECT 1 FROM Parente WHERE CPF_Responsavel = '11111111111'
+-- verificar idx_parente_parente: SELECT 1 FROM Parente WHERE CPF_Parente = '11111111111'
+
+-- Vacina: lotes dentro da validade (get_vacinas).
+CREATE INDEX IF NOT EXISTS idx_vacina_validade ON Vacina (Data_Validade);
+-- verificar idx_vacina_validade: SELECT Id_Vacina FROM Vacina WHERE Data_Validade >= CURRENT_DATE
+
+-- Campanha: campanhas ativas (get_campanhas_ativas) e campanha mais recente da doença
+-- (LATERAL de SQL_AGENDAMENTOS).
+CREATE INDEX IF NOT EXISTS idx_campanha_periodo ON Campanha (Data_inicio, Data_fim);
+CREATE INDEX IF NOT EXISTS idx_campanha_doenca_inicio ON Campanha (Doenca_alvo, Data_inicio DESC);
+-- verificar idx_campanha_periodo: SELECT Id_Campanha FROM Campanha WHERE (Data_fim IS NULL OR Data_fim >= CURRENT_DATE) AND Data_inicio <= CURRENT_DATE
+-- verificar idx_campanha_doenca_inicio: SELECT Id_Campanha FROM Campanha WHERE Doenca_alvo = 'Gripe' ORDER BY Data_inicio DESC LIMIT 1
+
+-- Movimento_Estoque: movimentos de um lote.
+CREATE INDEX IF NOT EXISTS idx_movimento_vacina ON Movimento_Estoque (Id_Vacina, Data_Movimento);
+-- verificar idx_movimento_vacina: SELECT Quantidade FROM Movimento_Estoque WHERE Id_Vacina = 1 ORDER BY Data_Movimento
@@ -0,0 +1,83 @@
+-- Notificações de alterações para as sessões abertas (notificacoes.py).
+-- Cada linha inserida, alterada ou excluída emite NOTIFY no canal 'alteracoes' com a tabela,
+-- a operação e a chave da linha (coluna passada como argumento do gatilho). O Postgres só
+-- entrega as notificações no COMMIT e descarta as repetidas dentro da mesma transação.
+-- Se a chave muda num UPDATE, a notificação sai como DELETE da antiga e INSERT da nova.
+CREATE OR REPLACE FUNCTION notificar_alteracao() RETURNS TRIGGER AS $$
+DECLARE
+    chave_antiga JSONB;
+    chave_nova JSONB;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        chave_antiga := to_jsonb(OLD) -> TG_ARGV[0];
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        chave_nova := to_jsonb(NEW) -> TG_ARGV[0];
+    END IF;
+    IF TG_OP = 'UPDATE' AND chave_antiga IS DISTINCT FROM chave_nova THEN
+        PERFORM pg_notify('alteracoes', json_build_object('tabela', TG_TABLE_NAME, 'operacao', 'DELETE', 'chave', chave_antiga)::text);
+        PERFORM pg_notify('alteracoes', json_build_object('tabela', TG_TABLE_NAME, 'operacao', 'INSERT', 'chave', chave_nova)::text);
+    ELSE
+        PERFORM pg_notify('alteracoes', json_build_object('tabela', TG_TABLE_NAME, 'operacao', TG_OP,
+                                                          'chave', COALESCE(chave_nova, chave_antiga))::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notificar_campanha ON Campanha;
+CREATE TRIGGER trg_notificar_campanha
+AFTER INSERT OR UPDATE OR DELETE ON Campanha
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_campanha');
+
+DROP TRIGGER IF EXISTS trg_notificar_vacina ON Vacina;
+CREATE TRIGGER trg_notificar_vacina
+AFTER INSERT OR UPDATE OR DELETE ON Vacina
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_vacina');
+
+-- Saldo exibido das vacinas (view Vacina_Estoque); notificado como alteração da vacina.
+DROP TRIGGER IF EXISTS trg_notificar_estoque_fatia ON Estoque_Fatia;
+CREATE TRIGGER trg_notificar_estoque_fatia
+AFTER INSERT OR UPDATE OR DELETE ON Estoque_Fatia
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_vacina');
+
+DROP TRIGGER IF EXISTS trg_notificar_local ON Local;
+CREATE TRIGGER trg_notificar_local
+AFTER INSERT OR UPDATE OR DELETE ON Local
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_local');
+
+DROP TRIGGER IF EXISTS trg_notificar_usuario ON Usuario;
+CREATE TRIGGER trg_notificar_usuario
+AFTER INSERT OR UPDATE OR DELETE ON Usuario
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('cpf');
+
+-- Subtipos de usuário: notificados como alteração do usuário.
+DROP TRIGGER IF EXISTS trg_notificar_cidadao ON Cidadao;
+CREATE TRIGGER trg_notificar_cidadao
+AFTER INSERT OR UPDATE OR DELETE ON Cidadao
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('cpf');
+
+DROP TRIGGER IF EXISTS trg_notificar_administrador ON Administrador;
+CREATE TRIGGER trg_notificar_administrador
+AFTER INSERT OR UPDATE OR DELETE ON Administrador
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('cpf');
+
+DROP TRIGGER IF EXISTS trg_notificar_agente_saude ON Agente_saude;
+CREATE TRIGGER trg_notificar_agente_saude
+AFTER INSERT OR UPDATE OR DELETE ON Agente_saude
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('cpf');
+
+DROP TRIGGER IF EXISTS trg_notificar_vacinacao ON Vacinacao;
+CREATE TRIGGER trg_notificar_vacinacao
+AFTER INSERT OR UPDATE OR DELETE ON Vacinacao
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_vacinacao');
+
+DROP TRIGGER IF EXISTS trg_notificar_agendamento ON Agendamento;
+CREATE TRIGGER trg_notificar_agendamento
+AFTER INSERT OR UPDATE OR DELETE ON Agendamento
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_agendamento');
+
+DROP TRIGGER IF EXISTS trg_notificar_parente ON Parente;
+CREATE TRIGGER trg_notificar_parente
+AFTER INSERT OR UPDATE OR DELETE ON Parente
+FOR EACH ROW EXECUTE FUNCTION notificar_alteracao('id_parentesco');
@@ -0,0 +1,35 @@
+-- Busca por nome com trigramas (pg_trgm).
+-- Índices GiST de trigramas atendem tanto os filtros ILIKE '%termo%' das páginas quanto a
+-- ordenação por semelhança (coluna <-> termo) das sugestões de db_config.buscar_nomes_async,
+-- que lê do índice só as primeiras linhas em vez de varrer a tabela.
+-- O pg_trgm faz parte do pacote contrib do Postgres. Sem ele, a migração não cria os índices
+-- (as buscas continuam funcionando, por varredura) e pode ser reaplicada depois de instalado
+-- com: DELETE FROM Migracao_Aplicada WHERE Versao = 3;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        RAISE WARNING 'Extensão pg_trgm indisponível; índices de busca por nome não criados.';
+        RETURN;
+    END IF;
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+    -- Usuario: nome do cidadão nas abas Usuários, Vacinações, Agendamentos e Parentescos.
+    CREATE INDEX IF NOT EXISTS idx_usuario_nome_trgm ON Usuario USING GIST (Nome gist_trgm_ops);
+    -- Vacina: aba Vacinas e filtro por vacina da aba Vacinações.
+    CREATE INDEX IF NOT EXISTS idx_vacina_nome_trgm ON Vacina USING GIST (Nome gist_trgm_ops);
+    -- Local: filtros por nome, cidade e bairro.
+    CREATE INDEX IF NOT EXISTS idx_local_nome_trgm ON Local USING GIST (Nome gist_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_local_cidade_trgm ON Local USING GIST (Cidade gist_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_local_bairro_trgm ON Local USING GIST (Bairro gist_trgm_ops);
+    -- Campanha: filtros por nome e público alvo.
+    CREATE INDEX IF NOT EXISTS idx_campanha_nome_trgm ON Campanha USING GIST (Nome gist_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_campanha_publico_trgm ON Campanha USING GIST (Publico_alvo gist_trgm_ops);
+END
+$$;
+-- verificar idx_usuario_nome_trgm: SELECT CPF FROM Usuario WHERE Nome ILIKE '%silva%'
+-- verificar idx_vacina_nome_trgm: SELECT Id_Vacina FROM Vacina WHERE Nome ILIKE '%corona%'
+-- verificar idx_local_nome_trgm: SELECT Id_Local FROM Local WHERE Nome ILIKE '%ubs%'
+-- verificar idx_local_cidade_trgm: SELECT Id_Local FROM Local WHERE Cidade ILIKE '%quixad%'
+-- verificar idx_local_bairro_trgm: SELECT Id_Local FROM Local WHERE Bairro ILIKE '%centro%'
+-- verificar idx_campanha_nome_trgm: SELECT Id_Campanha FROM Campanha WHERE Nome ILIKE '%gripe%'
+-- verificar idx_campanha_publico_trgm: SELECT Id_Campanha FROM Campanha WHERE Publico_alvo ILIKE '%idosos%'
@@ -0,0 +1,5 @@
+-- Cidadao: busca por prefixo do CPF nos campos de cidadão das páginas (db_config.buscar_cidadaos_async).
+-- Com text_pattern_ops, LIKE 'prefixo%' e a ordenação ~<~ usam o índice em qualquer collation
+-- do banco, e a busca lê só os primeiros CPFs do intervalo.
+CREATE INDEX IF NOT EXISTS idx_cidadao_cpf_prefixo ON Cidadao (CPF text_pattern_ops);
+-- verificar idx_cidadao_cpf_prefixo: SELECT CPF FROM Cidadao WHERE CPF LIKE '123%' ORDER BY CPF USING ~<~ LIMIT 20
@@ -0,0 +1,97 @@
+-- Notificações por comando no lugar das notificações por linha da migração 0002.
+-- NOTIFY toma uma trava global da fila de notificações até o COMMIT, então um NOTIFY por
+-- linha serializava os commits de todas as sessões que escreviam nessas tabelas. Os
+-- gatilhos agora são por comando (FOR EACH STATEMENT) e leem as linhas afetadas das tabelas
+-- de transição: cada comando emite um único payload por tabela e operação, com a lista de
+-- chaves, dividida em lotes de até 400 chaves para caber no limite de 8000 bytes do NOTIFY.
+-- Num UPDATE, chaves que só existem na tabela antiga saem como DELETE e as que só existem na
+-- nova como INSERT.
+-- O saldo exibido das vacinas (view Vacina_Estoque) deixa de ser notificado pelas fatias: as
+-- baixas e devoluções de estoque acontecem junto com as escritas em Vacinacao, que notificam
+-- também o UPDATE das vacinas envolvidas; ajustes manuais notificam pela própria Vacina.
+DROP TRIGGER IF EXISTS trg_notificar_estoque_fatia ON Estoque_Fatia;
+
+-- Um pg_notify por lote de chaves; nada é emitido para uma lista vazia ou nula.
+CREATE OR REPLACE FUNCTION notificar_chaves(p_tabela TEXT, p_operacao TEXT, p_chaves JSONB) RETURNS VOID AS $$
+    SELECT pg_notify('alteracoes', json_build_object('tabela', p_tabela, 'operacao', p_operacao,
+                                                     'chaves', jsonb_agg(chave))::text)
+    FROM (SELECT chave, (row_number() OVER () - 1) / 400 AS lote
+          FROM jsonb_array_elements(p_chaves) AS chave) AS chaves
+    GROUP BY lote;
+$$ LANGUAGE sql;
+
+-- Argumentos do gatilho: coluna da chave e, opcionalmente, tabela e coluna de outra tabela
+-- exibida cujas linhas referenciadas também são notificadas como UPDATE.
+CREATE OR REPLACE FUNCTION notificar_alteracoes() RETURNS TRIGGER AS $$
+DECLARE
+    coluna TEXT := TG_ARGV[0];
+    antigas JSONB;
+    novas JSONB;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        SELECT jsonb_agg(DISTINCT to_jsonb(o) -> coluna) INTO antigas FROM linhas_antigas o;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        SELECT jsonb_agg(DISTINCT to_jsonb(n) -> coluna) INTO novas FROM linhas_novas n;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM notificar_chaves(TG_TABLE_NAME, 'UPDATE',
+            (SELECT jsonb_agg(c) FROM (SELECT jsonb_array_elements(novas) INTERSECT SELECT jsonb_array_elements(antigas)) AS t(c)));
+        PERFORM notificar_chaves(TG_TABLE_NAME, 'DELETE',
+            (SELECT jsonb_agg(c) FROM (SELECT jsonb_array_elements(antigas) EXCEPT SELECT jsonb_array_elements(novas)) AS t(c)));
+        PERFORM notificar_chaves(TG_TABLE_NAME, 'INSERT',
+            (SELECT jsonb_agg(c) FROM (SELECT jsonb_array_elements(novas) EXCEPT SELECT jsonb_array_elements(antigas)) AS t(c)));
+    ELSE
+        PERFORM notificar_chaves(TG_TABLE_NAME, TG_OP, COALESCE(novas, antigas));
+    END IF;
+
+    IF TG_NARGS > 1 THEN
+        IF TG_OP <> 'INSERT' THEN
+            SELECT jsonb_agg(DISTINCT to_jsonb(o) -> TG_ARGV[2]) INTO antigas FROM linhas_antigas o;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            SELECT jsonb_agg(DISTINCT to_jsonb(n) -> TG_ARGV[2]) INTO novas FROM linhas_novas n;
+        END IF;
+        PERFORM notificar_chaves(TG_ARGV[1], 'UPDATE',
+            (SELECT jsonb_agg(DISTINCT c) FROM jsonb_array_elements(COALESCE(antigas, '[]') || COALESCE(novas, '[]')) AS t(c)));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tabelas de transição exigem um gatilho por operação.
+CREATE OR REPLACE PROCEDURE criar_gatilhos_notificacao(p_tabela TEXT, VARIADIC p_argumentos TEXT[]) AS $$
+DECLARE
+    argumentos TEXT := (SELECT string_agg(quote_literal(a), ', ') FROM unnest(p_argumentos) AS a);
+BEGIN
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notificar_' || p_tabela, p_tabela);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notificar_' || p_tabela || '_insert', p_tabela);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notificar_' || p_tabela || '_update', p_tabela);
+    EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_notificar_' || p_tabela || '_delete', p_tabela);
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS linhas_novas '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracoes(%s)',
+                   'trg_notificar_' || p_tabela || '_insert', p_tabela, argumentos);
+    EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS linhas_antigas NEW TABLE AS linhas_novas '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracoes(%s)',
+                   'trg_notificar_' || p_tabela || '_update', p_tabela, argumentos);
+    EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS linhas_antigas '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION notificar_alteracoes(%s)',
+                   'trg_notificar_' || p_tabela || '_delete', p_tabela, argumentos);
+END;
+$$ LANGUAGE plpgsql;
+
+CALL criar_gatilhos_notificacao('campanha', 'id_campanha');
+CALL criar_gatilhos_notificacao('vacina', 'id_vacina');
+CALL criar_gatilhos_notificacao('local', 'id_local');
+CALL criar_gatilhos_notificacao('usuario', 'cpf');
+-- Subtipos de usuário: notificados como alteração do usuário (notificacoes.ALTERACOES_DERIVADAS).
+CALL criar_gatilhos_notificacao('cidadao', 'cpf');
+CALL criar_gatilhos_notificacao('administrador', 'cpf');
+CALL criar_gatilhos_notificacao('agente_saude', 'cpf');
+-- Vacinações baixam e devolvem doses: notificam também o saldo das vacinas envolvidas.
+CALL criar_gatilhos_notificacao('vacinacao', 'id_vacinacao', 'vacina', 'id_vacina');
+CALL criar_gatilhos_notificacao('agendamento', 'id_agendamento');
+CALL criar_gatilhos_notificacao('parente', 'id_parentesco');
+
+DROP PROCEDURE criar_gatilhos_notificacao(TEXT, TEXT[]);
+DROP FUNCTION IF EXISTS notificar_alteracao();
@@ -0,0 +1,148 @@
+import os
+import json
+import asyncio
+import inspect
+import weakref
+from collections import defaultdict
+
+import asyncpg
+import panel as pn
+from panel.io.state import set_curdoc
+
+from db_config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS, invalidar_cache
+
+# --- Alterações entre sessões (LISTEN/NOTIFY)
+# Os gatilhos da migração 0005 emitem NOTIFY no canal CANAL_ALTERACOES para cada comando
+# de escrita, venha de qualquer processo ou de fora da aplicação, com as chaves das linhas
+# afetadas agrupadas por tabela e operação. Um único ouvinte por processo
+# (conexão asyncpg dedicada, fora do pool) junta as notificações de NOTIFICACAO_JANELA
+# segundos, invalida o cache de consultas das tabelas e repassa as chaves alteradas às
+# assinaturas das páginas, que atualizam só as linhas afetadas.
+NOTIFICACOES_ATIVAS = os.getenv('NOTIFICACOES_ATIVAS', '1') == '1'
+NOTIFICACAO_JANELA = float(os.getenv('NOTIFICACAO_JANELA', 0.2))       # segundos agrupando notificações
+NOTIFICACAO_RECONEXAO = float(os.getenv('NOTIFICACAO_RECONEXAO', 5))   # segundos antes de reconectar o ouvinte
+CANAL_ALTERACOES = 'alteracoes'
+
+# Tabelas que só mudam colunas exibidas de outra tabela com a mesma chave; suas
+# notificações chegam às assinaturas como UPDATE da tabela exibida.
+ALTERACOES_DERIVADAS = {
+    'cidadao': 'usuario',
+    'administrador': 'usuario',
+    'agente_saude': 'usuario',
+}
+
+_assinaturas = defaultdict(list)  # tabela -> [(referência ao callback, documento da sessão)]
+_pendentes = []
+_despacho = None
+_tarefa = None
+
+def assinar(tabela, callback):
+    """
+    Registra um callback para as alterações de uma tabela feitas por qualquer sessão.
+    O callback pode ser uma corrotina. Chamado dentro de uma sessão, roda com o documento
+    dela (pn.state.curdoc) e a assinatura é removida quando a sessão termina; métodos são
+    guardados por referência fraca, então a assinatura também termina junto com o objeto dono.
+    Args:
+        tabela (str): Nome da tabela (ex: 'vacinacao').
+        callback (callable): Recebe um dict {'INSERT'|'UPDATE'|'DELETE': set de chaves}.
+    """
+    referencia = weakref.WeakMethod(callback) if inspect.ismethod(callback) else (lambda: callback)
+    assinatura = (referencia, pn.state.curdoc)
+    assinaturas = _assinaturas[tabela.lower()]
+    assinaturas.append(assinatura)
+    if pn.state.curdoc is not None:
+        def cancelar(contexto):
+            if assinatura in assinaturas:
+                assinaturas.remove(assinatura)
+        pn.state.on_session_destroyed(cancelar)
+    iniciar_escuta()
+
+def iniciar_escuta():
+    """
+    Inicia o ouvinte do processo no event loop em execução, se ainda não estiver rodando.
+    Fora de um event loop (scripts, linha de comando) não faz nada.
+    """
+    global _tarefa
+    if not NOTIFICACOES_ATIVAS or escuta_ativa():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _tarefa = loop.create_task(_escutar())
+
+def escuta_ativa():
+    """Indica se o ouvinte de alterações está rodando neste processo."""
+    return _tarefa is not None and not _tarefa.done()
+
+async def _escutar():
+    while True:
+        try:
+            conn = await asyncpg.connect(host=DB_HOST, port=DB_PORT, database=DB_NAME, user=DB_USER, password=DB_PASS)
+        except (OSError, asyncpg.PostgresError) as e:
+            print(f"Erro ao conectar o ouvinte de alterações: {e}")
+            await asyncio.sleep(NOTIFICACAO_RECONEXAO)
+            continue
+        encerrada = asyncio.Event()
+        conn.add_termination_listener(lambda c: encerrada.set())
+        try:
+            await conn.add_listener(CANAL_ALTERACOES, _ao_notificar)
+            # Notificações emitidas enquanto não havia ouvinte se perderam
+            invalidar_cache()
+            await encerrada.wait()
+            print("Conexão do ouvinte de alterações encerrada; reconectando.")
+        finally:
+            if not conn.is_closed():
+                conn.terminate()
+        await asyncio.sleep(NOTIFICACAO_RECONEXAO)
+
+def _ao_notificar(conn, pid, canal, payload):
+    global _despacho
+    _pendentes.append(json.loads(payload))
+    if _despacho is None:
+        _despacho = asyncio.get_running_loop().call_later(
+            NOTIFICACAO_JANELA, lambda: asyncio.ensure_future(_despachar()))
+
+def agrupar_alteracoes(notificacoes):
+    """
+    Agrupa notificações por tabela exibida e operação, aplicando ALTERACOES_DERIVADAS.
+    Args:
+        notificacoes (list): Dicts {'tabela', 'operacao', 'chaves'} dos gatilhos.
+    Returns:
+        dict: {tabela: {operacao: set de chaves}}.
+    """
+    alteracoes = defaultdict(lambda: defaultdict(set))
+    for notificacao in notificacoes:
+        tabela, operacao = notificacao['tabela'], notificacao['operacao']
+        if tabela in ALTERACOES_DERIVADAS:
+            tabela, operacao = ALTERACOES_DERIVADAS[tabela], 'UPDATE'
+        alteracoes[tabela][operacao].update(notificacao['chaves'])
+    return {tabela: dict(operacoes) for tabela, operacoes in alteracoes.items()}
+
+async def _despachar():
+    global _despacho, _pendentes
+    _despacho = None
+    lote, _pendentes = _pendentes, []
+    alteracoes = agrupar_alteracoes(lote)
+    invalidar_cache(*{n['tabela'] for n in lote}, *alteracoes)
+    chamadas = []
+    for tabela, operacoes in alteracoes.items():
+        referencias = _assinaturas.get(tabela, [])
+        for assinatura in list(referencias):
+            referencia, documento = assinatura
+            callback = referencia()
+            if callback is None:
+                referencias.remove(assinatura)
+                continue
+            with set_curdoc(documento):
+                # A tarefa herda o documento da sessão (contextvars) durante toda a execução
+                chamadas.append((tabela, asyncio.ensure_future(_chamar(callback, operacoes))))
+    resultados = await asyncio.gather(*[chamada for _, chamada in chamadas], return_exceptions=True)
+    for (tabela, _), resultado in zip(chamadas, resultados):
+        if isinstance(resultado, Exception):
+            print(f"Erro ao aplicar alterações de {tabela}: {resultado}")
+
+async def _chamar(callback, operacoes):
+    resultado = callback(operacoes)
+    if inspect.isawaitable(resultado):
+        await resultado
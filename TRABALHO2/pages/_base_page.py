@@ -0,0 +1,423 @@
+import os
+import asyncio
+import weakref
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import urlencode
+
+import panel as pn
+from bokeh.models.widgets.tables import DateFormatter
+
+from db_config import (fetch_pagina_async, fetch_data_async, buscar_em_paralelo_async, buscar_nomes_async,
+                       buscar_cidadaos_async, BUSCA_MIN_CARACTERES, TIPO_TEXTO, TIPO_CATEGORIA, get_vacinas,
+                       get_locais, get_campanhas_ativas)
+from notificacoes import assinar
+
+
+# --- Formatação de datas nas tabelas
+# As colunas de data chegam ao Tabulator como datas e o navegador as exibe em DD/MM/AAAA,
+# sem cópia do DataFrame nem coluna de texto. O Tabulator clona o formatador por tabela.
+FORMATO_DATA = DateFormatter(format='%d/%m/%Y')
+
+def formatadores_data(*colunas):
+    """Formatters do Tabulator que exibem as colunas informadas como DD/MM/AAAA."""
+    return {coluna: FORMATO_DATA for coluna in colunas}
+
+
+# --- Ações das páginas em segundo plano
+# Callbacks síncronos que acessam o banco (inserir, atualizar, excluir) rodam num pool de
+# threads limitado, e não no event loop, que fica livre para as demais sessões. A thread roda
+# com o documento da sessão (contextvars), então as alterações nos widgets feitas por ela são
+# repassadas ao documento pelo próprio Panel, no event loop. Callbacks assíncronos continuam
+# no event loop. Em ambos, o botão e os widgets informados ficam em estado de carregamento.
+ACOES_PARALELAS = int(os.getenv('ACOES_PARALELAS', 16))  # callbacks síncronos executados ao mesmo tempo (por processo)
+
+_executor_acoes = ThreadPoolExecutor(max_workers=ACOES_PARALELAS, thread_name_prefix='acao')
+_carregando = weakref.WeakKeyDictionary()  # widget -> ações em andamento que o usam
+
+def _marcar_carregando(widgets, ativo):
+    for widget in widgets:
+        quantidade = max(_carregando.get(widget, 0) + (1 if ativo else -1), 0)
+        _carregando[widget] = quantidade
+        widget.loading = quantidade > 0
+
+def acao_com_carregamento(callback, *carregando):
+    """
+    Envolve um callback de página para rodar fora do event loop com indicação de carregamento.
+    Args:
+        callback (callable): Função ou corrotina da página (ex: on_inserir_campanha).
+        *carregando (pn.viewable.Viewable): Widgets que ficam em carregamento durante a execução.
+    Returns:
+        callable: Corrotina a ser registrada no lugar do callback (ex: em on_click).
+    """
+    async def executar(*args, **kwargs):
+        _marcar_carregando(carregando, True)
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                return await callback(*args, **kwargs)
+            contexto = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                _executor_acoes, lambda: contexto.run(callback, *args, **kwargs))
+        finally:
+            _marcar_carregando(carregando, False)
+    return executar
+
+def ligar_acao(botao, callback, *carregando):
+    """Liga o clique do botão ao callback via acao_com_carregamento; o botão também fica em carregamento."""
+    botao.on_click(acao_com_carregamento(callback, botao, *carregando))
+
+
+# --- Campos de busca com sugestões
+# Enquanto o operador digita, as sugestões vêm do banco (db_config.buscar_nomes_async e
+# buscar_cidadaos_async, pelos índices das migrações 0003 e 0004) depois de BUSCA_ESPERA
+# segundos sem novas teclas; uma tecla descarta a busca da anterior que ainda não terminou,
+# e só as sugestões da última chegam ao navegador. Escolher uma sugestão aplica o filtro da página
+# ligado com ligar_busca; texto livre continua sendo aplicado pelo botão de filtro.
+BUSCA_ESPERA = float(os.getenv('BUSCA_ESPERA', 0.3))  # segundos sem digitar antes de buscar sugestões
+
+def _campo_sugestoes(sugestoes, **kwargs):
+    campo = pn.widgets.AutocompleteInput(options=[], restrict=False, case_sensitive=False, search_strategy='includes',
+                                         min_characters=BUSCA_MIN_CARACTERES, **kwargs)
+    ultima = 0        # tecla mais recente
+    tarefas = set()   # referências às buscas em andamento (o event loop guarda só referências fracas)
+
+    async def sugerir(termo, tecla):
+        await asyncio.sleep(BUSCA_ESPERA)
+        if tecla != ultima:
+            return
+        opcoes = await sugestoes(termo)
+        if tecla == ultima:
+            campo.options = opcoes
+
+    def ao_digitar(event):
+        nonlocal ultima
+        if event.new in campo.options:  # sugestão escolhida, não uma tecla
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        ultima += 1
+        tarefa = loop.create_task(sugerir(event.new, ultima))
+        tarefas.add(tarefa)
+        tarefa.add_done_callback(tarefas.discard)
+
+    campo.param.watch(ao_digitar, 'value_input')
+    return campo
+
+def campo_busca(busca, **kwargs):
+    """
+    Campo de texto com sugestões buscadas no servidor enquanto se digita.
+    Args:
+        busca (str): Chave de db_config.BUSCAS_NOME (ex: 'usuarios').
+        **kwargs: Repassados ao pn.widgets.AutocompleteInput (name, placeholder...).
+    Returns:
+        pn.widgets.AutocompleteInput: O campo; o texto confirmado fica em `value`.
+    """
+    return _campo_sugestoes(partial(buscar_nomes_async, busca), **kwargs)
+
+async def _opcoes_cidadaos(termo):
+    return {f"{nome} ({cpf})": cpf for cpf, nome in await buscar_cidadaos_async(termo)}
+
+def campo_cidadao(**kwargs):
+    """
+    Campo de CPF com sugestões de cidadãos por prefixo do CPF ou por nome, no máximo
+    BUSCA_CIDADAOS_LIMITE por busca, em vez de um menu com todos os cidadãos.
+    Args:
+        **kwargs: Repassados ao pn.widgets.AutocompleteInput (name, placeholder...).
+    Returns:
+        pn.widgets.AutocompleteInput: O campo; `value` é o CPF da sugestão escolhida ou o
+                                      texto digitado, e aceita um CPF atribuído pela página.
+    """
+    return _campo_sugestoes(_opcoes_cidadaos, **kwargs)
+
+def ligar_busca(campo, callback, *carregando):
+    """Liga a escolha de uma sugestão do campo de busca ao callback, como ligar_acao faz com o clique."""
+    acao = acao_com_carregamento(callback, *carregando)
+
+    def ao_escolher(event):
+        if event.new and event.new in campo.options:
+            pn.state.execute(acao)
+
+    campo.param.watch(ao_escolher, 'value')
+
+
+# --- Dados de referência compartilhados entre as sessões
+# Cada sessão monta suas próprias páginas (montar_pagina), mas os menus de vacinas, locais
+# e campanhas são iguais para todos os operadores. Os DataFrames vêm do cache do
+# db_config, invalidado nas escritas e pelas notificações, e as opções montadas a partir
+# deles ficam guardadas no processo até a consulta devolver um DataFrame novo. Nada aqui é
+# alterado pelas páginas: cada sessão recebe sua própria cópia do dict de opções.
+# nome -> (consulta, coluna do valor, modelo do rótulo)
+MENUS_REFERENCIA = {
+    'vacinas': (get_vacinas, 'id_vacina', "{nome} (Lote: {codigo_lote}, Doses: {qtd_doses})"),
+    'vacinas_lote': (get_vacinas, 'id_vacina', "{nome} (Lote: {codigo_lote})"),
+    'locais': (get_locais, 'id_local', "{nome} ({cidade})"),
+    'campanhas': (get_campanhas_ativas, 'id_campanha', "{nome} (ID: {id_campanha})"),
+    'campanhas_nome': (get_campanhas_ativas, 'id_campanha', "{nome}"),
+}
+
+_menus = {}  # nome -> (DataFrame de origem, opções)
+_lock_menus = threading.Lock()
+
+def _opcoes_menu(nome, df):
+    _, coluna, rotulo = MENUS_REFERENCIA[nome]
+    with _lock_menus:
+        origem, opcoes = _menus.get(nome, (None, None))
+        if origem is not df:
+            opcoes = {rotulo.format(**linha): linha[coluna] for linha in df.to_dict('records')}
+            _menus[nome] = (df, opcoes)
+    return dict(opcoes)
+
+async def opcoes_menus(*nomes):
+    """
+    Opções dos menus de referência, buscando cada consulta uma única vez e em paralelo.
+    Args:
+        *nomes (str): Chaves de MENUS_REFERENCIA.
+    Returns:
+        list: Um dict {rótulo: valor} por nome, na mesma ordem.
+    """
+    consultas = list(dict.fromkeys(MENUS_REFERENCIA[nome][0] for nome in nomes))
+    resultados = dict(zip(consultas, await buscar_em_paralelo_async(*consultas)))
+    return [_opcoes_menu(nome, resultados[MENUS_REFERENCIA[nome][0]]) for nome in nomes]
+
+
+# --- Atualização incremental das tabelas
+class AtualizacaoIncremental:
+    """
+    Aplica na tabela só as linhas afetadas por uma escrita, em vez de recarregá-la inteira.
+    A escrita devolve a chave das linhas (RETURNING ou a chave da seleção); as linhas são
+    relidas pela consulta base da tabela, com as colunas de exibição, e enviadas ao
+    navegador como stream (inserção), patch (atualização) ou remoção. Com `origem`, as
+    escritas feitas em outras sessões chegam pelas notificações (notificacoes.assinar) e são
+    aplicadas da mesma forma; reaplicar uma alteração já exibida não duplica linhas.
+    Args:
+        tabela (pn.widgets.Tabulator): Tabela exibida na página.
+        sql_base (str): Consulta SELECT sem ORDER BY que alimenta a tabela.
+        chave (str): Coluna única que identifica as linhas.
+        origem (str, optional): Tabela do banco cujas notificações atualizam a tabela.
+        tipos (dict, optional): Coluna -> dtype das linhas lidas (ex: db_config.TIPOS_VACINACOES).
+            Colunas TIPO_CATEGORIA ficam como texto: a tabela guarda poucas linhas, e um patch
+            com um valor fora das categorias já carregadas falharia.
+    """
+
+    def __init__(self, tabela, sql_base, chave, origem=None, tipos=None):
+        self.tabela = tabela
+        self.sql_base = sql_base
+        self.chave = chave
+        self.tipos = {coluna: (TIPO_TEXTO if tipo == TIPO_CATEGORIA else tipo) for coluna, tipo in (tipos or {}).items()}
+        self.where, self.params = '', ()
+        if origem:
+            assinar(origem, self.aplicar_alteracoes)
+
+    async def _buscar_linhas(self, chaves):
+        # Respeita o filtro aplicado, para não trazer linhas que a consulta não exibiria. Lê do
+        # primário: a escrita (desta ou de outra sessão) pode ainda não ter chegado à réplica.
+        condicoes = ([f"({self.where})"] if self.where else []) + [f"{self.chave} = ANY(%s)"]
+        return await fetch_data_async(
+            f"SELECT * FROM ({self.sql_base}) AS linha WHERE {' AND '.join(condicoes)}",
+            (*self.params, list(chaves)), tipos=self.tipos, primario=True)
+
+    def _indices(self, chaves):
+        atual = self.tabela.value
+        if atual is None or self.chave not in atual.columns:
+            return atual.index[:0] if atual is not None else []
+        return atual.index[atual[self.chave].isin(chaves)]
+
+    async def inserida(self, *chaves):
+        """Acrescenta ao fim da tabela as linhas recém-inseridas que ainda não estão nela."""
+        atual = self.tabela.value
+        if atual is not None and self.chave in atual.columns:
+            exibidas = set(atual[self.chave])
+            chaves = [c for c in chaves if c not in exibidas]
+        if not chaves:
+            return
+        novas = await self._buscar_linhas(chaves)
+        if novas.empty:
+            return
+        if self.tabela.value is None or self.tabela.value.empty:
+            self.tabela.value = novas
+        else:
+            self.tabela.stream(novas[list(self.tabela.value.columns)], follow=True)
+
+    async def alterada(self, *chaves):
+        """Atualiza, no lugar, as linhas alteradas que estão na tabela."""
+        indices = self._indices(chaves)
+        if not len(indices):
+            return
+        linhas = (await self._buscar_linhas(chaves)).set_index(self.chave)
+        atual = self.tabela.value
+        patch = {}
+        for indice in indices:
+            chave = atual.at[indice, self.chave]
+            if chave not in linhas.index:
+                continue
+            for coluna in atual.columns:
+                if coluna != self.chave and coluna in linhas.columns:
+                    patch.setdefault(coluna, []).append((indice, linhas.at[chave, coluna]))
+        if patch:
+            self.tabela.patch(patch)
+
+    def removida(self, *chaves):
+        """Retira da tabela as linhas excluídas."""
+        indices = self._indices(chaves)
+        if len(indices):
+            self.tabela.selection = []
+            self.tabela.value = self.tabela.value.drop(index=indices)
+
+    async def aplicar_alteracoes(self, alteracoes):
+        """Aplica um lote de alterações notificado ({'INSERT'|'UPDATE'|'DELETE': chaves})."""
+        if alteracoes.get('INSERT'):
+            await self.inserida(*alteracoes['INSERT'])
+        if alteracoes.get('UPDATE'):
+            await self.alterada(*alteracoes['UPDATE'])
+        if alteracoes.get('DELETE'):
+            self.removida(*alteracoes['DELETE'])
+
+
+# --- Paginação remota das tabelas
+class PaginacaoRemota(AtualizacaoIncremental):
+    """
+    Liga um Tabulator a uma consulta paginada no servidor.
+    Apenas a página visível é buscada no banco e enviada ao navegador; a navegação
+    usa paginação por chave (keyset) e a ordenação pelo cabeçalho da tabela vira
+    ORDER BY na consulta. As buscas são assíncronas (db_config.fetch_pagina_async), então
+    os métodos de navegação são corrotinas. Após escritas, use os métodos de
+    AtualizacaoIncremental (inserida/alterada/removida) em vez de recarregar a página.
+    Args:
+        tabela (pn.widgets.Tabulator): Tabela que exibirá a página.
+        sql_base (str): Consulta SELECT sem ORDER BY (ex: db_config.SQL_VACINACOES).
+        ordem_padrao (list): Lista de (coluna, 'ASC'|'DESC') usada sem ordenação do usuário.
+        chave (str): Coluna única usada como desempate da ordenação.
+        colunas_ordenaveis (iterable, optional): Colunas que o usuário pode ordenar pelo cabeçalho.
+        exibir (callable, optional): Função que recebe o DataFrame da página e o exibe na tabela.
+            A tabela deve manter as colunas de ordenação: a próxima página parte da última linha dela.
+        origem (str, optional): Tabela do banco cujas notificações atualizam a página.
+        tipos (dict, optional): Coluna -> dtype das linhas lidas, como em AtualizacaoIncremental.
+    """
+
+    def __init__(self, tabela, sql_base, ordem_padrao, chave, colunas_ordenaveis=(), exibir=None, origem=None,
+                 tipos=None):
+        super().__init__(tabela, sql_base, chave, origem, tipos)
+        self.ordem_padrao = list(ordem_padrao)
+        self.colunas_ordenaveis = set(colunas_ordenaveis)
+        self.exibir = exibir or self._exibir_padrao
+        self.tamanho_pagina = tabela.page_size or 10
+        self.ordem = self.ordem_padrao
+        self.dados = None
+        self._cursores = [None]  # chave de busca do início de cada página visitada
+
+        self.btn_primeira = pn.widgets.Button(name='⏮', width=45)
+        self.btn_anterior = pn.widgets.Button(name='◀ Anterior', width=100)
+        self.btn_proxima = pn.widgets.Button(name='Próxima ▶', width=100)
+        self.indicador = pn.pane.Markdown('', margin=(5, 10))
+        self.controles = pn.Row(self.btn_primeira, self.btn_anterior, self.indicador, self.btn_proxima)
+
+        ligar_acao(self.btn_primeira, self.primeira, tabela)
+        ligar_acao(self.btn_anterior, self.anterior, tabela)
+        ligar_acao(self.btn_proxima, self.proxima, tabela)
+        tabela.param.watch(self._on_ordenacao, 'sorters')
+
+    def _exibir_padrao(self, df):
+        self.tabela.value = df
+
+    async def _buscar(self, primario=False):
+        df = await fetch_pagina_async(self.sql_base, self.ordem, self.tamanho_pagina + 1,
+                          apos=self._cursores[-1], where=self.where, params=self.params, tipos=self.tipos,
+                          primario=primario)
+        tem_proxima = len(df) > self.tamanho_pagina
+        self.dados = df.iloc[:self.tamanho_pagina].reset_index(drop=True)
+        self.exibir(self.dados)
+        self.btn_primeira.disabled = self.btn_anterior.disabled = len(self._cursores) == 1
+        self.btn_proxima.disabled = not tem_proxima
+        self.indicador.object = f"Página **{len(self._cursores)}**" + (" (filtrado)" if self.where else "")
+
+    async def carregar(self, where='', params=()):
+        """Volta para a primeira página, opcionalmente com uma condição de filtro."""
+        self.where, self.params = where, tuple(params)
+        self._cursores = [None]
+        await self._buscar()
+
+    async def recarregar(self):
+        """Busca novamente a página atual no primário (ex: após inserir, atualizar ou excluir)."""
+        await self._buscar(primario=True)
+
+    async def primeira(self, event=None):
+        self._cursores = [None]
+        await self._buscar()
+
+    async def anterior(self, event=None):
+        if len(self._cursores) > 1:
+            self._cursores.pop()
+            await self._buscar()
+
+    async def proxima(self, event=None):
+        if self.dados is None or self.dados.empty:
+            return
+        ultima = self.dados.iloc[-1]
+        self._cursores.append(tuple(ultima[coluna] for coluna, _ in self.ordem))
+        await self._buscar()
+
+    async def inserida(self, *chaves):
+        """
+        Inserções só aparecem na primeira página, que é buscada de novo para mantê-las na ordem
+        certa e no tamanho da página. Nas demais, a linha nova não pertence à página exibida.
+        """
+        if len(self._cursores) == 1:
+            await self.recarregar()
+
+    async def alterada(self, *chaves):
+        await super().alterada(*chaves)
+        self.dados = self.tabela.value
+
+    def removida(self, *chaves):
+        super().removida(*chaves)
+        self.dados = self.tabela.value
+
+    async def aplicar_alteracoes(self, alteracoes):
+        """
+        Alterações e exclusões notificadas são aplicadas nas linhas da página; inserções
+        recarregam a primeira página (ver inserida).
+        """
+        if alteracoes.get('INSERT') and len(self._cursores) == 1:
+            await self.recarregar()
+            return
+        await super().aplicar_alteracoes({**alteracoes, 'INSERT': None})
+
+    async def _on_ordenacao(self, event):
+        ordem = [(s['field'], 'ASC' if s['dir'] == 'asc' else 'DESC')
+                 for s in event.new if s['field'] in self.colunas_ordenaveis]
+        if ordem and ordem[-1][0] != self.chave:
+            ordem.append((self.chave, ordem[-1][1]))
+        nova_ordem = ordem or self.ordem_padrao
+        if nova_ordem != self.ordem:
+            self.ordem = nova_ordem
+            await self.primeira()
+
+
+# --- Links de exportação (rota /exportar de exportacao.py)
+class LinksExportacao:
+    """
+    Links de download em CSV e Parquet de uma das consultas de exportacao.EXPORTACOES.
+    O arquivo é gerado em streaming pela rota /exportar, fora da sessão do Panel; os
+    filtros aplicados na tabela vão na query string.
+    Args:
+        nome (str): Nome da exportação ('vacinacoes', 'agendamentos' ou 'usuarios').
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.painel = pn.pane.Markdown('', margin=(0, 10))
+        self.atualizar()
+
+    def atualizar(self, **filtros):
+        """Refaz os links com os valores de filtro (mesmos nomes de db_config.filtros_*)."""
+        valores = {chave: valor.isoformat() if isinstance(valor, date) else str(valor).strip()
+                   for chave, valor in filtros.items() if valor not in (None, '')}
+        consulta = f"?{urlencode(valores)}" if valores else ''
+        self.painel.object = (f"⬇ Exportar{' (filtrado)' if valores else ''}: "
+                              f"[CSV](/exportar/{self.nome}.csv{consulta}) · "
+                              f"[Parquet](/exportar/{self.nome}.parquet{consulta})")
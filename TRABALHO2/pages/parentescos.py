@@ -1,199 +1,185 @@
+from functools import partial
 import panel as pn
 import pandas as pd
 import sqlalchemy
 
 # Importar a conexão e funções auxiliares do db_config
-from db_config import engine, get_cidadaos, get_parentescos
-
-# --- Widgets para Filtragem
-filtro_cpf = pn.widgets.TextInput(name="Filtrar por CPF", placeholder='Digite o CPF...')
-filtro_nome = pn.widgets.TextInput(name="Filtrar por Nome", placeholder='Digite o nome...')
-
-# --- Widgets do Formulário para Inserir/Atualizar
-form_cpf_responsavel = pn.widgets.Select(name="CPF do Responsável*", options={})
-form_cpf_parente = pn.widgets.Select(name="CPF do Parente*", options={})
-
-# --- Botões de Ação
-btn_consultar = pn.widgets.Button(name='Aplicar Filtros', button_type='primary')
-btn_limpar = pn.widgets.Button(name='Limpar Filtros', button_type='default')
-btn_inserir = pn.widgets.Button(name='Adicionar Parentesco', button_type='success')
-btn_atualizar = pn.widgets.Button(name='Atualizar Selecionado', button_type='warning', disabled=True)
-btn_excluir = pn.widgets.Button(name='Excluir Selecionado', button_type='danger', disabled=True)
-
-# --- Tabela
-tabela_parentescos = pn.widgets.Tabulator(pd.DataFrame(), layout='fit_columns', show_index=False, height=400, page_size=10)
-
-# --- Funções
-
-def update_dropdown_options():
-    try:
-        cidadaos_df = get_cidadaos()
-        if not cidadaos_df.empty:
-            cpf_options = {f"{row['nome']} ({row['cpf']})": row['cpf'] for _, row in cidadaos_df.iterrows()}
-            form_cpf_responsavel.options = cpf_options
-            form_cpf_parente.options = cpf_options
-        else:
-            form_cpf_responsavel.options, form_cpf_parente.options = {}, {}
-    except Exception as e:
-        pn.state.notifications.error(f"Erro ao carregar cidadãos para os menus: {e}")
-
-def carregar_todos_parentescos():
-    try:
-        df = get_parentescos()
-        tabela_parentescos.value = df
-        update_dropdown_options()
-    except Exception as e:
-        pn.state.notifications.error(f"Erro ao carregar parentescos: {e}")
-
-def on_consultar_parentesco(event=None):
-    try:
-        df_completo = get_parentescos()
-        df_filtrado = df_completo
-
-        if filtro_cpf.value:
-            cpf_filtrar = filtro_cpf.value.strip()
-            df_filtrado = df_filtrado[
-                (df_filtrado['cpf_responsavel'].str.contains(cpf_filtrar, na=False)) | 
-                (df_filtrado['cpf_parente'].str.contains(cpf_filtrar, na=False))
-            ]
-        
-        if filtro_nome.value:
-            nome_filtrar = filtro_nome.value.strip()
-            df_filtrado = df_filtrado[
-                (df_filtrado['nome_responsavel'].str.contains(nome_filtrar, case=False, na=False)) | 
-                (df_filtrado['nome_parente'].str.contains(nome_filtrar, case=False, na=False))
-            ]
-        
-        tabela_parentescos.value = df_filtrado
-        if not (filtro_cpf.value or filtro_nome.value):
-            pn.state.notifications.info("Nenhum filtro aplicado. Mostrando todos os parentescos.")
-        else:
-            pn.state.notifications.success(f"{len(df_filtrado)} resultados encontrados.")
-    except Exception as e:
-        pn.state.notifications.error(f"Erro ao consultar parentescos: {e}")
-
-def on_limpar_filtros(event=None):
-    filtro_cpf.value = ''
-    filtro_nome.value = ''
-    carregar_todos_parentescos()
-    pn.state.notifications.success("Filtros limpos.")
-
-def on_inserir_parentesco(event=None):
-    cpf_resp, cpf_par = form_cpf_responsavel.value, form_cpf_parente.value
-    if not all([cpf_resp, cpf_par]):
-        pn.state.notifications.warning("Selecione o Responsável e o Parente."); return
-    if cpf_resp == cpf_par:
-        pn.state.notifications.warning("Um cidadão não pode ser parente de si mesmo."); return
-
-    try:
-        with engine.connect() as connection:
-            trans = connection.begin()
-            try:
-                check_q = sqlalchemy.text("SELECT 1 FROM Parente WHERE CPF_Responsavel = :resp AND CPF_Parente = :par")
-                if connection.execute(check_q, {"resp": cpf_resp, "par": cpf_par}).scalar():
-                    pn.state.notifications.warning("Este vínculo de parentesco já existe."); trans.rollback(); return
-
-                insert_q = sqlalchemy.text("INSERT INTO Parente (CPF_Responsavel, CPF_Parente) VALUES (:resp, :par)")
-                connection.execute(insert_q, {"resp": cpf_resp, "par": cpf_par})
-                trans.commit()
-                pn.state.notifications.success("Parentesco adicionado com sucesso!")
-                carregar_todos_parentescos()
-            except Exception as e:
-                trans.rollback(); pn.state.notifications.error(f"Erro na transação: {e}")
-    except Exception as e:
-        pn.state.notifications.error(f"Erro de conexão: {e}")
-
-def on_atualizar_parentesco(event=None):
-    selecao = tabela_parentescos.selection
-    if not selecao:
-        pn.state.notifications.warning("Selecione um parentesco para atualizar."); return
-
-    id_parentesco = int(tabela_parentescos.value.loc[selecao[0], 'id_parentesco'])
-    cpf_resp, cpf_par = form_cpf_responsavel.value, form_cpf_parente.value
-
-    if not all([cpf_resp, cpf_par]):
-        pn.state.notifications.warning("Selecione o Responsável e o Parente."); return
-    if cpf_resp == cpf_par:
-        pn.state.notifications.warning("Um cidadão não pode ser parente de si mesmo."); return
-
-    try:
-        with engine.connect() as connection:
-            trans = connection.begin()
-            try:
-                update_q = sqlalchemy.text("UPDATE Parente SET CPF_Responsavel = :resp, CPF_Parente = :par WHERE Id_Parentesco = :id")
-                connection.execute(update_q, {"resp": cpf_resp, "par": cpf_par, "id": id_parentesco})
-                trans.commit()
-                pn.state.notifications.success("Parentesco atualizado com sucesso!")
-                carregar_todos_parentescos()
-            except Exception as e:
-                trans.rollback(); pn.state.notifications.error(f"Erro na transação ao atualizar: {e}")
-    except Exception as e:
-        pn.state.notifications.error(f"Erro de conexão ao atualizar: {e}")
-
-def on_excluir_parentesco(event=None):
-    selecao = tabela_parentescos.selection
-    if not selecao:
-        pn.state.notifications.warning("Selecione um parentesco para excluir."); return
-
-    id_parentesco = int(tabela_parentescos.value.loc[selecao[0], 'id_parentesco'])
-
-    try:
-        with engine.connect() as connection:
-            trans = connection.begin()
-            try:
-                connection.execute(sqlalchemy.text("DELETE FROM Parente WHERE Id_Parentesco = :id"), {"id": id_parentesco})
-                trans.commit()
-                pn.state.notifications.success("Parentesco excluído com sucesso!")
-                carregar_todos_parentescos()
-                preencher_formulario_selecao([])
-            except Exception as e:
-                trans.rollback(); pn.state.notifications.error(f"Erro na transação ao excluir: {e}")
-    except Exception as e:
-        pn.state.notifications.error(f"Erro de conexão ao excluir: {e}")
-
-@pn.depends(tabela_parentescos.param.selection, watch=True)
-def preencher_formulario_selecao(selection):
-    if not selection:
-        btn_atualizar.disabled, btn_excluir.disabled = True, True
-        form_cpf_responsavel.value, form_cpf_parente.value = None, None
-        return
-    
-    btn_atualizar.disabled, btn_excluir.disabled = False, False
-    row_data = tabela_parentescos.value.loc[selection[0]]
-    
-    form_cpf_responsavel.value = row_data.get('cpf_responsavel')
-    form_cpf_parente.value = row_data.get('cpf_parente')
-
-# --- Conexões dos Botões
-btn_consultar.on_click(on_consultar_parentesco)
-btn_limpar.on_click(on_limpar_filtros)
-btn_inserir.on_click(on_inserir_parentesco)
-btn_atualizar.on_click(on_atualizar_parentesco)
-btn_excluir.on_click(on_excluir_parentesco)
-
-carregar_todos_parentescos()
-
-# --- Layout da Página ---
-filtros_card = pn.Card(
-    filtro_cpf,
-    filtro_nome,
-    pn.Row(btn_consultar, btn_limpar),
-    title="🔍 Filtros de Consulta"
-)
-
-gerenciamento_card = pn.Card(
-    pn.pane.Markdown("Para **Atualizar/Excluir**, selecione uma linha. Para **Adicionar**, selecione os CPFs."),
-    form_cpf_responsavel,
-    form_cpf_parente,
-    pn.Row(btn_inserir, btn_atualizar, btn_excluir),
-    title="📝 Gerenciar Parentescos",
-    collapsed=True
-)
-
-parentescos_page_layout = pn.Column(
-    pn.pane.Markdown("## Gerenciamento de Parentescos", styles={'text-align': 'center'}),
-    pn.Row(
-        pn.Column(filtros_card, gerenciamento_card, width=450),
-        pn.Column(tabela_parentescos, sizing_mode='stretch_width')
+from db_config import engine, SQL_PARENTESCOS, filtros_parentescos
+from pages._base_page import PaginacaoRemota, ligar_acao, acao_com_carregamento, campo_busca, campo_cidadao, ligar_busca
+
+
+# --- Montagem da Página (chamada pelo main_app a cada sessão que abre a aba)
+def montar_pagina():
+    # --- Widgets para Filtragem
+    filtro_cpf = pn.widgets.TextInput(name="Filtrar por CPF", placeholder='Digite o CPF...')
+    filtro_nome = campo_busca('usuarios', name="Filtrar por Nome", placeholder='Digite o nome...')
+
+    # --- Widgets do Formulário para Inserir/Atualizar
+    form_cpf_responsavel = campo_cidadao(name="CPF do Responsável*", placeholder='Digite o CPF ou o nome...')
+    form_cpf_parente = campo_cidadao(name="CPF do Parente*", placeholder='Digite o CPF ou o nome...')
+
+    # --- Botões de Ação
+    btn_consultar = pn.widgets.Button(name='Aplicar Filtros', button_type='primary')
+    btn_limpar = pn.widgets.Button(name='Limpar Filtros', button_type='default')
+    btn_inserir = pn.widgets.Button(name='Adicionar Parentesco', button_type='success')
+    btn_atualizar = pn.widgets.Button(name='Atualizar Selecionado', button_type='warning', disabled=True)
+    btn_excluir = pn.widgets.Button(name='Excluir Selecionado', button_type='danger', disabled=True)
+
+    # --- Tabela
+    tabela_parentescos = pn.widgets.Tabulator(pd.DataFrame(), layout='fit_columns', show_index=False, height=400, page_size=10)
+    paginacao_parentescos = PaginacaoRemota(
+        tabela_parentescos, SQL_PARENTESCOS,
+        ordem_padrao=[('nome_responsavel', 'ASC'), ('nome_parente', 'ASC'), ('id_parentesco', 'ASC')], chave='id_parentesco',
+        colunas_ordenaveis=['id_parentesco', 'cpf_responsavel', 'nome_responsavel', 'cpf_parente', 'nome_parente'],
+        origem='parente'
     )
-)
+
+    # --- Funções
+
+    async def carregar_todos_parentescos():
+        try:
+            await paginacao_parentescos.carregar()
+        except Exception as e:
+            pn.state.notifications.error(f"Erro ao carregar parentescos: {e}")
+
+    async def on_consultar_parentesco(event=None):
+        try:
+            where, params = filtros_parentescos(filtro_cpf.value, filtro_nome.value)
+            await paginacao_parentescos.carregar(where, params)
+            if not where:
+                pn.state.notifications.info("Nenhum filtro aplicado. Mostrando todos os parentescos.")
+            elif paginacao_parentescos.dados.empty:
+                pn.state.notifications.warning("Nenhum parentesco encontrado.")
+            else:
+                pn.state.notifications.success("Filtros aplicados.")
+        except Exception as e:
+            pn.state.notifications.error(f"Erro ao consultar parentescos: {e}")
+
+    async def on_limpar_filtros(event=None):
+        filtro_cpf.value = ''
+        filtro_nome.value = ''
+        await carregar_todos_parentescos()
+        pn.state.notifications.success("Filtros limpos.")
+
+    def on_inserir_parentesco(event=None):
+        cpf_resp, cpf_par = form_cpf_responsavel.value, form_cpf_parente.value
+        if not all([cpf_resp, cpf_par]):
+            pn.state.notifications.warning("Selecione o Responsável e o Parente."); return
+        if cpf_resp == cpf_par:
+            pn.state.notifications.warning("Um cidadão não pode ser parente de si mesmo."); return
+
+        try:
+            with engine.connect() as connection:
+                trans = connection.begin()
+                try:
+                    check_q = sqlalchemy.text("SELECT 1 FROM Parente WHERE CPF_Responsavel = :resp AND CPF_Parente = :par")
+                    if connection.execute(check_q, {"resp": cpf_resp, "par": cpf_par}).scalar():
+                        pn.state.notifications.warning("Este vínculo de parentesco já existe."); trans.rollback(); return
+
+                    insert_q = sqlalchemy.text("INSERT INTO Parente (CPF_Responsavel, CPF_Parente) VALUES (:resp, :par) RETURNING Id_Parentesco")
+                    id_parentesco = connection.execute(insert_q, {"resp": cpf_resp, "par": cpf_par}).scalar()
+                    trans.commit()
+                    pn.state.notifications.success("Parentesco adicionado com sucesso!")
+                    pn.state.execute(partial(paginacao_parentescos.inserida, id_parentesco))
+                except Exception as e:
+                    trans.rollback(); pn.state.notifications.error(f"Erro na transação: {e}")
+        except Exception as e:
+            pn.state.notifications.error(f"Erro de conexão: {e}")
+
+    def on_atualizar_parentesco(event=None):
+        selecao = tabela_parentescos.selection
+        if not selecao:
+            pn.state.notifications.warning("Selecione um parentesco para atualizar."); return
+
+        id_parentesco = int(tabela_parentescos.value.loc[selecao[0], 'id_parentesco'])
+        cpf_resp, cpf_par = form_cpf_responsavel.value, form_cpf_parente.value
+
+        if not all([cpf_resp, cpf_par]):
+            pn.state.notifications.warning("Selecione o Responsável e o Parente."); return
+        if cpf_resp == cpf_par:
+            pn.state.notifications.warning("Um cidadão não pode ser parente de si mesmo."); return
+
+        try:
+            with engine.connect() as connection:
+                trans = connection.begin()
+                try:
+                    update_q = sqlalchemy.text("UPDATE Parente SET CPF_Responsavel = :resp, CPF_Parente = :par WHERE Id_Parentesco = :id")
+                    connection.execute(update_q, {"resp": cpf_resp, "par": cpf_par, "id": id_parentesco})
+                    trans.commit()
+                    pn.state.notifications.success("Parentesco atualizado com sucesso!")
+                    pn.state.execute(partial(paginacao_parentescos.alterada, id_parentesco))
+                except Exception as e:
+                    trans.rollback(); pn.state.notifications.error(f"Erro na transação ao atualizar: {e}")
+        except Exception as e:
+            pn.state.notifications.error(f"Erro de conexão ao atualizar: {e}")
+
+    def on_excluir_parentesco(event=None):
+        selecao = tabela_parentescos.selection
+        if not selecao:
+            pn.state.notifications.warning("Selecione um parentesco para excluir."); return
+
+        id_parentesco = int(tabela_parentescos.value.loc[selecao[0], 'id_parentesco'])
+
+        try:
+            with engine.connect() as connection:
+                trans = connection.begin()
+                try:
+                    connection.execute(sqlalchemy.text("DELETE FROM Parente WHERE Id_Parentesco = :id"), {"id": id_parentesco})
+                    trans.commit()
+                    pn.state.notifications.success("Parentesco excluído com sucesso!")
+                    paginacao_parentescos.removida(id_parentesco)
+                    preencher_formulario_selecao([])
+                except Exception as e:
+                    trans.rollback(); pn.state.notifications.error(f"Erro na transação ao excluir: {e}")
+        except Exception as e:
+            pn.state.notifications.error(f"Erro de conexão ao excluir: {e}")
+
+    @pn.depends(tabela_parentescos.param.selection, watch=True)
+    def preencher_formulario_selecao(selection):
+        if not selection:
+            btn_atualizar.disabled, btn_excluir.disabled = True, True
+            form_cpf_responsavel.value, form_cpf_parente.value = '', ''
+            return
+
+        btn_atualizar.disabled, btn_excluir.disabled = False, False
+        row_data = tabela_parentescos.value.loc[selection[0]]
+
+        form_cpf_responsavel.value = row_data.get('cpf_responsavel')
+        form_cpf_parente.value = row_data.get('cpf_parente')
+
+    # --- Conexões dos Botões
+    ligar_acao(btn_consultar, on_consultar_parentesco, tabela_parentescos)
+    ligar_busca(filtro_nome, on_consultar_parentesco, tabela_parentescos)
+    ligar_acao(btn_limpar, on_limpar_filtros, tabela_parentescos)
+    ligar_acao(btn_inserir, on_inserir_parentesco, tabela_parentescos)
+    ligar_acao(btn_atualizar, on_atualizar_parentesco, tabela_parentescos)
+    ligar_acao(btn_excluir, on_excluir_parentesco, tabela_parentescos)
+
+
+    # --- Layout da Página ---
+    filtros_card = pn.Card(
+        filtro_cpf,
+        filtro_nome,
+        pn.Row(btn_consultar, btn_limpar),
+        title="🔍 Filtros de Consulta"
+    )
+
+    gerenciamento_card = pn.Card(
+        pn.pane.Markdown("Para **Atualizar/Excluir**, selecione uma linha. Para **Adicionar**, busque os cidadãos pelo CPF ou pelo nome."),
+        form_cpf_responsavel,
+        form_cpf_parente,
+        pn.Row(btn_inserir, btn_atualizar, btn_excluir),
+        title="📝 Gerenciar Parentescos",
+        collapsed=True
+    )
+
+    parentescos_page_layout = pn.Column(
+        pn.pane.Markdown("## Gerenciamento de Parentescos", styles={'text-align': 'center'}),
+        pn.Row(
+            pn.Column(filtros_card, gerenciamento_card, width=450),
+            pn.Column(tabela_parentescos, paginacao_parentescos.controles, sizing_mode='stretch_width')
+        )
+    )
+
+    pn.state.execute(acao_com_carregamento(carregar_todos_parentescos, tabela_parentescos))
+    return parentescos_page_layout
@@ -0,0 +1,34 @@
+import json
+
+import tornado.web
+
+from db_config import saude_banco
+from notificacoes import escuta_ativa
+
+# --- Estado de saúde do processo (rota /saude)
+# Com `panel serve --num-procs N` cada processo responde pelas próprias sessões e conexões,
+# então a resposta descreve só o processo que atendeu a requisição (campo pid). Responde 503
+# enquanto o banco não estiver disponível, para balanceadores e verificações de saúde.
+# Rota registrada com: panel serve main_app.py --plugins saude
+
+def saude_processo():
+    """
+    Estado do processo atual: conexão com o banco, pool, cache e ouvinte de alterações.
+    Returns:
+        dict: Resultado de db_config.saude_banco() com o campo 'ouvinte_alteracoes'.
+    """
+    return {**saude_banco(), 'ouvinte_alteracoes': escuta_ativa()}
+
+class SaudeHandler(tornado.web.RequestHandler):
+    """GET /saude: estado do processo em JSON (200 se o banco está disponível, 503 se não)."""
+
+    def get(self):
+        saude = saude_processo()
+        self.set_status(200 if saude['estado'] == 'ok' else 503)
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.set_header('Cache-Control', 'no-store')
+        self.write(json.dumps(saude, ensure_ascii=False, default=str))
+
+ROUTES = [
+    (r'/saude', SaudeHandler),
+]
@@ -104,6 +104,81 @@ CREATE TABLE Agendamento (
     FOREIGN KEY (CPF) REFERENCES Cidadao(CPF)
 );
 
+-- VAGAS OCUPADAS POR LOCAL E DIA
+-- Contador mantido junto com as escritas em Agendamento (db_config.agendar, reagendar e
+-- cancelar_agendamento); a vaga é tomada com um UPDATE condicional à capacidade do local.
+CREATE TABLE Vaga_Local (
+    Id_Local INTEGER NOT NULL,
+    Data_Agendamento DATE NOT NULL,
+    Ocupadas INT NOT NULL DEFAULT 0 CHECK (Ocupadas >= 0),
+    PRIMARY KEY (Id_Local, Data_Agendamento),
+    FOREIGN KEY (Id_Local) REFERENCES Local(Id_Local) ON DELETE CASCADE
+);
+
+-- ESTOQUE FRACIONADO E LIVRO DE MOVIMENTOS
+-- O saldo de cada lote fica dividido em fatias: cada aplicação baixa uma fatia livre
+-- escolhida ao acaso, então aplicações simultâneas do mesmo lote não disputam a mesma
+-- linha. Vacina.Qtd_Doses é consolidado periodicamente a partir das fatias.
+CREATE TABLE Estoque_Fatia (
+    Id_Vacina INTEGER NOT NULL,
+    Fatia SMALLINT NOT NULL,
+    Doses INT NOT NULL CHECK (Doses >= 0),
+    PRIMARY KEY (Id_Vacina, Fatia),
+    FOREIGN KEY (Id_Vacina) REFERENCES Vacina(Id_Vacina) ON DELETE CASCADE
+);
+
+CREATE TABLE Movimento_Estoque (
+    Id_Movimento BIGSERIAL NOT NULL,
+    Id_Vacina INTEGER NOT NULL,
+    Quantidade INT NOT NULL,
+    Motivo VARCHAR(30) NOT NULL,
+    Id_Vacinacao INTEGER,
+    Data_Movimento TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (Id_Movimento),
+    FOREIGN KEY (Id_Vacina) REFERENCES Vacina(Id_Vacina) ON DELETE CASCADE
+);
+
+CREATE VIEW Vacina_Estoque AS
+SELECT v.Id_Vacina, v.Nome, v.Doenca_alvo, v.Codigo_Lote, v.Data_Chegada, v.Data_Validade,
+       COALESCE((SELECT SUM(f.Doses) FROM Estoque_Fatia f WHERE f.Id_Vacina = v.Id_Vacina), 0)::INT AS Qtd_Doses
+FROM Vacina v;
+
+-- Redistribui o saldo de um lote entre as 8 fatias
+CREATE FUNCTION distribuir_estoque(p_id_vacina INTEGER, p_total INTEGER) RETURNS VOID AS $$
+    INSERT INTO Estoque_Fatia (Id_Vacina, Fatia, Doses)
+    SELECT p_id_vacina, f, p_total / 8 + CASE WHEN f < p_total % 8 THEN 1 ELSE 0 END
+    FROM generate_series(0, 7) AS f
+    ON CONFLICT (Id_Vacina, Fatia) DO UPDATE SET Doses = EXCLUDED.Doses;
+$$ LANGUAGE sql;
+
+-- Cadastro e ajuste manual de Qtd_Doses refletem nas fatias e no livro de movimentos.
+-- O ajuste é comparado com o saldo das fatias, pois Qtd_Doses pode estar defasado desde a
+-- última consolidação. A consolidação periódica marca estoque.consolidando e é ignorada aqui.
+CREATE FUNCTION sincronizar_estoque_vacina() RETURNS TRIGGER AS $$
+DECLARE
+    saldo_atual INTEGER;
+BEGIN
+    IF current_setting('estoque.consolidando', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    -- Trava as fatias antes de somar: uma aplicação concorrente não baixa uma fatia entre a
+    -- soma e a redistribuição, o que faria o ajuste apagar a baixa.
+    PERFORM 1 FROM Estoque_Fatia WHERE Id_Vacina = NEW.Id_Vacina ORDER BY Fatia FOR UPDATE;
+    SELECT COALESCE(SUM(Doses), 0) INTO saldo_atual FROM Estoque_Fatia WHERE Id_Vacina = NEW.Id_Vacina;
+    IF TG_OP = 'UPDATE' AND NEW.Qtd_Doses = saldo_atual THEN
+        RETURN NEW;
+    END IF;
+    PERFORM distribuir_estoque(NEW.Id_Vacina, NEW.Qtd_Doses);
+    INSERT INTO Movimento_Estoque (Id_Vacina, Quantidade, Motivo)
+    VALUES (NEW.Id_Vacina, NEW.Qtd_Doses - saldo_atual, CASE WHEN TG_OP = 'INSERT' THEN 'entrada' ELSE 'ajuste' END);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_estoque_vacina
+AFTER INSERT OR UPDATE OF Qtd_Doses ON Vacina
+FOR EACH ROW EXECUTE FUNCTION sincronizar_estoque_vacina();
+
 -- POVOAMENTO
 
 -- 1. CAMPANHA
@@ -240,3 +315,7 @@ INSERT INTO Vacinacao (Contagem, Data_aplicacao, Id_Vacina, CPF, Id_Local, Id_Ca
 (1, '2025-03-08', 8, '88888888888', 8, 8),
 (1, '2025-03-09', 9, '99999999999', 9, 9),
 (1, '2025-03-10', 10, '10101010101', 10, 10);
+
+-- 11. VAGA_LOCAL (vagas ocupadas pelos agendamentos acima)
+INSERT INTO Vaga_Local (Id_Local, Data_Agendamento, Ocupadas)
+SELECT Id_Local, Data_Agendamento, COUNT(*) FROM Agendamento GROUP BY Id_Local, Data_Agendamento;
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# Os testes importam os módulos da aplicação (db_config, migracoes) a partir da pasta TRABALHO2.
+# Importar db_config cria os engines e inicia a conexão em segundo plano; sem as variáveis
+# DB_* (ou sem banco no ar) a importação segue normalmente e os testes que usam o banco
+# (fixture `transacao`) são pulados.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def transacao():
+    """Conexão psycopg2 do pool em uma transação desfeita ao fim do teste."""
+    import db_config
+    if not db_config.iniciar_banco(aguardar=5):
+        pytest.skip("banco de dados indisponível")
+    conn = db_config.engine.raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,35 @@
+from datetime import date
+
+from db_config import SQL_AGENDAMENTOS
+
+# --- Campanha exibida em cada agendamento (SQL_AGENDAMENTOS)
+
+def _campanha_do_agendamento(cur, data_agendamento):
+    cur.execute("SELECT CPF FROM Cidadao LIMIT 1")
+    cpf, = cur.fetchone()
+    cur.execute("SELECT Id_Local FROM Local LIMIT 1")
+    id_local, = cur.fetchone()
+    cur.execute("""INSERT INTO Agendamento (Data_Agendamento, Id_Vacina, Id_Local, CPF)
+                   VALUES (%s, (SELECT Id_Vacina FROM Vacina WHERE Doenca_alvo = 'Doença de teste'), %s, %s)
+                   RETURNING Id_Agendamento""", (data_agendamento, id_local, cpf))
+    id_agendamento, = cur.fetchone()
+    cur.execute(f"SELECT nome_campanha FROM ({SQL_AGENDAMENTOS}) a WHERE id_agendamento = %s", (id_agendamento,))
+    return cur.fetchone()[0]
+
+def _preparar(cur):
+    cur.execute("""INSERT INTO Vacina (Nome, Doenca_alvo, Codigo_Lote, Data_Chegada, Data_Validade, Qtd_Doses)
+                   VALUES ('Vacina de teste', 'Doença de teste', 'L-TESTE', '2024-01-01', '2030-01-01', 10)""")
+    cur.execute("""INSERT INTO Campanha (Nome, Doenca_alvo, Tipo_vacina, Data_inicio, Data_fim, Publico_alvo) VALUES
+                   ('Campanha 2024', 'Doença de teste', 'Dose única', '2024-03-01', '2024-06-30', 'Idosos'),
+                   ('Campanha 2025', 'Doença de teste', 'Dose única', '2025-03-01', '2025-06-30', 'Crianças')""")
+
+def test_campanha_cujo_periodo_cobre_a_data(transacao):
+    cur = transacao.cursor()
+    _preparar(cur)
+    assert _campanha_do_agendamento(cur, date(2024, 4, 10)) == 'Campanha 2024'
+    assert _campanha_do_agendamento(cur, date(2025, 4, 10)) == 'Campanha 2025'
+
+def test_sem_campanha_no_periodo_usa_a_mais_recente(transacao):
+    cur = transacao.cursor()
+    _preparar(cur)
+    assert _campanha_do_agendamento(cur, date(2024, 12, 1)) == 'Campanha 2025'
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import db_config
+from db_config import _cache_buscar, _cache_guardar, _para_text, _tabelas_escritas, invalidar_cache
+
+# --- Placeholders do psycopg2 convertidos para o asyncpg (_para_text)
+
+def test_para_text_parametros_nomeados():
+    sql, valores = _para_text("SELECT * FROM Vacina WHERE Nome ILIKE %(padrao)s AND Id_Vacina = %(id)s",
+                              {'padrao': '%gripe%', 'id': 3})
+    assert sql.text == "SELECT * FROM Vacina WHERE Nome ILIKE :padrao AND Id_Vacina = :id"
+    assert valores == {'padrao': '%gripe%', 'id': 3}
+
+def test_para_text_parametros_posicionais_viram_binds_numerados():
+    sql, valores = _para_text("SELECT * FROM Vacinacao WHERE CPF = %s AND Id_Vacina = %s",
+                              ['111', np.int64(4)])
+    assert sql.text == "SELECT * FROM Vacinacao WHERE CPF = :p0 AND Id_Vacina = :p1"
+    assert valores == {'p0': '111', 'p1': 4}
+    assert type(valores['p1']) is int
+
+def test_para_text_converte_timestamp_do_pandas():
+    _, valores = _para_text("SELECT %s", (pd.Timestamp('2025-03-01'),))
+    assert type(valores['p0']) is not pd.Timestamp
+
+def test_para_text_desfaz_escape_de_porcentagem():
+    sql, valores = _para_text("SELECT Nome FROM Local WHERE Nome LIKE 'Posto%%'", None)
+    assert sql.text == "SELECT Nome FROM Local WHERE Nome LIKE 'Posto%'"
+    assert valores == {}
+    sql, _ = _para_text("SELECT 100 %% %(n)s", {'n': 7})
+    assert sql.text == "SELECT 100 % :n"
+
+# --- Cache de consultas marcado por tabela
+
+@pytest.fixture
+def cache_vazio():
+    db_config._cache_consultas.clear()
+    yield db_config._cache_consultas
+    db_config._cache_consultas.clear()
+
+def test_tabelas_escritas_reconhece_comandos_e_ignora_caixa():
+    assert _tabelas_escritas("INSERT INTO Vacinacao (CPF) VALUES (%s)") == {'vacinacao'}
+    assert _tabelas_escritas("update ONLY Vacina set Nome = %s") == {'vacina'}
+    assert _tabelas_escritas("DELETE FROM Agendamento WHERE Id_Agendamento = %s") == {'agendamento'}
+    assert _tabelas_escritas("TRUNCATE TABLE Parente") == {'parente'}
+    assert _tabelas_escritas("SELECT * FROM Vacina") == set()
+
+def test_tabelas_escritas_em_ctes_de_escrita():
+    assert _tabelas_escritas(db_config.SQL_EXCLUIR_VACINACAO) == {'vacinacao', 'estoque_fatia', 'movimento_estoque'}
+    assert _tabelas_escritas(db_config.SQL_AGENDAR) == {'vaga_local', 'agendamento'}
+
+def test_invalidar_cache_descarta_so_as_consultas_da_tabela(cache_vazio):
+    df = pd.DataFrame({'n': [1]})
+    _cache_guardar('vacinas', {'vacina'}, df)
+    _cache_guardar('vacinacoes', {'vacinacao', 'vacina', 'cidadao'}, df)
+    _cache_guardar('locais', {'local'}, df)
+    invalidar_cache('Vacina')
+    assert _cache_buscar('vacinas') is None
+    assert _cache_buscar('vacinacoes') is None
+    assert _cache_buscar('locais') is df
+
+def test_invalidar_cache_sem_tabelas_descarta_tudo(cache_vazio):
+    df = pd.DataFrame({'n': [1]})
+    _cache_guardar('vacinas', {'vacina'}, df)
+    _cache_guardar('locais', {'local'}, df)
+    invalidar_cache()
+    assert not cache_vazio
+
+def test_cache_expira_depois_do_ttl(cache_vazio, monkeypatch):
+    df = pd.DataFrame({'n': [1]})
+    _cache_guardar('vacinas', {'vacina'}, df)
+    assert _cache_buscar('vacinas') is df
+    monkeypatch.setattr(db_config, 'DB_CACHE_TTL', 0)
+    assert _cache_buscar('vacinas') is None
+    assert 'vacinas' not in cache_vazio
@@ -0,0 +1,63 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from db_config import _condicao_seek, _sql_pagina, compilar_filtros, filtros_vacinacoes
+
+# --- Paginação por chave (keyset)
+
+def test_condicao_seek_descendente_usa_comparacao_de_tupla():
+    condicao, params = _condicao_seek([('data_aplicacao', 'DESC'), ('id_vacinacao', 'DESC')],
+                                      (date(2025, 3, 1), 42))
+    assert condicao == "(data_aplicacao, id_vacinacao) < (%s, %s)"
+    assert params == [date(2025, 3, 1), 42]
+
+def test_condicao_seek_ascendente_ignora_caixa_da_direcao():
+    condicao, params = _condicao_seek([('nome', 'asc'), ('cpf', 'asc')], ('Ana', '111'))
+    assert condicao == "(nome, cpf) > (%s, %s)"
+    assert params == ['Ana', '111']
+
+def test_condicao_seek_direcoes_mistas_expande_em_or():
+    condicao, params = _condicao_seek([('nome', 'ASC'), ('data', 'DESC'), ('cpf', 'ASC')],
+                                      ('Ana', date(2025, 1, 2), '111'))
+    assert condicao == "(nome > %s) OR (nome = %s AND data < %s) OR (nome = %s AND data = %s AND cpf > %s)"
+    assert params == ['Ana', 'Ana', date(2025, 1, 2), 'Ana', date(2025, 1, 2), '111']
+
+def test_condicao_seek_converte_valores_do_pandas():
+    _, params = _condicao_seek([('data_aplicacao', 'DESC'), ('id_vacinacao', 'DESC')],
+                               (pd.Timestamp('2025-03-01'), np.int32(7)))
+    assert params == [datetime(2025, 3, 1), 7]
+    assert type(params[0]) is datetime and type(params[1]) is int
+
+def test_sql_pagina_primeira_pagina():
+    query, params = _sql_pagina("SELECT * FROM Vacina", [('id_vacina', 'ASC')], 11, None, '', None)
+    assert query == "SELECT * FROM (SELECT * FROM Vacina) AS pagina ORDER BY id_vacina ASC LIMIT %s"
+    assert params == [11]
+
+def test_sql_pagina_combina_filtro_e_seek_na_ordem_dos_parametros():
+    query, params = _sql_pagina("SELECT * FROM Usuario", [('nome', 'ASC'), ('cpf', 'ASC')], 11,
+                                ('Ana', '111'), "nome ILIKE %s", ('%an%',))
+    assert query == ("SELECT * FROM (SELECT * FROM Usuario) AS pagina "
+                     "WHERE (nome ILIKE %s) AND ((nome, cpf) > (%s, %s)) "
+                     "ORDER BY nome ASC, cpf ASC LIMIT %s")
+    assert params == ['%an%', 'Ana', '111', 11]
+
+# --- Compilação dos filtros
+
+def test_compilar_filtros_sem_valores():
+    assert compilar_filtros([]) == ('', ())
+    assert compilar_filtros([('nome', 'contem', None), ('cpf', 'igual', ''), ('cidade', 'contem', '   ')]) == ('', ())
+
+def test_compilar_filtros_contem_remove_espacos_e_usa_ilike():
+    assert compilar_filtros([('nome', 'contem', '  silva ')]) == ("nome ILIKE %s", ('%silva%',))
+
+def test_compilar_filtros_colunas_alternativas_repetem_o_parametro():
+    where, params = compilar_filtros([(('nome', 'cidade'), 'contem', 'quixad'), ('id_local', 'igual', 3)])
+    assert where == "(nome ILIKE %s OR cidade ILIKE %s) AND id_local = %s"
+    assert params == ('%quixad%', '%quixad%', 3)
+
+def test_filtros_vacinacoes_periodo():
+    where, params = filtros_vacinacoes(data_inicio=date(2025, 3, 1), data_fim=date(2025, 3, 31))
+    assert where == "data_aplicacao >= %s AND data_aplicacao <= %s"
+    assert params == (date(2025, 3, 1), date(2025, 3, 31))
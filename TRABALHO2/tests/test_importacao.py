@@ -0,0 +1,84 @@
+import io
+from datetime import date
+
+import pytest
+
+from importacao import (COLUNAS_IMPORTACAO, COLUNAS_IMPORTACAO_USUARIOS, COLUNAS_OBRIGATORIAS_USUARIOS,
+                        MOTIVOS_IMPORTACAO, MOTIVOS_IMPORTACAO_USUARIOS, SQL_CRIAR_STAGING_USUARIOS,
+                        SQL_DEDUPLICAR_USUARIOS, SQL_GRAVAR_CIDADAOS, SQL_GRAVAR_USUARIOS,
+                        SQL_USUARIOS_RECUSADOS, _normalizar_linha, _normalizar_usuario, _preparar_copy)
+
+# --- Normalização das linhas do CSV
+
+def _preparar_usuarios(texto):
+    return _preparar_copy(io.StringIO(texto), COLUNAS_IMPORTACAO_USUARIOS, _normalizar_usuario,
+                          MOTIVOS_IMPORTACAO_USUARIOS['formato_invalido'], obrigatorias=COLUNAS_OBRIGATORIAS_USUARIOS)
+
+def test_normalizar_linha_aceita_os_dois_formatos_de_data():
+    campos = {'cpf': '123.456.789-00', 'id_vacina': '1', 'id_local': '2', 'id_campanha': '3',
+              'contagem': '1', 'data_aplicacao': '05/03/2025'}
+    assert _normalizar_linha(campos) == ('12345678900', 1, 2, 3, 1, date(2025, 3, 5))
+    assert _normalizar_linha({**campos, 'data_aplicacao': '2025-03-05'})[-1] == date(2025, 3, 5)
+
+def test_normalizar_linha_recusa_inteiro_fora_do_int():
+    campos = {'cpf': '1', 'id_vacina': str(2**31), 'id_local': '2', 'id_campanha': '3',
+              'contagem': '1', 'data_aplicacao': '2025-03-05'}
+    with pytest.raises(ValueError):
+        _normalizar_linha(campos)
+
+def test_preparar_copy_detecta_separador_e_recusa_linhas_invalidas():
+    texto = ("cpf;id_vacina;id_local;id_campanha;contagem;data_aplicacao\n"
+             "111;1;2;3;1;2025-03-05\n"
+             ";;;;;\n"
+             "222;x;2;3;1;2025-03-05\n")
+    dados, lidas, recusadas = _preparar_copy(io.StringIO(texto), COLUNAS_IMPORTACAO, _normalizar_linha,
+                                             MOTIVOS_IMPORTACAO['formato_invalido'])
+    assert lidas == 2
+    assert dados.read().splitlines() == ['2,111,1,2,3,1,2025-03-05']
+    assert [(r['linha'], r['cpf']) for r in recusadas] == [(4, '222')]
+
+def test_preparar_copy_sem_coluna_obrigatoria():
+    with pytest.raises(ValueError, match='telefone'):
+        _preparar_usuarios("cpf,nome\n111,Ana\n")
+
+def test_tipo_de_usuario_omitido_e_cidadao():
+    dados, lidas, recusadas = _preparar_usuarios("cpf,nome,telefone,tipo\n111,Ana,9999,\n222,Bia,8888,gerente\n")
+    assert (lidas, [r['linha'] for r in recusadas]) == (2, [3])
+    assert dados.read().splitlines()[0].startswith('2,111,Ana,9999,cidadao,')
+
+# --- Deduplicação e contagem de inseridos/atualizados no banco (transação desfeita ao fim de cada teste)
+
+def _importar_usuarios(cur, texto):
+    dados, _, _ = _preparar_usuarios(texto)
+    cur.execute(SQL_CRIAR_STAGING_USUARIOS)
+    cur.copy_expert(
+        "COPY importacao_usuario (Linha, CPF, Nome, Telefone, Tipo, Cartao_Sus, Rua, Bairro, Numero, "
+        "Cidade, Estado, Local_Trabalho, Email, Posto_Trabalho) FROM STDIN WITH (FORMAT csv)", dados)
+    cur.execute(SQL_DEDUPLICAR_USUARIOS)
+    cur.execute(SQL_GRAVAR_USUARIOS)
+    inseridas, atualizadas = cur.fetchone()
+    cur.execute(SQL_GRAVAR_CIDADAOS)
+    cur.execute(SQL_USUARIOS_RECUSADOS)
+    recusadas = [(linha, motivo) for linha, *_, motivo in cur.fetchall()]
+    cur.execute("DROP TABLE importacao_usuario")
+    return inseridas, atualizadas, recusadas
+
+def test_cpf_repetido_vale_a_ultima_ocorrencia(transacao):
+    cur = transacao.cursor()
+    inseridas, atualizadas, recusadas = _importar_usuarios(
+        cur, "cpf,nome,telefone\n90000000001,Primeira,1111\n90000000002,Outro,2222\n90000000001,Última,3333\n")
+    assert (inseridas, atualizadas) == (2, 0)
+    assert recusadas == [(2, 'cpf_repetido')]
+    cur.execute("SELECT Nome, Telefone FROM Usuario WHERE CPF = '90000000001'")
+    assert cur.fetchone() == ('Última', '3333')
+
+def test_contagem_separa_inseridos_de_atualizados(transacao):
+    cur = transacao.cursor()
+    _importar_usuarios(cur, "cpf,nome,telefone,cidade\n90000000001,Ana,1111,Recife\n")
+    inseridas, atualizadas, recusadas = _importar_usuarios(
+        cur, "cpf,nome,telefone,cidade\n90000000001,Ana Maria,1111,\n90000000003,Bia,2222,\n")
+    assert (inseridas, atualizadas, recusadas) == (1, 1, [])
+    cur.execute("""SELECT U.Nome, C.Cidade FROM Usuario U JOIN Cidadao C ON C.CPF = U.CPF
+                   WHERE U.CPF = '90000000001'""")
+    # Campo opcional em branco não apaga o valor cadastrado
+    assert cur.fetchone() == ('Ana Maria', 'Recife')
@@ -0,0 +1,27 @@
+from notificacoes import agrupar_alteracoes
+
+# --- Agrupamento das notificações dos gatilhos (agrupar_alteracoes)
+
+def test_agrupa_chaves_por_tabela_e_operacao():
+    alteracoes = agrupar_alteracoes([
+        {'tabela': 'vacina', 'operacao': 'UPDATE', 'chaves': [1, 2]},
+        {'tabela': 'vacina', 'operacao': 'UPDATE', 'chaves': [2, 3]},
+        {'tabela': 'vacina', 'operacao': 'DELETE', 'chaves': [4]},
+        {'tabela': 'local', 'operacao': 'INSERT', 'chaves': [9]},
+    ])
+    assert alteracoes == {
+        'vacina': {'UPDATE': {1, 2, 3}, 'DELETE': {4}},
+        'local': {'INSERT': {9}},
+    }
+
+def test_subtipos_de_usuario_viram_update_do_usuario():
+    alteracoes = agrupar_alteracoes([
+        {'tabela': 'cidadao', 'operacao': 'INSERT', 'chaves': ['111']},
+        {'tabela': 'administrador', 'operacao': 'DELETE', 'chaves': ['222']},
+        {'tabela': 'agente_saude', 'operacao': 'UPDATE', 'chaves': ['333']},
+        {'tabela': 'usuario', 'operacao': 'INSERT', 'chaves': ['444']},
+    ])
+    assert alteracoes == {'usuario': {'UPDATE': {'111', '222', '333'}, 'INSERT': {'444'}}}
+
+def test_lote_vazio():
+    assert agrupar_alteracoes([]) == {}
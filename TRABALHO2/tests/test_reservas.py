@@ -0,0 +1,150 @@
+from datetime import date
+
+import pytest
+
+import db_config
+from db_config import (SQL_ATUALIZAR_VACINACAO, SQL_EXCLUIR_VACINACAO, SQL_REGISTRAR_VACINACAO,
+                       _executar_reserva, _motivo_falha_reserva)
+
+# --- Forma dos comandos de reserva
+
+@pytest.mark.parametrize('sql', [SQL_REGISTRAR_VACINACAO, SQL_ATUALIZAR_VACINACAO])
+def test_reserva_tem_um_bloqueio_trocavel(sql):
+    assert sql.count('{bloqueio}') == 1
+    assert '{' not in sql.replace('{bloqueio}', '')
+
+def test_exclusao_nao_depende_do_bloqueio():
+    assert '{bloqueio}' not in SQL_EXCLUIR_VACINACAO
+
+def test_motivo_falha_reserva_na_ordem_de_verificacao():
+    assert _motivo_falha_reserva(True, True, vacinacao_existe=False) == 'vacinacao_inexistente'
+    assert _motivo_falha_reserva(False, False) == 'cidadao_inexistente'
+    assert _motivo_falha_reserva(True, False) == 'vacina_inexistente'
+    assert _motivo_falha_reserva(True, True) == 'sem_estoque'
+
+# --- Nova tentativa de _executar_reserva
+
+def _simular_execute_query(monkeypatch, respostas):
+    chamadas = []
+
+    def execute_query(query, params=None, fetch_result=False):
+        chamadas.append(query)
+        return respostas[len(chamadas) - 1]
+
+    monkeypatch.setattr(db_config, 'execute_query', execute_query)
+    return chamadas
+
+def test_reserva_sem_fatia_livre_repete_aguardando_o_bloqueio(monkeypatch):
+    # Primeira tentativa: nada reservado, mas o lote ainda tem saldo (fatias bloqueadas)
+    chamadas = _simular_execute_query(monkeypatch, [[(None, True, True, True)], [(7, True, True, True)]])
+    assert _executar_reserva(SQL_REGISTRAR_VACINACAO, {}) == (7, True, True, True)
+    assert len(chamadas) == 2
+    assert 'FOR UPDATE SKIP LOCKED' in chamadas[0]
+    assert 'FOR UPDATE' in chamadas[1] and 'SKIP LOCKED' not in chamadas[1]
+
+def test_reserva_feita_na_primeira_tentativa(monkeypatch):
+    chamadas = _simular_execute_query(monkeypatch, [[(7, True, True, True)]])
+    assert _executar_reserva(SQL_REGISTRAR_VACINACAO, {}) == (7, True, True, True)
+    assert len(chamadas) == 1
+
+def test_reserva_sem_saldo_nao_repete(monkeypatch):
+    chamadas = _simular_execute_query(monkeypatch, [[(None, True, True, False)]])
+    assert _executar_reserva(SQL_REGISTRAR_VACINACAO, {}) == (None, True, True, False)
+    assert len(chamadas) == 1
+
+def test_reserva_com_erro_no_banco(monkeypatch):
+    _simular_execute_query(monkeypatch, [False])
+    assert _executar_reserva(SQL_REGISTRAR_VACINACAO, {}) is None
+
+# --- Comandos de reserva no banco (transação desfeita ao fim de cada teste)
+
+def _criar_lote(cur, doses):
+    cur.execute("""INSERT INTO Vacina (Nome, Doenca_alvo, Codigo_Lote, Data_Chegada, Data_Validade, Qtd_Doses)
+                   VALUES ('Vacina de teste', 'Doença de teste', 'L-TESTE', '2024-01-01', '2030-01-01', %s)
+                   RETURNING Id_Vacina""", (doses,))
+    return cur.fetchone()[0]
+
+def _saldo(cur, id_vacina):
+    cur.execute("SELECT COALESCE(SUM(Doses), 0) FROM Estoque_Fatia WHERE Id_Vacina = %s", (id_vacina,))
+    return cur.fetchone()[0]
+
+def _movimentos(cur, id_vacina):
+    cur.execute("""SELECT Motivo, Quantidade FROM Movimento_Estoque
+                   WHERE Id_Vacina = %s AND Motivo <> 'entrada' ORDER BY Id_Movimento""", (id_vacina,))
+    return cur.fetchall()
+
+def _params(cur, id_vacina, **outros):
+    cur.execute("SELECT CPF FROM Cidadao LIMIT 1")
+    cpf, = cur.fetchone()
+    cur.execute("SELECT Id_Local FROM Local LIMIT 1")
+    id_local, = cur.fetchone()
+    cur.execute("SELECT Id_Campanha FROM Campanha LIMIT 1")
+    id_campanha, = cur.fetchone()
+    return {'cpf': cpf, 'id_vacina': id_vacina, 'id_local': id_local, 'id_campanha': id_campanha,
+            'contagem': 1, 'data_aplicacao': date(2025, 3, 1), **outros}
+
+def _executar(cur, sql, params):
+    cur.execute(sql.replace('{bloqueio}', 'FOR UPDATE SKIP LOCKED'), params)
+    return cur.fetchone()
+
+def test_registrar_baixa_uma_dose_e_grava_o_movimento(transacao):
+    cur = transacao.cursor()
+    id_vacina = _criar_lote(cur, 2)
+    id_vacinacao, cidadao_existe, vacina_existe, tem_saldo = _executar(cur, SQL_REGISTRAR_VACINACAO,
+                                                                       _params(cur, id_vacina))
+    assert id_vacinacao is not None and cidadao_existe and vacina_existe and tem_saldo
+    assert _saldo(cur, id_vacina) == 1
+    assert _movimentos(cur, id_vacina) == [('aplicacao', -1)]
+
+def test_registrar_sem_estoque_nao_grava(transacao):
+    cur = transacao.cursor()
+    id_vacina = _criar_lote(cur, 0)
+    linha = _executar(cur, SQL_REGISTRAR_VACINACAO, _params(cur, id_vacina))
+    assert linha == (None, True, True, False)
+    assert _motivo_falha_reserva(*linha[1:3]) == 'sem_estoque'
+    assert _movimentos(cur, id_vacina) == []
+
+def test_registrar_cpf_que_nao_e_cidadao_nao_baixa_estoque(transacao):
+    cur = transacao.cursor()
+    id_vacina = _criar_lote(cur, 1)
+    linha = _executar(cur, SQL_REGISTRAR_VACINACAO, _params(cur, id_vacina, cpf='00000000000'))
+    assert linha == (None, False, True, True)
+    assert _saldo(cur, id_vacina) == 1
+
+def test_atualizar_para_outro_lote_devolve_a_dose(transacao):
+    cur = transacao.cursor()
+    antigo, novo = _criar_lote(cur, 1), _criar_lote(cur, 1)
+    id_vacinacao = _executar(cur, SQL_REGISTRAR_VACINACAO, _params(cur, antigo))[0]
+    linha = _executar(cur, SQL_ATUALIZAR_VACINACAO, _params(cur, novo, id_vacinacao=id_vacinacao))
+    assert linha[0] == id_vacinacao
+    assert (_saldo(cur, antigo), _saldo(cur, novo)) == (1, 0)
+    assert _movimentos(cur, antigo) == [('aplicacao', -1), ('estorno', 1)]
+    assert _movimentos(cur, novo) == [('aplicacao', -1)]
+
+def test_atualizar_no_mesmo_lote_nao_mexe_no_estoque(transacao):
+    cur = transacao.cursor()
+    id_vacina = _criar_lote(cur, 1)
+    id_vacinacao = _executar(cur, SQL_REGISTRAR_VACINACAO, _params(cur, id_vacina))[0]
+    linha = _executar(cur, SQL_ATUALIZAR_VACINACAO, _params(cur, id_vacina, id_vacinacao=id_vacinacao, contagem=2))
+    assert linha[0] == id_vacinacao
+    assert _saldo(cur, id_vacina) == 0
+    assert _movimentos(cur, id_vacina) == [('aplicacao', -1)]
+
+def test_atualizar_para_lote_sem_estoque_nao_altera_nada(transacao):
+    cur = transacao.cursor()
+    antigo, vazio = _criar_lote(cur, 1), _criar_lote(cur, 0)
+    id_vacinacao = _executar(cur, SQL_REGISTRAR_VACINACAO, _params(cur, antigo))[0]
+    linha = _executar(cur, SQL_ATUALIZAR_VACINACAO, _params(cur, vazio, id_vacinacao=id_vacinacao))
+    assert linha == (None, True, True, False, True)
+    cur.execute("SELECT Id_Vacina FROM Vacinacao WHERE Id_Vacinacao = %s", (id_vacinacao,))
+    assert cur.fetchone()[0] == antigo
+    assert _saldo(cur, antigo) == 0
+
+def test_excluir_devolve_a_dose(transacao):
+    cur = transacao.cursor()
+    id_vacina = _criar_lote(cur, 1)
+    id_vacinacao = _executar(cur, SQL_REGISTRAR_VACINACAO, _params(cur, id_vacina))[0]
+    assert _executar(cur, SQL_EXCLUIR_VACINACAO, {'id_vacinacao': id_vacinacao}) == (True,)
+    assert _saldo(cur, id_vacina) == 1
+    assert _movimentos(cur, id_vacina) == [('aplicacao', -1), ('estorno', 1)]
+    assert _executar(cur, SQL_EXCLUIR_VACINACAO, {'id_vacinacao': id_vacinacao}) == (False,)
@@ -0,0 +1,122 @@
+from datetime import date
+
+import pytest
+
+from db_config import (SQL_AGENDAR, SQL_CANCELAR_AGENDAMENTO, SQL_REAGENDAR, _SQL_TOMAR_VAGA,
+                       _motivo_falha_agendamento)
+
+DIA = date(2030, 5, 10)
+OUTRO_DIA = date(2030, 5, 11)
+
+# --- Forma dos comandos de agendamento
+
+@pytest.mark.parametrize('sql', [SQL_AGENDAR, SQL_REAGENDAR])
+def test_condicao_da_vaga_substituida(sql):
+    assert '{condicao}' in _SQL_TOMAR_VAGA
+    assert '{' not in sql
+
+def test_motivo_falha_agendamento_na_ordem_de_verificacao():
+    assert _motivo_falha_agendamento(True, agendamento_existe=False) == 'agendamento_inexistente'
+    assert _motivo_falha_agendamento(False) == 'local_inexistente'
+    assert _motivo_falha_agendamento(True) == 'sem_vaga'
+
+# --- Vagas por local e dia no banco (transação desfeita ao fim de cada teste)
+
+def _criar_local(cur, capacidade):
+    cur.execute("""INSERT INTO Local (Nome, Rua, Bairro, Numero, Cidade, Estado, Contato, Capacidade)
+                   VALUES ('Posto de teste', 'Rua A', 'Centro', 1, 'Cidade', 'UF', '0000', %s)
+                   RETURNING Id_Local""", (capacidade,))
+    return cur.fetchone()[0]
+
+def _params(cur, id_local, data, **outros):
+    cur.execute("SELECT CPF FROM Cidadao LIMIT 1")
+    cpf, = cur.fetchone()
+    cur.execute("SELECT Id_Vacina FROM Vacina LIMIT 1")
+    id_vacina, = cur.fetchone()
+    return {'cpf': cpf, 'id_vacina': id_vacina, 'id_local': id_local, 'data': data, **outros}
+
+def _ocupadas(cur, id_local, data):
+    cur.execute("SELECT Ocupadas FROM Vaga_Local WHERE Id_Local = %s AND Data_Agendamento = %s", (id_local, data))
+    linha = cur.fetchone()
+    return linha[0] if linha else 0
+
+def _agendar(cur, id_local, data):
+    cur.execute(SQL_AGENDAR, _params(cur, id_local, data))
+    return cur.fetchone()
+
+def _reagendar(cur, id_agendamento, id_local, data):
+    cur.execute(SQL_REAGENDAR, _params(cur, id_local, data, id_agendamento=id_agendamento))
+    return cur.fetchone()
+
+def test_agendar_ate_esgotar_a_capacidade(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, 2)
+    assert _agendar(cur, id_local, DIA)[0] is not None
+    assert _agendar(cur, id_local, DIA)[0] is not None
+    assert _agendar(cur, id_local, DIA) == (None, True)
+    assert _ocupadas(cur, id_local, DIA) == 2
+    # Outro dia tem vagas próprias
+    assert _agendar(cur, id_local, OUTRO_DIA)[0] is not None
+
+def test_capacidade_nula_nao_tem_limite(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, None)
+    for _ in range(5):
+        assert _agendar(cur, id_local, DIA)[0] is not None
+    assert _ocupadas(cur, id_local, DIA) == 5
+
+def test_capacidade_zero_recusa_o_primeiro_agendamento(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, 0)
+    assert _agendar(cur, id_local, DIA) == (None, True)
+    assert _ocupadas(cur, id_local, DIA) == 0
+
+def test_agendar_em_local_inexistente(transacao):
+    cur = transacao.cursor()
+    cur.execute("SELECT COALESCE(MAX(Id_Local), 0) + 1 FROM Local")
+    id_local, = cur.fetchone()
+    assert _agendar(cur, id_local, DIA) == (None, False)
+
+def test_reagendar_na_mesma_vaga_com_local_lotado(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, 1)
+    id_agendamento = _agendar(cur, id_local, DIA)[0]
+    assert _reagendar(cur, id_agendamento, id_local, DIA) == (id_agendamento, True, True)
+    assert _ocupadas(cur, id_local, DIA) == 1
+
+def test_reagendar_move_a_vaga(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, 1)
+    id_agendamento = _agendar(cur, id_local, DIA)[0]
+    assert _reagendar(cur, id_agendamento, id_local, OUTRO_DIA)[0] == id_agendamento
+    assert (_ocupadas(cur, id_local, DIA), _ocupadas(cur, id_local, OUTRO_DIA)) == (0, 1)
+    # A vaga liberada pode ser tomada de novo
+    assert _agendar(cur, id_local, DIA)[0] is not None
+
+def test_reagendar_sem_vaga_nao_altera_nada(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, 1)
+    id_agendamento = _agendar(cur, id_local, DIA)[0]
+    _agendar(cur, id_local, OUTRO_DIA)
+    assert _reagendar(cur, id_agendamento, id_local, OUTRO_DIA) == (None, True, True)
+    cur.execute("SELECT Data_Agendamento FROM Agendamento WHERE Id_Agendamento = %s", (id_agendamento,))
+    assert cur.fetchone()[0] == DIA
+    assert (_ocupadas(cur, id_local, DIA), _ocupadas(cur, id_local, OUTRO_DIA)) == (1, 1)
+
+def test_reagendar_agendamento_inexistente(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, None)
+    cur.execute("SELECT COALESCE(MAX(Id_Agendamento), 0) + 1 FROM Agendamento")
+    id_agendamento, = cur.fetchone()
+    assert _reagendar(cur, id_agendamento, id_local, DIA) == (None, True, False)
+    assert _ocupadas(cur, id_local, DIA) == 0
+
+def test_cancelar_libera_a_vaga(transacao):
+    cur = transacao.cursor()
+    id_local = _criar_local(cur, 1)
+    id_agendamento = _agendar(cur, id_local, DIA)[0]
+    cur.execute(SQL_CANCELAR_AGENDAMENTO, {'id_agendamento': id_agendamento})
+    assert cur.fetchone() == (True,)
+    assert _ocupadas(cur, id_local, DIA) == 0
+    cur.execute(SQL_CANCELAR_AGENDAMENTO, {'id_agendamento': id_agendamento})
+    assert cur.fetchone() == (False,)